@@ -0,0 +1,246 @@
+"""
+Benchmark de la generación de reportes PDF.
+
+Crea una base SQLite temporal, la llena con productos y movimientos
+sintéticos y mide cada constructor de reportes (``crear_pdf_inventario``,
+``crear_pdf_movimientos`` y ``crear_pdf_categoria``) con 1k, 10k y 100k
+filas: tiempo, pico de memoria (``tracemalloc``) y número de consultas.
+Los resultados se guardan en JSON para compararlos entre commits.
+
+Uso:
+    python benchmarks/reportes.py
+    python benchmarks/reportes.py --tamanos 1000 10000 --salida actual.json
+    python benchmarks/reportes.py --comparar benchmarks/base.json --tolerancia 0.25
+
+Con ``--comparar`` el proceso termina con código 1 si algún reporte es
+más lento o usa más memoria que la referencia por encima de la tolerancia.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from decimal import Decimal
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sistema_inventario_ti.settings')
+
+TAMANOS = (1000, 10000, 100000)
+TAMANO_LOTE = 2000
+CATEGORIAS = 20
+SEMILLA = 1234
+
+
+def configurar_django(directorio):
+    """Apunta Django a una base, caché y media desechables antes de iniciarlo"""
+    from django.conf import settings
+
+    settings.DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(directorio, 'benchmark.sqlite3'),
+        }
+    }
+    settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    settings.MEDIA_ROOT = os.path.join(directorio, 'media')
+    settings.DEBUG = False
+
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0, interactive=False)
+
+
+def _datos_base():
+    from inventario.models import Categoria, TipoMovimiento, Usuario
+
+    usuario = Usuario.objects.create(username='benchmark', first_name='Bench', last_name='Mark')
+    categorias = Categoria.objects.bulk_create([
+        Categoria(nombre=f'Categoría {numero:02d}') for numero in range(CATEGORIAS)
+    ])
+    tipos = [
+        TipoMovimiento.objects.create(nombre='Entrada', es_entrada=True),
+        TipoMovimiento.objects.create(nombre='Salida', es_entrada=False),
+    ]
+    return usuario, categorias, tipos
+
+
+def sembrar(desde, hasta, usuario, categorias, tipos, azar):
+    """Agrega productos y movimientos sintéticos hasta tener ``hasta`` de cada uno"""
+    from inventario.models import Movimiento, Producto
+
+    estados = [estado for estado, _ in Producto.ESTADOS]
+    for inicio in range(desde, hasta, TAMANO_LOTE):
+        fin = min(inicio + TAMANO_LOTE, hasta)
+        productos = Producto.objects.bulk_create([
+            Producto(
+                codigo=f'BEN-{numero:07d}',
+                nombre=f'Producto de prueba {numero}',
+                categoria=azar.choice(categorias),
+                marca=azar.choice(['HP', 'Dell', 'Lenovo', 'Cisco', 'Epson']),
+                estado=azar.choice(estados),
+                cantidad=azar.randint(0, 50),
+                precio_unitario=Decimal(azar.randint(500, 500000)) / 100,
+            )
+            for numero in range(inicio, fin)
+        ])
+        Movimiento.objects.bulk_create([
+            Movimiento(
+                producto=producto,
+                tipo_movimiento=azar.choice(tipos),
+                cantidad=azar.randint(1, 10),
+                cantidad_anterior=producto.cantidad,
+                cantidad_nueva=producto.cantidad,
+                usuario=usuario,
+                motivo=f'Movimiento sintético del producto {producto.codigo}',
+            )
+            for producto in productos
+        ])
+
+
+def _constructores():
+    from inventario import reportes
+
+    return {
+        'inventario': lambda: reportes.crear_pdf_inventario(reportes.productos_reporte_inventario({}), destino=_destino()),
+        'movimientos': lambda: reportes.crear_pdf_movimientos(reportes.movimientos_reporte({}), destino=_destino()),
+        'categoria': lambda: reportes.crear_pdf_categoria(
+            reportes.productos_reporte_categoria({'orden': 'valor'}), destino=_destino()
+        ),
+    }
+
+
+def _destino():
+    # Como el worker: el PDF va a disco y no cuenta como memoria del proceso
+    return tempfile.TemporaryFile()
+
+
+def medir(construir):
+    """Tiempo y consultas en una pasada, pico de memoria en otra (tracemalloc la frena)"""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    with CaptureQueriesContext(connection) as consultas:
+        inicio = time.perf_counter()
+        archivo = construir()
+        segundos = time.perf_counter() - inicio
+    archivo.seek(0, os.SEEK_END)
+    tamano = archivo.tell()
+    archivo.close()
+
+    tracemalloc.start()
+    try:
+        construir().close()
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'segundos': round(segundos, 3),
+        'memoria_pico_mb': round(pico / (1024 * 1024), 2),
+        'consultas': len(consultas),
+        'bytes_pdf': tamano,
+    }
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def ejecutar(tamanos):
+    import django
+
+    usuario, categorias, tipos = _datos_base()
+    azar = random.Random(SEMILLA)
+    constructores = _constructores()
+    resultados = []
+    sembradas = 0
+    for tamano in sorted(tamanos):
+        print(f'Sembrando {tamano} productos y movimientos...', flush=True)
+        sembrar(sembradas, tamano, usuario, categorias, tipos, azar)
+        sembradas = tamano
+        for nombre, construir in constructores.items():
+            medicion = medir(construir)
+            resultados.append({'reporte': nombre, 'filas': tamano, **medicion})
+            print(
+                f'  {nombre:<12} {tamano:>7} filas: {medicion["segundos"]:>8.2f} s  '
+                f'{medicion["memoria_pico_mb"]:>8.2f} MB  {medicion["consultas"]:>4} consultas',
+                flush=True,
+            )
+
+    return {
+        'commit': _commit(),
+        'fecha': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'plataforma': platform.platform(),
+        'resultados': resultados,
+    }
+
+
+def comparar(actual, referencia, tolerancia):
+    """Imprime la variación contra ``referencia``; devuelve ``True`` si hay regresiones"""
+    anteriores = {(fila['reporte'], fila['filas']): fila for fila in referencia['resultados']}
+    regresion = False
+    print(f'\nComparación con {referencia.get("commit") or "referencia"} (tolerancia {tolerancia:.0%}):')
+    for fila in actual['resultados']:
+        anterior = anteriores.get((fila['reporte'], fila['filas']))
+        if anterior is None:
+            continue
+        for metrica in ('segundos', 'memoria_pico_mb', 'consultas'):
+            if not anterior[metrica]:
+                continue
+            variacion = fila[metrica] / anterior[metrica] - 1
+            marca = ''
+            if variacion > tolerancia:
+                marca = '  <-- REGRESIÓN'
+                regresion = True
+            print(
+                f'  {fila["reporte"]:<12} {fila["filas"]:>7} {metrica:<16} '
+                f'{anterior[metrica]:>10} -> {fila[metrica]:>10} ({variacion:+.0%}){marca}'
+            )
+    return regresion
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--tamanos', type=int, nargs='+', default=list(TAMANOS), help='Filas de cada conjunto de datos')
+    parser.add_argument('--salida', default=os.path.join(BASE_DIR, 'benchmarks', 'resultados.json'),
+                        help='Archivo JSON de resultados')
+    parser.add_argument('--comparar', help='JSON de una ejecución anterior para detectar regresiones')
+    parser.add_argument('--tolerancia', type=float, default=0.2, help='Empeoramiento admitido (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    directorio = tempfile.mkdtemp(prefix='benchmark_reportes_')
+    try:
+        configurar_django(directorio)
+        actual = ejecutar(args.tamanos)
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+    with open(args.salida, 'w', encoding='utf-8') as archivo:
+        json.dump(actual, archivo, indent=2, ensure_ascii=False)
+    print(f'Resultados guardados en {args.salida}')
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as archivo:
+            referencia = json.load(archivo)
+        if comparar(actual, referencia, args.tolerancia):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
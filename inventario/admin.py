@@ -3,7 +3,7 @@ from django.contrib.auth.admin import UserAdmin
 from django.utils.html import format_html
 from .models import (
     Usuario, Categoria, Producto, TipoMovimiento, 
-    Movimiento, Reporte, ConfiguracionSistema
+    Movimiento, Reporte, ConfiguracionSistema, SecuenciaCodigo
 )
 
 
@@ -141,6 +141,14 @@ class ReporteAdmin(admin.ModelAdmin):
     archivo_link.short_description = 'Archivo'
 
 
+@admin.register(SecuenciaCodigo)
+class SecuenciaCodigoAdmin(admin.ModelAdmin):
+    """Configuración del admin para el modelo SecuenciaCodigo"""
+    list_display = ('prefijo', 'ultimo')
+    search_fields = ('prefijo',)
+    ordering = ('prefijo',)
+
+
 @admin.register(ConfiguracionSistema)
 class ConfiguracionSistemaAdmin(admin.ModelAdmin):
     """Configuración del admin para el modelo ConfiguracionSistema"""
@@ -0,0 +1,107 @@
+"""
+Proyección de filas para las APIs JSON.
+
+Las APIs no construyen instancias de modelo: cada campo publicable se
+declara con la ruta o la expresión SQL que lo calcula y las filas se leen
+con ``values()``. El cliente elige los campos con ``fields=`` y solo esos
+se consultan y se envían.
+"""
+from decimal import Decimal
+
+from django.db.models import DecimalField, F, FloatField
+from django.db.models.functions import Cast, Coalesce
+
+_DECIMAL = DecimalField(max_digits=18, decimal_places=2)
+
+CAMPOS_PRODUCTOS = {
+    'id': 'id',
+    'codigo': 'codigo',
+    'nombre': 'nombre',
+    'categoria': 'categoria__nombre',
+    'categoria_id': 'categoria_id',
+    'marca': 'marca',
+    'modelo': 'modelo',
+    'serie': 'serie',
+    'sede': 'sede__nombre',
+    'sede_id': 'sede_id',
+    'area': 'area__nombre',
+    'area_id': 'area_id',
+    'estado': 'estado',
+    'tipo_propiedad': 'tipo_propiedad',
+    'cantidad': 'cantidad',
+    'precio_unitario': Cast('precio_unitario', FloatField()),
+    'valor_total': Cast(
+        Coalesce(F('precio_unitario') * F('cantidad'), Decimal('0'), output_field=_DECIMAL), FloatField()
+    ),
+    'fecha_actualizacion': 'fecha_actualizacion',
+}
+
+CAMPOS_PRODUCTOS_POR_DEFECTO = ('id', 'codigo', 'nombre', 'categoria', 'cantidad', 'estado', 'valor_total')
+
+CAMPOS_MOVIMIENTOS = {
+    'id': 'id',
+    'producto_id': 'producto_id',
+    'producto_codigo': 'producto__codigo',
+    'producto': 'producto__nombre',
+    'tipo_movimiento': 'tipo_movimiento__nombre',
+    'es_entrada': 'tipo_movimiento__es_entrada',
+    'cantidad': 'cantidad',
+    'cantidad_anterior': 'cantidad_anterior',
+    'cantidad_nueva': 'cantidad_nueva',
+    'usuario': 'usuario__username',
+    'motivo': 'motivo',
+    'referencia': 'referencia',
+    'sede_origen_id': 'sede_origen_id',
+    'area_origen_id': 'area_origen_id',
+    'sede_destino_id': 'sede_destino_id',
+    'area_destino_id': 'area_destino_id',
+    'fecha_movimiento': 'fecha_movimiento',
+    'fecha_actualizacion': 'fecha_actualizacion',
+}
+
+CAMPOS_MOVIMIENTOS_POR_DEFECTO = (
+    'id', 'producto_id', 'tipo_movimiento', 'es_entrada', 'cantidad', 'cantidad_nueva', 'fecha_movimiento',
+)
+
+
+class CamposInvalidos(ValueError):
+    """``fields`` pide campos que la API no publica"""
+
+
+def campos_pedidos(valor, disponibles, por_defecto):
+    """Campos de ``fields=a,b,c`` validados contra ``disponibles``"""
+    if not valor:
+        return list(por_defecto)
+    campos = list(dict.fromkeys(campo.strip() for campo in valor.split(',') if campo.strip()))
+    desconocidos = [campo for campo in campos if campo not in disponibles]
+    if desconocidos or not campos:
+        raise CamposInvalidos(
+            f"Campos desconocidos: {', '.join(desconocidos) or '(ninguno)'}. "
+            f"Disponibles: {', '.join(disponibles)}"
+        )
+    return campos
+
+
+class Proyeccion:
+    """Campos pedidos de una API y las columnas de ``values()`` que los calculan"""
+
+    def __init__(self, disponibles, campos, adicionales=()):
+        self.campos = campos
+        self.columnas = {}
+        self.expresiones = {}
+        # Los adicionales (por ejemplo, los del orden del cursor) se leen pero no se envían
+        for campo in dict.fromkeys([*campos, *adicionales]):
+            definicion = disponibles.get(campo, campo)
+            if isinstance(definicion, str):
+                self.columnas[campo] = definicion
+            else:
+                # Alias propio: la anotación no puede llamarse como un campo del modelo
+                self.columnas[campo] = f'api_{campo}'
+                self.expresiones[f'api_{campo}'] = definicion
+
+    def aplicar(self, queryset):
+        rutas = [columna for columna in self.columnas.values() if columna not in self.expresiones]
+        return queryset.values(*rutas, **self.expresiones)
+
+    def fila(self, valores):
+        return {campo: valores[self.columnas[campo]] for campo in self.campos}
@@ -0,0 +1,153 @@
+"""
+Búsqueda de texto completo de productos.
+
+Cada producto tiene un documento de búsqueda desnormalizado
+(``DocumentoBusquedaProducto``) que se actualiza al guardarlo. El índice
+depende del motor de base de datos:
+
+* PostgreSQL: índice GIN sobre ``to_tsvector`` y trigramas (``pg_trgm``).
+* MySQL: índice ``FULLTEXT``.
+* SQLite: tabla virtual FTS5 sincronizada por triggers.
+
+Los resultados se ordenan por relevancia. Si el motor no tiene índice de
+texto completo se usa la búsqueda ``icontains`` de siempre. También se usa
+``icontains`` para los términos que el índice no encuentra: los que tienen
+dígitos (partes de códigos como ``00123``, que en el índice no son prefijo
+de ningún token) y, en MySQL, los más cortos que ``innodb_ft_min_token_size``
+(``HP``, ``PC``).
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import DocumentoBusquedaProducto
+
+TABLA_DOCUMENTOS = DocumentoBusquedaProducto._meta.db_table
+TABLA_FTS_SQLITE = 'inventario_producto_fts'
+
+# Debe coincidir con innodb_ft_min_token_size del servidor MySQL
+MIN_TERMINO_MYSQL = getattr(settings, 'INVENTARIO_BUSQUEDA_MIN_TERMINO_MYSQL', 3)
+
+_PALABRA = re.compile(r'\w+', re.UNICODE)
+_fts_sqlite_disponible = None
+
+
+def contenido_producto(producto):
+    """Texto indexado de un producto"""
+    campos = (producto.codigo, producto.nombre, producto.marca, producto.modelo)
+    return ' '.join(str(valor) for valor in campos if valor)
+
+
+def indexar_producto(producto):
+    """Crea o actualiza el documento de búsqueda de un producto"""
+    contenido = contenido_producto(producto)
+    actualizados = DocumentoBusquedaProducto.objects.filter(producto_id=producto.pk).update(contenido=contenido)
+    if not actualizados:
+        DocumentoBusquedaProducto.objects.create(producto_id=producto.pk, contenido=contenido)
+
+
+def _terminos(texto):
+    return _PALABRA.findall(texto or '')
+
+
+def _es_literal(termino, minimo):
+    """Indica si ``termino`` se busca con ``icontains`` en lugar del índice"""
+    return len(termino) < minimo or any(caracter.isdigit() for caracter in termino)
+
+
+def _busqueda_simple(queryset, texto):
+    return queryset.filter(
+        Q(nombre__icontains=texto) |
+        Q(codigo__icontains=texto) |
+        Q(marca__icontains=texto) |
+        Q(modelo__icontains=texto)
+    )
+
+
+def _hay_fts_sqlite():
+    global _fts_sqlite_disponible
+    if _fts_sqlite_disponible is None:
+        _fts_sqlite_disponible = TABLA_FTS_SQLITE in connection.introspection.table_names()
+    return _fts_sqlite_disponible
+
+
+def _buscar_sqlite(queryset, terminos):
+    consulta = ' '.join(f'"{termino}"*' for termino in terminos)
+    coincidencias = RawSQL(
+        f'SELECT rowid FROM {TABLA_FTS_SQLITE} WHERE {TABLA_FTS_SQLITE} MATCH %s', (consulta,)
+    )
+    # bm25() devuelve valores negativos: cuanto menor, más relevante
+    relevancia = RawSQL(
+        f'SELECT -bm25({TABLA_FTS_SQLITE}) FROM {TABLA_FTS_SQLITE} '
+        f'WHERE {TABLA_FTS_SQLITE} MATCH %s AND rowid = inventario_producto.id',
+        (consulta,)
+    )
+    return queryset.filter(id__in=coincidencias).annotate(relevancia=relevancia)
+
+
+def _buscar_postgresql(queryset, terminos, texto):
+    consulta = ' & '.join(f'{termino}:*' for termino in terminos)
+    coincidencias = RawSQL(
+        f"SELECT producto_id FROM {TABLA_DOCUMENTOS} "
+        f"WHERE to_tsvector('simple', contenido) @@ to_tsquery('simple', %s) OR contenido %% %s",
+        (consulta, texto)
+    )
+    relevancia = RawSQL(
+        f"SELECT ts_rank(to_tsvector('simple', d.contenido), to_tsquery('simple', %s)) "
+        f"+ similarity(d.contenido, %s) FROM {TABLA_DOCUMENTOS} d "
+        f"WHERE d.producto_id = inventario_producto.id",
+        (consulta, texto)
+    )
+    return queryset.filter(id__in=coincidencias).annotate(relevancia=relevancia)
+
+
+def _buscar_mysql(queryset, terminos):
+    consulta = ' '.join(f'+{termino}*' for termino in terminos)
+    coincidencias = RawSQL(
+        f'SELECT producto_id FROM {TABLA_DOCUMENTOS} '
+        f'WHERE MATCH(contenido) AGAINST (%s IN BOOLEAN MODE)',
+        (consulta,)
+    )
+    relevancia = RawSQL(
+        f'SELECT MATCH(d.contenido) AGAINST (%s IN BOOLEAN MODE) FROM {TABLA_DOCUMENTOS} d '
+        f'WHERE d.producto_id = inventario_producto.id',
+        (consulta,)
+    )
+    return queryset.filter(id__in=coincidencias).annotate(relevancia=relevancia)
+
+
+def buscar_productos(queryset, texto, ordenar=True):
+    """
+    Filtra ``queryset`` (de ``Producto``) por ``texto`` usando el índice
+    de texto completo del motor. Con ``ordenar`` los resultados más
+    relevantes quedan primero.
+    """
+    terminos = _terminos(texto)
+    if not terminos:
+        return _busqueda_simple(queryset, texto)
+
+    motor = connection.vendor
+    if motor not in ('postgresql', 'mysql') and not (motor == 'sqlite' and _hay_fts_sqlite()):
+        return _busqueda_simple(queryset, texto)
+
+    minimo = MIN_TERMINO_MYSQL if motor == 'mysql' else 1
+    indexados = [termino for termino in terminos if not _es_literal(termino, minimo)]
+    for termino in terminos:
+        if termino not in indexados:
+            queryset = _busqueda_simple(queryset, termino)
+    if not indexados:
+        return queryset
+
+    if motor == 'postgresql':
+        resultado = _buscar_postgresql(queryset, indexados, texto)
+    elif motor == 'mysql':
+        resultado = _buscar_mysql(queryset, indexados)
+    else:
+        resultado = _buscar_sqlite(queryset, indexados)
+
+    if ordenar:
+        resultado = resultado.order_by('-relevancia', 'nombre', 'id')
+    return resultado
@@ -0,0 +1,79 @@
+"""
+Caché de consultas y fragmentos basada en versiones de datos.
+
+Cada modelo tiene una versión en la caché compartida. Las señales
+``post_save``/``post_delete`` la reemplazan por una nueva, de modo que toda
+clave construida con las versiones vigentes deja de usarse en cuanto
+cambia alguno de los modelos de los que depende.
+
+Las versiones no se incrementan: cada invalidación escribe un valor que
+no se usó nunca. ``incr`` no es atómico en todos los backends (en
+``FileBasedCache`` es leer y escribir), y dos procesos que invalidan a la
+vez podrían dejar el mismo número; un lector entre ambos guardaría datos
+ya viejos bajo la versión final. Con valores únicos basta un ``set``, que
+es atómico en cualquier backend.
+"""
+import secrets
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+PREFIJO_VERSION = 'inventario:version'
+
+# Tiempo de vida por defecto de consultas y fragmentos cacheados (segundos)
+TIEMPO_CACHE = getattr(settings, 'INVENTARIO_TIEMPO_CACHE', 60 * 60)
+
+
+def _clave_version(modelo):
+    # Además de modelos se aceptan nombres de versiones propias (p. ej. la
+    # de los datos de producto que no cambian con el stock)
+    nombre = modelo if isinstance(modelo, str) else modelo._meta.label_lower
+    return f'{PREFIJO_VERSION}:{nombre}'
+
+
+def _version_nueva():
+    # Hora actual más un sufijo aleatorio: no se repite entre procesos ni
+    # aunque la caché pierda la versión anterior
+    return f'{time.time_ns():x}{secrets.token_hex(2)}'
+
+
+def version_datos(*modelos):
+    """Devuelve la versión de datos combinada de los modelos (o nombres) indicados"""
+    claves = [_clave_version(modelo) for modelo in modelos]
+    versiones = cache.get_many(claves)
+    faltantes = {clave: _version_nueva() for clave in claves if clave not in versiones}
+    if faltantes:
+        for clave, valor in faltantes.items():
+            cache.add(clave, valor, timeout=None)
+        versiones.update(cache.get_many(list(faltantes)))
+    return '-'.join(str(versiones.get(clave, 0)) for clave in claves)
+
+
+def invalidar(*modelos):
+    """Asigna una versión de datos nueva a los modelos indicados"""
+    cache.set_many({_clave_version(modelo): _version_nueva() for modelo in modelos}, timeout=None)
+
+
+def consulta_cacheada(nombre, modelos, calcular, *partes, timeout=None):
+    """
+    Devuelve el resultado de ``calcular()`` cacheado mientras no cambien
+    los ``modelos`` de los que depende. ``partes`` distingue variantes de
+    la misma consulta (filtros, página, etc.).
+    """
+    clave = ':'.join(
+        ['inventario:consulta', nombre, version_datos(*modelos)] + [str(parte) for parte in partes]
+    )
+    resultado = cache.get(clave)
+    if resultado is None:
+        resultado = calcular()
+        cache.set(clave, resultado, TIEMPO_CACHE if timeout is None else timeout)
+    return resultado
+
+
+def contexto_cache(*modelos):
+    """Variables para usar con ``{% cache tiempo_cache nombre version_datos %}``"""
+    return {
+        'version_datos': version_datos(*modelos),
+        'tiempo_cache': TIEMPO_CACHE,
+    }
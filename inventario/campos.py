@@ -0,0 +1,105 @@
+"""
+Campo de modelo para secretos cifrados.
+
+``CampoCifrado`` guarda el token de Fernet del llavero indicado y en Python
+entrega un ``Secreto``. Al leer de la base de datos no se descifra nada:
+el texto se obtiene recién al usar ``Secreto.texto``, así que los listados
+que no muestran secretos no pagan el costo del cifrado. Asignar un texto
+al campo lo cifra al guardar.
+
+El contenido no se puede filtrar: cada cifrado produce un token distinto.
+"""
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+
+from .cifrado import ValorNoDescifrable, cifrar, descifrar
+
+
+class Secreto:
+    """Valor de un ``CampoCifrado``: token guardado y texto, cada uno calculado al pedirlo"""
+
+    __slots__ = ('llavero', '_token', '_texto')
+
+    def __init__(self, llavero, token=None, texto=None):
+        self.llavero = llavero
+        self._token = token
+        self._texto = texto
+
+    @property
+    def token(self):
+        if self._token is None:
+            self._token = cifrar(self.llavero, self._texto)
+        return self._token
+
+    @property
+    def texto(self):
+        """Texto descifrado; lanza ``ValorNoDescifrable`` si ninguna clave lo descifra"""
+        if self._texto is None:
+            self._texto = descifrar(self.llavero, self._token)
+        return self._texto
+
+    def texto_o_none(self):
+        try:
+            return self.texto
+        except ValorNoDescifrable:
+            return None
+
+    def __bool__(self):
+        return bool(self._token or self._texto)
+
+    def __str__(self):
+        # Nunca se muestra el secreto por accidente en plantillas o logs
+        return '********'
+
+    def __repr__(self):
+        return f'<Secreto {self.llavero}>'
+
+
+class _DescriptorCifrado(DeferredAttribute):
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = self.field.envolver(value)
+
+
+class CampoCifrado(models.TextField):
+    """``TextField`` con el token de Fernet del llavero ``llavero`` (ver ``inventario.cifrado``)"""
+
+    descriptor_class = _DescriptorCifrado
+
+    def __init__(self, *args, llavero, **kwargs):
+        self.llavero = llavero
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        nombre, ruta, args, kwargs = super().deconstruct()
+        kwargs['llavero'] = self.llavero
+        return nombre, ruta, args, kwargs
+
+    def envolver(self, valor):
+        """Convierte un texto asignado al campo en un ``Secreto`` pendiente de cifrar"""
+        if valor is None or isinstance(valor, Secreto):
+            return valor
+        if valor == '':
+            return None
+        return Secreto(self.llavero, texto=str(valor))
+
+    def from_db_value(self, value, expression, connection):
+        if not value:
+            return None
+        return Secreto(self.llavero, token=value)
+
+    def to_python(self, value):
+        # Al deserializar (loaddata) el valor es el token guardado
+        if isinstance(value, str) and value:
+            return Secreto(self.llavero, token=value)
+        return self.envolver(value)
+
+    def get_prep_value(self, value):
+        if isinstance(value, Secreto):
+            return value.token
+        if not value:
+            return value
+        return cifrar(self.llavero, str(value))
+
+    def value_to_string(self, obj):
+        secreto = self.value_from_object(obj)
+        return secreto.token if secreto else None
@@ -0,0 +1,106 @@
+"""
+Cifrado de los secretos guardados (claves de licencia y contraseñas).
+
+Cada tipo de secreto tiene su llavero, configurado en settings con una
+clave Fernet o con varias: una lista o un texto separado por comas, con la
+clave nueva primero. Se cifra siempre con la primera y se descifra con
+cualquiera, de modo que se puede agregar una clave nueva, re-cifrar con
+``rotar_claves`` y luego retirar la anterior. Los objetos ``MultiFernet``
+se construyen una sola vez por proceso.
+
+Los valores se guardan como el token de Fernet tal cual (ya es base64
+apto para URL). El campo de modelo que los usa es ``CampoCifrado``.
+"""
+from functools import lru_cache
+
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+# Settings de cada llavero, en orden de preferencia
+SETTINGS_LLAVEROS = {
+    'licencias': ('LICENSE_ENCRYPTION_KEY',),
+    'cuentas': ('ACCOUNT_ENCRYPTION_KEY', 'LICENSE_ENCRYPTION_KEY'),
+    'winbox': ('WINBOX_ENCRYPTION_KEY', 'LICENSE_ENCRYPTION_KEY'),
+}
+
+
+class ValorNoDescifrable(ValueError):
+    """El valor no se puede descifrar con ninguna clave del llavero"""
+
+
+def _claves(valor):
+    if isinstance(valor, (list, tuple)):
+        claves = list(valor)
+    else:
+        if isinstance(valor, bytes):
+            valor = valor.decode()
+        claves = valor.split(',')
+    claves = [clave.decode() if isinstance(clave, bytes) else clave for clave in claves]
+    # Las variables de entorno suelen traer la representación de bytes: b'...'
+    claves = [clave.strip().removeprefix("b'").removesuffix("'") for clave in claves]
+    return [clave for clave in claves if clave]
+
+
+def claves_configuradas(nombre):
+    """Claves del llavero ``nombre`` (la primera es la vigente)"""
+    for setting in SETTINGS_LLAVEROS[nombre]:
+        valor = getattr(settings, setting, None)
+        if valor:
+            return _claves(valor)
+    raise ImproperlyConfigured(
+        f"Falta la clave de cifrado de {nombre}: defina {' o '.join(SETTINGS_LLAVEROS[nombre])}"
+    )
+
+
+@lru_cache(maxsize=None)
+def _fernets(nombre):
+    try:
+        fernets = [Fernet(clave) for clave in claves_configuradas(nombre)]
+    except ValueError as e:
+        raise ImproperlyConfigured(f'Clave de cifrado de {nombre} inválida: {e}') from e
+    return fernets[0], MultiFernet(fernets)
+
+
+@receiver(setting_changed)
+def _limpiar_llaveros(setting, **kwargs):
+    if any(setting in settings_llavero for settings_llavero in SETTINGS_LLAVEROS.values()):
+        _fernets.cache_clear()
+
+
+def llavero(nombre):
+    """``MultiFernet`` del llavero ``nombre``"""
+    return _fernets(nombre)[1]
+
+
+def cifrar(nombre, texto):
+    """Token de ``texto`` cifrado con la clave vigente del llavero ``nombre``"""
+    return llavero(nombre).encrypt(texto.encode()).decode()
+
+
+def descifrar(nombre, token):
+    """Texto original de ``token``; lanza ``ValorNoDescifrable`` si no corresponde a ninguna clave"""
+    try:
+        return llavero(nombre).decrypt(token.encode()).decode()
+    except InvalidToken as e:
+        raise ValorNoDescifrable('Ninguna clave del llavero descifra el valor') from e
+
+
+def cifrado_con_clave_vigente(nombre, token):
+    """Indica si ``token`` ya está cifrado con la primera clave del llavero"""
+    vigente = _fernets(nombre)[0]
+    try:
+        vigente.decrypt(token.encode())
+    except InvalidToken:
+        return False
+    return True
+
+
+def rotar(nombre, token):
+    """``token`` cifrado de nuevo con la clave vigente, conservando su marca de tiempo"""
+    try:
+        return llavero(nombre).rotate(token.encode()).decode()
+    except InvalidToken as e:
+        raise ValorNoDescifrable('Ninguna clave del llavero descifra el valor') from e
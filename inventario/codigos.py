@@ -0,0 +1,112 @@
+"""
+Códigos automáticos de productos.
+
+Cada prefijo (las tres primeras letras de la categoría) tiene su fila en
+``SecuenciaCodigo`` con el último número asignado. Asignar códigos es un
+único ``UPDATE ... SET ultimo = ultimo + n`` que bloquea la fila hasta el
+commit, así que dos altas simultáneas nunca reciben el mismo número y no
+hace falta recorrer los códigos existentes. Solo la primera vez que se usa
+un prefijo se busca el número más alto ya ocupado para iniciar la secuencia;
+después, los códigos ``PREFIJO-n`` cargados a mano adelantan la secuencia
+al guardarse (``cubrir_codigo``).
+"""
+import re
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import Producto, SecuenciaCodigo
+
+DIGITOS = 5
+
+# Mayor valor que admite ``SecuenciaCodigo.ultimo`` (PositiveIntegerField)
+MAXIMO_SECUENCIA = 2 ** 31 - 1
+
+
+def prefijo_categoria(categoria):
+    return categoria.nombre[:3].upper()
+
+
+def formatear_codigo(prefijo, numero):
+    return f"{prefijo}-{numero:0{DIGITOS}d}"
+
+
+# Cualquier código ``PREFIJO-n``; el prefijo llega hasta el último guion
+PATRON_CODIGO = re.compile(r'^(.+)-(\d+)$')
+
+
+def _patron(prefijo):
+    return re.compile(rf'^{re.escape(prefijo)}-(\d+)$')
+
+
+def _ultimo_existente(prefijo):
+    """Número más alto entre los códigos ``PREFIJO-n`` que ya existen"""
+    patron = _patron(prefijo)
+    ultimo = 0
+    codigos = Producto.objects.filter(codigo__startswith=f'{prefijo}-').values_list('codigo', flat=True)
+    for codigo in codigos.iterator():
+        coincidencia = patron.match(codigo)
+        if coincidencia and int(coincidencia.group(1)) <= MAXIMO_SECUENCIA:
+            ultimo = max(ultimo, int(coincidencia.group(1)))
+    return ultimo
+
+
+def _secuencia(prefijo):
+    # Valor inicial perezoso: los códigos existentes se recorren solo al crear la fila
+    secuencia, _ = SecuenciaCodigo.objects.get_or_create(
+        prefijo=prefijo, defaults={'ultimo': lambda: _ultimo_existente(prefijo)}
+    )
+    return secuencia
+
+
+def reservar_numeros(prefijo, cantidad=1):
+    """Reserva ``cantidad`` números consecutivos de ``prefijo`` y devuelve su ``range``"""
+    if cantidad < 1:
+        raise ValueError('La cantidad de códigos a reservar debe ser positiva')
+    with transaction.atomic():
+        secuencia = _secuencia(prefijo)
+        SecuenciaCodigo.objects.filter(pk=secuencia.pk).update(ultimo=F('ultimo') + cantidad)
+        # La fila queda bloqueada por el UPDATE: la lectura ve nuestro valor
+        ultimo = SecuenciaCodigo.objects.filter(pk=secuencia.pk).values_list('ultimo', flat=True).get()
+    return range(ultimo - cantidad + 1, ultimo + 1)
+
+
+def reservar_codigos(categoria, cantidad):
+    """Lista de ``cantidad`` códigos nuevos para ``categoria`` (por ejemplo, para importaciones)"""
+    prefijo = prefijo_categoria(categoria)
+    return [formatear_codigo(prefijo, numero) for numero in reservar_numeros(prefijo, cantidad)]
+
+
+def generar_codigo(categoria):
+    """Asigna el siguiente código de ``categoria``"""
+    return reservar_codigos(categoria, 1)[0]
+
+
+def siguiente_codigo(categoria):
+    """Código que recibiría el próximo producto de ``categoria``, sin reservarlo"""
+    prefijo = prefijo_categoria(categoria)
+    return formatear_codigo(prefijo, _secuencia(prefijo).ultimo + 1)
+
+
+def es_vista_previa(categoria, codigo, sugerido):
+    """
+    Indica si ``codigo`` es la vista previa de ``siguiente_codigo`` que el
+    formulario mostró (``sugerido``) sin cambios, y debe asignarse de la
+    secuencia. Un código escrito a mano nunca se reemplaza.
+    """
+    return bool(sugerido) and codigo == sugerido and bool(_patron(prefijo_categoria(categoria)).match(codigo))
+
+
+def cubrir_codigo(codigo):
+    """
+    Adelanta la secuencia del prefijo de ``codigo`` hasta su número si lo
+    supera, para que un código ``PREFIJO-n`` cargado a mano no se vuelva a
+    generar. Si el prefijo aún no tiene secuencia no hace nada: al crearla
+    se parte del número más alto existente. Los números que no caben en la
+    secuencia (por ejemplo, una serie larga como ``SN-123456789012``) se
+    ignoran.
+    """
+    coincidencia = PATRON_CODIGO.match(codigo or '')
+    if coincidencia and int(coincidencia.group(2)) <= MAXIMO_SECUENCIA:
+        prefijo, numero = coincidencia.group(1), int(coincidencia.group(2))
+        SecuenciaCodigo.objects.filter(prefijo=prefijo, ultimo__lt=numero).update(ultimo=numero)
@@ -0,0 +1,250 @@
+"""
+Generación de códigos de barras con caché.
+
+La imagen de un código nunca cambia para el mismo texto y las mismas
+opciones, así que se guarda en dos niveles: un LRU en memoria por proceso
+y un almacén en disco direccionado por el hash de código y opciones,
+compartido entre procesos. Solo si ambos fallan se dibuja la imagen.
+El almacén en disco se poda a ``MAX_ARCHIVOS`` borrando los menos usados.
+
+El formato por defecto es SVG: las barras se escriben como un único
+``path`` a partir de los módulos de Code128, sin Pillow ni rasterizado, y
+escala sin pérdida al imprimir. Para los PDF se arma un ``Drawing`` de
+ReportLab con los mismos módulos, también vectorial.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from io import BytesIO
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Directorio del almacén en disco y cantidad máxima de imágenes guardadas
+DIRECTORIO = getattr(
+    settings, 'INVENTARIO_CODIGOS_BARRAS_DIR', os.path.join(settings.MEDIA_ROOT, 'codigos_barras')
+)
+MAX_ARCHIVOS = getattr(settings, 'INVENTARIO_CODIGOS_BARRAS_MAX_ARCHIVOS', 10000)
+# Imágenes que se mantienen en memoria en cada proceso
+MAX_MEMORIA = getattr(settings, 'INVENTARIO_CODIGOS_BARRAS_MAX_MEMORIA', 512)
+# Formato de las imágenes en las páginas y etiquetas: 'svg' o 'png'
+FORMATO = getattr(settings, 'INVENTARIO_CODIGOS_BARRAS_FORMATO', 'svg')
+# Cada cuántas escrituras se revisa el límite del almacén en disco
+ESCRITURAS_POR_PODA = 100
+
+OPCIONES_PNG = {
+    'module_height': 15.0,  # Altura de las barras (más alto)
+    'module_width': 0.4,    # Ancho de las barras (más ancho)
+    'quiet_zone': 6.0,      # Espacio en blanco a los lados
+    'font_size': 0,         # Tamaño de fuente 0 = sin texto
+    'text_distance': 0,     # Sin distancia de texto
+    'write_text': False,    # No escribir texto debajo de las barras
+}
+
+# Las mismas medidas (en mm) sirven para el SVG
+OPCIONES_SVG = OPCIONES_PNG
+
+# Cambia si cambia la forma de dibujar, para no servir imágenes viejas del disco
+VERSION_DIBUJO = 2
+
+OPCIONES_POR_FORMATO = {'png': OPCIONES_PNG, 'svg': OPCIONES_SVG}
+
+TIPOS_CONTENIDO = {'png': 'image/png', 'svg': 'image/svg+xml'}
+
+
+class _CacheLRU:
+    """Diccionario acotado que descarta primero lo usado hace más tiempo"""
+
+    def __init__(self, maximo):
+        self.maximo = maximo
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, clave):
+        with self._lock:
+            valor = self._datos.get(clave)
+            if valor is not None:
+                self._datos.move_to_end(clave)
+            return valor
+
+    def set(self, clave, valor):
+        with self._lock:
+            self._datos[clave] = valor
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.maximo:
+                self._datos.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._datos.clear()
+
+
+_memoria = _CacheLRU(MAX_MEMORIA)
+_escrituras = 0
+
+
+def _clave(codigo, formato, opciones):
+    contenido = json.dumps(
+        {'codigo': codigo, 'formato': formato, 'opciones': opciones, 'version': VERSION_DIBUJO}, sort_keys=True
+    )
+    return hashlib.sha256(contenido.encode()).hexdigest()
+
+
+def _ruta(clave, formato):
+    return os.path.join(DIRECTORIO, clave[:2], f'{clave}.{formato}')
+
+
+def _leer_disco(ruta):
+    try:
+        with open(ruta, 'rb') as archivo:
+            contenido = archivo.read()
+    except OSError:
+        return None
+    try:
+        # La fecha de modificación marca el último uso para la poda
+        os.utime(ruta)
+    except OSError:
+        pass
+    return contenido
+
+
+def _escribir_disco(ruta, contenido):
+    global _escrituras
+    try:
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        # Escritura atómica: otro proceso nunca lee un archivo a medias
+        descriptor, temporal = tempfile.mkstemp(dir=os.path.dirname(ruta), suffix='.tmp')
+        with os.fdopen(descriptor, 'wb') as archivo:
+            archivo.write(contenido)
+        os.replace(temporal, ruta)
+    except OSError:
+        logger.warning('No se pudo guardar el código de barras en %s', ruta, exc_info=True)
+        return
+    _escrituras += 1
+    if _escrituras % ESCRITURAS_POR_PODA == 0:
+        podar_almacen()
+
+
+def podar_almacen(maximo=None):
+    """Borra las imágenes menos usadas del disco hasta dejar ``maximo``"""
+    maximo = MAX_ARCHIVOS if maximo is None else maximo
+    archivos = []
+    for raiz, _, nombres in os.walk(DIRECTORIO):
+        for nombre in nombres:
+            ruta = os.path.join(raiz, nombre)
+            try:
+                archivos.append((os.stat(ruta).st_mtime, ruta))
+            except OSError:
+                continue
+    if len(archivos) <= maximo:
+        return 0
+    archivos.sort()
+    sobrantes = archivos[:len(archivos) - maximo]
+    for _, ruta in sobrantes:
+        try:
+            os.remove(ruta)
+        except OSError:
+            pass
+    return len(sobrantes)
+
+
+@lru_cache(maxsize=MAX_MEMORIA)
+def _barras(codigo):
+    """Barras de Code128 como tuplas ``(módulo inicial, ancho en módulos)``"""
+    import barcode
+
+    modulos = barcode.Code128(codigo).build()[0]
+    barras = []
+    inicio = None
+    for posicion, modulo in enumerate(modulos + '0'):
+        if modulo == '1' and inicio is None:
+            inicio = posicion
+        elif modulo != '1' and inicio is not None:
+            barras.append((inicio, posicion - inicio))
+            inicio = None
+    return tuple(barras), len(modulos)
+
+
+def _svg(codigo, opciones):
+    barras, total = _barras(codigo)
+    modulo = opciones['module_width']
+    margen = opciones['quiet_zone']
+    alto = opciones['module_height']
+    ancho = total * modulo + 2 * margen
+    # Un solo path con todas las barras en lugar de un rect por barra
+    trazo = ''.join(
+        f'M{margen + inicio * modulo:g} 0h{largo * modulo:g}v{alto:g}h-{largo * modulo:g}z'
+        for inicio, largo in barras
+    )
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{ancho:g}mm" height="{alto:g}mm" '
+        f'viewBox="0 0 {ancho:g} {alto:g}" shape-rendering="crispEdges">'
+        f'<rect width="100%" height="100%" fill="#fff"/><path d="{trazo}"/></svg>'
+    ).encode()
+
+
+def _dibujar(codigo, formato, opciones):
+    if formato == 'svg':
+        return _svg(codigo, opciones)
+
+    import barcode
+    from barcode.writer import ImageWriter
+
+    buffer = BytesIO()
+    barcode.Code128(codigo, writer=ImageWriter()).write(buffer, options=opciones)
+    return buffer.getvalue()
+
+
+def _opciones(formato, opciones):
+    if formato not in OPCIONES_POR_FORMATO:
+        raise ValueError(f'Formato de código de barras no soportado: {formato}')
+    return {**OPCIONES_POR_FORMATO[formato], **(opciones or {})}
+
+
+def clave_codigo_barras(codigo, formato='png', opciones=None):
+    """Hash que identifica la imagen sin necesidad de dibujarla (sirve de ETag)"""
+    return _clave(codigo, formato, _opciones(formato, opciones))
+
+
+def imagen_codigo_barras(codigo, formato='png', opciones=None):
+    """Bytes del código de barras Code128 de ``codigo`` en ``formato`` (png o svg)"""
+    opciones = _opciones(formato, opciones)
+    clave = _clave(codigo, formato, opciones)
+
+    contenido = _memoria.get(clave)
+    if contenido is not None:
+        return contenido
+
+    ruta = _ruta(clave, formato)
+    contenido = _leer_disco(ruta)
+    if contenido is None:
+        contenido = _dibujar(codigo, formato, opciones)
+        _escribir_disco(ruta, contenido)
+    _memoria.set(clave, contenido)
+    return contenido
+
+
+def dibujo_codigo_barras(codigo, ancho, alto):
+    """
+    ``Drawing`` vectorial de ReportLab con el código de barras de ``codigo``
+    ocupando ``ancho`` x ``alto`` puntos, para etiquetas en PDF.
+    """
+    from reportlab.graphics.shapes import Drawing, Rect
+    from reportlab.lib import colors
+
+    barras, total = _barras(codigo)
+    margen = OPCIONES_SVG['quiet_zone'] / OPCIONES_SVG['module_width']
+    escala = ancho / (total + 2 * margen)
+    dibujo = Drawing(ancho, alto)
+    for inicio, largo in barras:
+        dibujo.add(Rect(
+            (margen + inicio) * escala, 0, largo * escala, alto,
+            fillColor=colors.black, strokeColor=None, strokeWidth=0,
+        ))
+    return dibujo
@@ -0,0 +1,113 @@
+"""
+Descarga de archivos guardados con soporte de caché HTTP y rangos.
+
+El archivo se envía por bloques desde el almacenamiento, nunca se lee
+completo en memoria. Las respuestas llevan ``ETag`` y ``Last-Modified``
+para que el navegador valide su copia (``304``), y un encabezado
+``Range`` de un solo tramo se responde con ``206`` para poder reanudar
+descargas interrumpidas.
+"""
+import hashlib
+import re
+
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe, quote_etag
+
+TAMANO_BLOQUE = 64 * 1024
+
+RANGO_BYTES = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def _etag(archivo):
+    # Los nombres en el almacenamiento no se reutilizan para otro contenido
+    return quote_etag(hashlib.md5(f'{archivo.name}:{archivo.size}'.encode()).hexdigest())
+
+
+def _rango(encabezado, tamano):
+    """
+    Convierte ``Range`` en ``(inicio, fin)`` inclusivo. Devuelve ``None`` si
+    se debe enviar el archivo completo y ``False`` si el rango no es válido.
+    """
+    coincidencia = RANGO_BYTES.match(encabezado.strip())
+    if not coincidencia:
+        # Varios tramos u otras unidades: se envía el archivo completo
+        return None
+    inicio, fin = coincidencia.groups()
+    if not inicio:
+        if not fin or int(fin) == 0:
+            return False
+        return max(tamano - int(fin), 0), tamano - 1
+    inicio = int(inicio)
+    fin = min(int(fin), tamano - 1) if fin else tamano - 1
+    if inicio >= tamano or inicio > fin:
+        return False
+    return inicio, fin
+
+
+def _leer_tramo(archivo, inicio, longitud):
+    try:
+        archivo.seek(inicio)
+        while longitud > 0:
+            bloque = archivo.read(min(TAMANO_BLOQUE, longitud))
+            if not bloque:
+                break
+            longitud -= len(bloque)
+            yield bloque
+    finally:
+        archivo.close()
+
+
+def _rango_vigente(request, etag, ultima_modificacion):
+    """``If-Range``: solo se respeta ``Range`` si la copia del cliente sigue vigente"""
+    condicion = request.META.get('HTTP_IF_RANGE')
+    if not condicion:
+        return True
+    if condicion.startswith(('"', 'W/')):
+        return condicion == etag
+    fecha = parse_http_date_safe(condicion)
+    return fecha is not None and fecha == ultima_modificacion
+
+
+def respuesta_archivo(request, archivo, nombre_descarga, content_type, ultima_modificacion=None):
+    """
+    Respuesta de descarga para un ``FieldFile``. ``ultima_modificacion`` es
+    un ``datetime`` que se usa para ``Last-Modified``.
+    """
+    tamano = archivo.size
+    etag = _etag(archivo)
+    marca = int(ultima_modificacion.timestamp()) if ultima_modificacion else None
+
+    no_modificado = get_conditional_response(request, etag=etag, last_modified=marca)
+    if no_modificado is not None:
+        no_modificado['ETag'] = etag
+        return no_modificado
+
+    rango = None
+    if request.META.get('HTTP_RANGE') and _rango_vigente(request, etag, marca):
+        rango = _rango(request.META['HTTP_RANGE'], tamano)
+
+    if rango is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{tamano}'
+    elif rango is None:
+        response = FileResponse(
+            archivo.open('rb'), as_attachment=True, filename=nombre_descarga, content_type=content_type
+        )
+        response['Content-Length'] = tamano
+    else:
+        inicio, fin = rango
+        longitud = fin - inicio + 1
+        response = StreamingHttpResponse(
+            _leer_tramo(archivo.open('rb'), inicio, longitud), status=206, content_type=content_type
+        )
+        response['Content-Length'] = longitud
+        response['Content-Range'] = f'bytes {inicio}-{fin}/{tamano}'
+        response['Content-Disposition'] = content_disposition_header(True, nombre_descarga)
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    if marca is not None:
+        response['Last-Modified'] = http_date(marca)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,130 @@
+"""
+Búsqueda de productos por lectura de código de barras.
+
+Los lectores envían el ``codigo`` o la ``serie`` exactos, así que basta un
+diccionario en memoria de cada proceso con ambos campos como clave y los
+datos del producto como valor. La coincidencia distingue mayúsculas; una
+lectura que no coincide tal cual se busca sin distinguirlas solo si ningún
+otro valor difiere del encontrado únicamente en mayúsculas. El índice se
+arma con una sola consulta y se vuelve a armar solo cuando cambia la
+versión de datos de los modelos que muestra.
+
+El stock no forma parte del índice: cada movimiento cambia ``cantidad`` y,
+si estuviera incluida, el índice completo se reconstruiría con cada
+movimiento. El índice sigue ``FICHA_PRODUCTO``, que solo cambia al guardar
+o eliminar productos, y la cantidad se lee al responder con una consulta
+por clave primaria.
+"""
+import threading
+
+from .cache import version_datos
+from .models import Area, Categoria, Personal, Producto, Sede
+
+# Versión de los datos de producto sin el stock: la invalidan las señales de
+# ``Producto`` pero no los movimientos, que actualizan solo ``cantidad``
+FICHA_PRODUCTO = 'inventario.producto:ficha'
+
+# Versiones cuyos cambios obligan a reconstruir el índice
+MODELOS_INDICE = (FICHA_PRODUCTO, Categoria, Sede, Area, Personal)
+
+CAMPOS = {
+    'id': 'id',
+    'codigo': 'codigo',
+    'serie': 'serie',
+    'nombre': 'nombre',
+    'marca': 'marca',
+    'modelo': 'modelo',
+    'estado': 'estado',
+    'categoria': 'categoria__nombre',
+    'sede': 'sede__nombre',
+    'area': 'area__nombre',
+    'personal_asignado': 'personal_asignado__nombre',
+    'personal_apellido': 'personal_asignado__apellido',
+}
+
+_lock = threading.Lock()
+_indice = {'version': None, 'codigos': {}, 'series': {}, 'plegados': {}}
+
+
+def normalizar(valor):
+    return (valor or '').strip()
+
+
+def _plegar(claves):
+    """
+    Clave en mayúsculas -> clave exacta, solo para las que no comparten
+    la forma en mayúsculas con otra distinta
+    """
+    plegadas = {}
+    for clave in claves:
+        plegadas.setdefault(clave.upper(), []).append(clave)
+    return {plegada: exactas[0] for plegada, exactas in plegadas.items() if len(exactas) == 1}
+
+
+def _construir(version):
+    codigos = {}
+    series = {}
+    filas = Producto.objects.order_by('id').values_list(*CAMPOS.values())
+    for fila in filas.iterator(chunk_size=2000):
+        producto = dict(zip(CAMPOS, fila))
+        apellido = producto.pop('personal_apellido')
+        if apellido:
+            producto['personal_asignado'] = f"{producto['personal_asignado']} {apellido}"
+        codigos[normalizar(producto['codigo'])] = producto
+        if producto['serie']:
+            # La serie no es única: se guardan todos los productos que la comparten
+            series.setdefault(normalizar(producto['serie']), []).append(producto)
+    plegados = {'codigos': _plegar(codigos), 'series': _plegar(series)}
+    return {'version': version, 'codigos': codigos, 'series': series, 'plegados': plegados}
+
+
+def _buscar(indice, campo, clave):
+    encontrado = indice[campo].get(clave)
+    if encontrado is None:
+        exacta = indice['plegados'][campo].get(clave.upper())
+        if exacta is not None:
+            encontrado = indice[campo][exacta]
+    return encontrado
+
+
+def indice_actual():
+    """Índice de códigos y series vigente para la versión de datos actual"""
+    global _indice
+    version = version_datos(*MODELOS_INDICE)
+    indice = _indice
+    if indice['version'] != version:
+        with _lock:
+            if _indice['version'] != version:
+                _indice = _construir(version)
+            indice = _indice
+    return indice
+
+
+def _con_cantidad(productos):
+    """Copias de ``productos`` con el stock actual; omite los ya eliminados"""
+    cantidades = dict(
+        Producto.objects.filter(id__in=[producto['id'] for producto in productos]).values_list('id', 'cantidad')
+    )
+    return [
+        {**producto, 'cantidad': cantidades[producto['id']]}
+        for producto in productos if producto['id'] in cantidades
+    ]
+
+
+def buscar_por_lectura(valor):
+    """
+    Productos cuyo ``codigo`` o ``serie`` coincide exactamente con ``valor``.
+    Devuelve ``(campo, productos)``; ``campo`` es ``None`` si no hay coincidencias.
+    """
+    clave = normalizar(valor)
+    if not clave:
+        return None, []
+    indice = indice_actual()
+    producto = _buscar(indice, 'codigos', clave)
+    if producto is not None:
+        return 'codigo', _con_cantidad([producto])
+    productos = _buscar(indice, 'series', clave)
+    if productos:
+        return 'serie', _con_cantidad(productos)
+    return None, []
+
@@ -0,0 +1,158 @@
+"""
+Mantenimiento incremental de las estadísticas del inventario.
+
+El dashboard lee una sola fila de ``EstadisticaInventario`` en lugar de
+recorrer todo el catálogo. Cada alta, edición o baja de productos y
+movimientos aplica aquí su diferencia dentro de la misma transacción. Las
+bajas se registran desde ``post_delete`` para cubrir también las
+eliminaciones en cascada (categorías, sedes, áreas, usuarios).
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Q, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Categoria, EstadisticaCategoria, EstadisticaInventario, Movimiento, Producto
+
+# Un producto se considera con stock bajo por debajo de este umbral
+UMBRAL_STOCK_BAJO = 5
+
+RESUMEN_PK = 1
+
+
+def _a_decimal(valor):
+    if valor in (None, ''):
+        return Decimal('0')
+    return Decimal(str(valor))
+
+
+def valores_producto(producto):
+    """Extrae de un producto los valores que afectan a las estadísticas"""
+    return {
+        'categoria_id': producto.categoria_id,
+        'cantidad': producto.cantidad,
+        'precio_unitario': producto.precio_unitario,
+    }
+
+
+def _aporte(valores):
+    """Calcula lo que un producto aporta a los totales"""
+    if not valores:
+        return None
+    cantidad = int(valores['cantidad'] or 0)
+    return {
+        'categoria_id': valores['categoria_id'],
+        'stock_bajo': 1 if cantidad < UMBRAL_STOCK_BAJO else 0,
+        'valor': _a_decimal(valores['precio_unitario']) * cantidad,
+    }
+
+
+def _actualizar_resumen(**diferencias):
+    """
+    Aplica diferencias a la fila de resumen con expresiones F().
+
+    Si el resumen aún no existe no hay nada que ajustar: ``obtener_resumen``
+    lo construye completo la primera vez que se lee. Reconstruirlo aquí
+    contaría dos veces las bajas en cascada, que ya se borraron todas
+    cuando llega la primera señal.
+    """
+    cambios = {campo: F(campo) + delta for campo, delta in diferencias.items() if delta}
+    if cambios:
+        EstadisticaInventario.objects.filter(pk=RESUMEN_PK).update(**cambios)
+
+
+def _actualizar_categoria(categoria_id, delta):
+    """Aplica una diferencia al conteo de productos de una categoría"""
+    if not delta or categoria_id is None:
+        return
+    actualizadas = EstadisticaCategoria.objects.filter(categoria_id=categoria_id).update(
+        total_productos=F('total_productos') + delta
+    )
+    # Se crea con el conteo real solo en las altas: en una baja en cascada los
+    # productos ya están borrados y las señales siguientes volverían a restar
+    if not actualizadas and delta > 0:
+        EstadisticaCategoria.objects.update_or_create(
+            categoria_id=categoria_id,
+            defaults={'total_productos': Producto.objects.filter(categoria_id=categoria_id).count()}
+        )
+
+
+def registrar_cambio_producto(anterior, actual):
+    """
+    Registra el paso de un producto de ``anterior`` a ``actual``.
+
+    Ambos son diccionarios de ``valores_producto`` o ``None`` (alta o baja).
+    Debe llamarse dentro de la transacción que guarda el producto.
+    """
+    antes = _aporte(anterior)
+    despues = _aporte(actual)
+    if antes is None and despues is None:
+        return
+
+    _actualizar_resumen(
+        total_productos=(despues is not None) - (antes is not None),
+        productos_stock_bajo=(despues['stock_bajo'] if despues else 0) - (antes['stock_bajo'] if antes else 0),
+        valor_total=(despues['valor'] if despues else 0) - (antes['valor'] if antes else 0),
+    )
+
+    categoria_antes = antes['categoria_id'] if antes else None
+    categoria_despues = despues['categoria_id'] if despues else None
+    if categoria_antes != categoria_despues:
+        _actualizar_categoria(categoria_antes, -1)
+        _actualizar_categoria(categoria_despues, 1)
+
+
+def registrar_cambio_stock(cantidad_anterior, cantidad_nueva, precio_unitario):
+    """Registra un cambio de stock hecho sin pasar por ``Producto.save()``"""
+    antes = int(cantidad_anterior or 0)
+    despues = int(cantidad_nueva or 0)
+    _actualizar_resumen(
+        productos_stock_bajo=(despues < UMBRAL_STOCK_BAJO) - (antes < UMBRAL_STOCK_BAJO),
+        valor_total=_a_decimal(precio_unitario) * (despues - antes),
+    )
+
+
+def registrar_movimientos(delta):
+    """Suma ``delta`` al total de movimientos"""
+    _actualizar_resumen(total_movimientos=delta)
+
+
+def recalcular_estadisticas():
+    """Reconstruye todas las estadísticas desde cero y devuelve el resumen"""
+    with transaction.atomic():
+        totales = Producto.objects.aggregate(
+            total_productos=Count('id'),
+            productos_stock_bajo=Count('id', filter=Q(cantidad__lt=UMBRAL_STOCK_BAJO)),
+            valor_total=Coalesce(
+                Sum(F('precio_unitario') * F('cantidad'), output_field=DecimalField(max_digits=18, decimal_places=2)),
+                Decimal('0'),
+                output_field=DecimalField(max_digits=18, decimal_places=2),
+            ),
+        )
+        totales['total_movimientos'] = Movimiento.objects.count()
+        resumen, _ = EstadisticaInventario.objects.update_or_create(pk=RESUMEN_PK, defaults=totales)
+
+        EstadisticaCategoria.objects.all().delete()
+        por_categoria = Producto.objects.order_by().values('categoria_id').annotate(total=Count('id'))
+        EstadisticaCategoria.objects.bulk_create([
+            EstadisticaCategoria(categoria_id=fila['categoria_id'], total_productos=fila['total'])
+            for fila in por_categoria
+        ])
+
+    return resumen
+
+
+def obtener_resumen():
+    """Devuelve la fila de resumen, construyéndola si aún no existe"""
+    resumen = EstadisticaInventario.objects.filter(pk=RESUMEN_PK).first()
+    if resumen is None:
+        resumen = recalcular_estadisticas()
+    return resumen
+
+
+def productos_por_categoria():
+    """Conteo de productos por categoría leído de la tabla precalculada"""
+    return Categoria.objects.annotate(
+        total_productos=Coalesce('estadistica__total_productos', 0)
+    ).values('nombre', 'total_productos').order_by('nombre')
@@ -0,0 +1,218 @@
+"""
+Hojas de etiquetas en PDF para muchos productos a la vez.
+
+Las etiquetas se ubican en la grilla de una hoja adhesiva estándar (tipo
+Avery) y cada una lleva nombre, código de barras, código y sede del
+producto. Los códigos de barras se dibujan como vectores a partir de los
+módulos de Code128, que quedan en caché por código, así que imprimir otra
+vez el mismo lote no vuelve a calcularlos. Los productos se leen con
+``iterator()`` y cada hoja se vuelca al PDF al completarse.
+
+Para impresoras térmicas Zebra las etiquetas también se generan en ZPL:
+texto con el comando nativo de Code128 (``^BC``), que la impresora dibuja
+por sí misma, sin ninguna imagen de por medio.
+"""
+import tempfile
+
+from barcode.errors import BarcodeError
+from django.conf import settings
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from reportlab.graphics import renderPDF
+from reportlab.lib.pagesizes import A4, LETTER
+from reportlab.lib.units import inch, mm
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen import canvas
+
+from .codigos_barras import dibujo_codigo_barras
+
+# Productos como máximo en un mismo PDF de etiquetas
+MAX_ETIQUETAS = getattr(settings, 'INVENTARIO_ETIQUETAS_MAX', 5000)
+
+TAMANO_ITERADOR = 2000
+
+# Medidas de cada hoja: etiqueta, márgenes y distancia entre etiquetas
+PLANTILLAS = {
+    'a4_3x7': {
+        'nombre': 'A4 · 3 x 7 (Avery L7160)',
+        'pagina': A4,
+        'columnas': 3, 'filas': 7,
+        'ancho': 63.5 * mm, 'alto': 38.1 * mm,
+        'margen_izquierdo': 7.2 * mm, 'margen_superior': 15.15 * mm,
+        'paso_horizontal': 66.04 * mm, 'paso_vertical': 38.1 * mm,
+    },
+    'a4_2x7': {
+        'nombre': 'A4 · 2 x 7 (Avery L7163)',
+        'pagina': A4,
+        'columnas': 2, 'filas': 7,
+        'ancho': 99.1 * mm, 'alto': 38.1 * mm,
+        'margen_izquierdo': 4.65 * mm, 'margen_superior': 15.15 * mm,
+        'paso_horizontal': 101.6 * mm, 'paso_vertical': 38.1 * mm,
+    },
+    'carta_3x10': {
+        'nombre': 'Carta · 3 x 10 (Avery 5160)',
+        'pagina': LETTER,
+        'columnas': 3, 'filas': 10,
+        'ancho': 2.625 * inch, 'alto': 1 * inch,
+        'margen_izquierdo': 0.1875 * inch, 'margen_superior': 0.5 * inch,
+        'paso_horizontal': 2.75 * inch, 'paso_vertical': 1 * inch,
+    },
+}
+
+PLANTILLA_POR_DEFECTO = 'a4_3x7'
+
+RELLENO = 2 * mm
+
+# Etiqueta ZPL: tamaño en mm y resolución de la impresora (puntos por pulgada)
+ZPL_ANCHO_MM = getattr(settings, 'INVENTARIO_ETIQUETAS_ZPL_ANCHO_MM', 50)
+ZPL_ALTO_MM = getattr(settings, 'INVENTARIO_ETIQUETAS_ZPL_ALTO_MM', 25)
+ZPL_DPI = getattr(settings, 'INVENTARIO_ETIQUETAS_ZPL_DPI', 203)
+
+
+def _recortar(texto, fuente, tamano, ancho):
+    """Recorta ``texto`` con puntos suspensivos para que entre en ``ancho``"""
+    if stringWidth(texto, fuente, tamano) <= ancho:
+        return texto
+    while texto and stringWidth(texto + '…', fuente, tamano) > ancho:
+        texto = texto[:-1]
+    return texto + '…'
+
+
+def _dibujar_etiqueta(lienzo, producto, x, y, plantilla):
+    """Dibuja la etiqueta de ``producto`` con su esquina inferior izquierda en ``(x, y)``"""
+    ancho = plantilla['ancho'] - 2 * RELLENO
+    alto = plantilla['alto'] - 2 * RELLENO
+    izquierda = x + RELLENO
+    centro = x + plantilla['ancho'] / 2
+    arriba = y + plantilla['alto'] - RELLENO
+
+    tamano_nombre = 7 if alto < 30 * mm else 8
+    lienzo.setFont('Helvetica-Bold', tamano_nombre)
+    lienzo.drawCentredString(
+        centro, arriba - tamano_nombre, _recortar(producto.nombre, 'Helvetica-Bold', tamano_nombre, ancho)
+    )
+
+    sede = producto.sede.nombre if producto.sede_id else ''
+    pie = 6 if sede else 0
+    alto_barras = alto - tamano_nombre - 8 - pie - 4
+    try:
+        dibujo = dibujo_codigo_barras(producto.codigo, ancho, alto_barras)
+    except BarcodeError:
+        # Code128 no admite el código (por ejemplo, con tildes): la etiqueta
+        # lleva solo el nombre y el código en texto
+        lienzo.setFont('Helvetica-Bold', 10)
+        lienzo.drawCentredString(
+            centro, y + RELLENO + pie + 9 + alto_barras / 2 - 3,
+            _recortar(producto.codigo, 'Helvetica-Bold', 10, ancho),
+        )
+    else:
+        renderPDF.draw(dibujo, lienzo, izquierda, y + RELLENO + pie + 9)
+        lienzo.setFont('Helvetica', 8)
+        lienzo.drawCentredString(centro, y + RELLENO + pie + 1, producto.codigo)
+
+    if sede:
+        lienzo.setFont('Helvetica', 6)
+        lienzo.drawCentredString(centro, y + RELLENO, _recortar(sede, 'Helvetica', 6, ancho))
+
+
+def escribir_hoja_etiquetas(destino, productos, plantilla=PLANTILLA_POR_DEFECTO):
+    """
+    Escribe en ``destino`` el PDF con una etiqueta por producto, llenando
+    cada hoja por filas. Devuelve la cantidad de etiquetas.
+    """
+    plantilla = PLANTILLAS[plantilla]
+    ancho_pagina, alto_pagina = plantilla['pagina']
+    por_hoja = plantilla['columnas'] * plantilla['filas']
+
+    lienzo = canvas.Canvas(destino, pagesize=plantilla['pagina'])
+    lienzo.setTitle('Etiquetas de productos')
+    total = 0
+    for producto in productos:
+        posicion = total % por_hoja
+        if total and not posicion:
+            lienzo.showPage()
+        fila, columna = divmod(posicion, plantilla['columnas'])
+        x = plantilla['margen_izquierdo'] + columna * plantilla['paso_horizontal']
+        y = alto_pagina - plantilla['margen_superior'] - fila * plantilla['paso_vertical'] - plantilla['alto']
+        _dibujar_etiqueta(lienzo, producto, x, y, plantilla)
+        total += 1
+    lienzo.save()
+    return total
+
+
+def respuesta_etiquetas(productos, plantilla=PLANTILLA_POR_DEFECTO):
+    """PDF de etiquetas de ``productos`` armado en un temporal y enviado por bloques"""
+    temporal = tempfile.TemporaryFile()
+    try:
+        escribir_hoja_etiquetas(
+            temporal, productos.select_related('sede').iterator(chunk_size=TAMANO_ITERADOR), plantilla
+        )
+    except Exception:
+        temporal.close()
+        raise
+    temporal.seek(0)
+    archivo = f"Etiquetas_{timezone.now().strftime('%Y-%m-%d_%H-%M')}.pdf"
+    return FileResponse(temporal, filename=archivo, content_type='application/pdf')
+
+
+def _texto_zpl(texto):
+    """
+    Escapa ``texto`` para un ``^FD`` precedido de ``^FH``: los caracteres de
+    control de ZPL y todo lo que no es ASCII van como ``_XX`` en UTF-8.
+    """
+    return ''.join(
+        caracter if caracter.isascii() and caracter.isprintable() and caracter not in '^~_'
+        else ''.join(f'_{byte:02X}' for byte in caracter.encode())
+        for caracter in texto
+    )
+
+
+def etiqueta_zpl(producto):
+    """Etiqueta ZPL de ``producto`` con nombre, código de barras, código y sede"""
+    puntos_mm = ZPL_DPI / 25.4
+    ancho = round(ZPL_ANCHO_MM * puntos_mm)
+    alto = round(ZPL_ALTO_MM * puntos_mm)
+    margen = round(2 * puntos_mm)
+    util = ancho - 2 * margen
+
+    # Code128 subconjunto B: 11 módulos por carácter más inicio, control y parada
+    modulos = 11 * (len(producto.codigo) + 2) + 13
+    modulo = max(1, min(3, util // modulos))
+    x_barras = max(margen, (ancho - modulos * modulo) // 2)
+
+    sede = producto.sede.nombre if producto.sede_id else ''
+    fuente = max(alto // 9, 14)
+    alto_barras = alto - 2 * margen - 2 * fuente - (fuente if sede else 0) - 12
+    # ^FB sobrescribe la última línea con lo que no entra: se recorta antes
+    caracteres = util * 2 // fuente
+    nombre, sede = producto.nombre[:caracteres], sede[:caracteres]
+
+    lineas = [
+        '^XA',
+        '^CI28',
+        f'^PW{ancho}',
+        f'^LL{alto}',
+        f'^FO{margen},{margen}^A0N,{fuente},{fuente}^FB{util},1,0,C^FH^FD{_texto_zpl(nombre)}^FS',
+        f'^FO{x_barras},{margen + fuente + 4}^BY{modulo}'
+        f'^BCN,{alto_barras},N,N,N^FH^FD{_texto_zpl(producto.codigo)}^FS',
+        f'^FO{margen},{margen + fuente + alto_barras + 8}^A0N,{fuente},{fuente}'
+        f'^FB{util},1,0,C^FH^FD{_texto_zpl(producto.codigo)}^FS',
+    ]
+    if sede:
+        lineas.append(
+            f'^FO{margen},{alto - margen - fuente}^A0N,{fuente},{fuente}^FB{util},1,0,C^FH^FD{_texto_zpl(sede)}^FS'
+        )
+    lineas.append('^XZ')
+    return '\n'.join(lineas) + '\n'
+
+
+def respuesta_zpl(productos, nombre='Etiquetas'):
+    """Descarga ZPL con una etiqueta por producto, enviada a medida que se genera"""
+    etiquetas = (
+        etiqueta_zpl(producto)
+        for producto in productos.select_related('sede').iterator(chunk_size=TAMANO_ITERADOR)
+    )
+    response = StreamingHttpResponse(etiquetas, content_type='application/zpl; charset=utf-8')
+    archivo = f"{nombre}_{timezone.now().strftime('%Y-%m-%d_%H-%M')}.zpl"
+    response['Content-Disposition'] = f'attachment; filename="{archivo}"'
+    return response
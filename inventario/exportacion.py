@@ -0,0 +1,124 @@
+"""
+Exportación de listados a XLSX.
+
+Los listados se escriben con el libro de solo escritura de ``openpyxl``,
+que vuelca cada fila a disco en cuanto se agrega, y las filas se leen de
+la base de datos con ``iterator()``. El archivo terminado se envía por
+bloques desde un temporal, así que la memoria usada no depende de la
+cantidad de filas exportadas.
+"""
+import tempfile
+from datetime import datetime
+
+from django.http import FileResponse
+from django.utils import timezone
+
+TAMANO_ITERADOR = 2000
+
+TIPO_XLSX = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def _texto(objeto):
+    return str(objeto) if objeto is not None else ''
+
+
+def _celda(valor):
+    # Excel no admite fechas con zona horaria
+    if isinstance(valor, datetime) and timezone.is_aware(valor):
+        return timezone.localtime(valor).replace(tzinfo=None)
+    return valor
+
+
+COLUMNAS_PRODUCTOS = [
+    ('Código', lambda p: p.codigo),
+    ('Nombre', lambda p: p.nombre),
+    ('Categoría', lambda p: p.categoria.nombre),
+    ('Marca', lambda p: p.marca),
+    ('Modelo', lambda p: p.modelo),
+    ('Serie', lambda p: p.serie),
+    ('Sede', lambda p: _texto(p.sede)),
+    ('Área', lambda p: _texto(p.area)),
+    ('Personal asignado', lambda p: _texto(p.personal_asignado)),
+    ('Tipo de propiedad', lambda p: p.get_tipo_propiedad_display()),
+    ('Estado', lambda p: p.get_estado_display()),
+    ('Cantidad', lambda p: p.cantidad),
+    ('Precio unitario', lambda p: p.precio_unitario),
+    ('Ubicación', lambda p: p.ubicacion),
+    ('Fecha de adquisición', lambda p: p.fecha_adquisicion),
+    ('Proveedor', lambda p: p.proveedor),
+    ('Garantía hasta', lambda p: p.garantia_hasta),
+]
+
+COLUMNAS_MOVIMIENTOS = [
+    ('Fecha', lambda m: m.fecha_movimiento),
+    ('Código', lambda m: m.producto.codigo),
+    ('Producto', lambda m: m.producto.nombre),
+    ('Tipo', lambda m: m.tipo_movimiento.nombre),
+    ('Cantidad', lambda m: m.cantidad),
+    ('Cantidad anterior', lambda m: m.cantidad_anterior),
+    ('Cantidad nueva', lambda m: m.cantidad_nueva),
+    ('Usuario', lambda m: m.usuario.get_full_name() or m.usuario.username),
+    ('Motivo', lambda m: m.motivo),
+    ('Referencia', lambda m: m.referencia),
+    ('Sede origen', lambda m: _texto(m.sede_origen)),
+    ('Área origen', lambda m: _texto(m.area_origen)),
+    ('Sede destino', lambda m: _texto(m.sede_destino)),
+    ('Área destino', lambda m: _texto(m.area_destino)),
+]
+
+# Las claves y contraseñas encriptadas nunca se exportan
+COLUMNAS_LICENCIAS = [
+    ('Nombre', lambda lic: lic.nombre),
+    ('Tipo', lambda lic: lic.get_tipo_display()),
+    ('Distribución', lambda lic: lic.get_tipo_distribucion_display()),
+    ('Proveedor', lambda lic: lic.proveedor),
+    ('Fecha de adquisición', lambda lic: lic.fecha_adquisicion),
+    ('Fecha de vencimiento', lambda lic: lic.fecha_vencimiento),
+    ('Precio', lambda lic: lic.precio),
+    ('Cantidad', lambda lic: lic.cantidad_licencias),
+    ('Disponibles', lambda lic: lic.licencias_disponibles),
+    ('Activo', lambda lic: 'Sí' if lic.activo else 'No'),
+]
+
+COLUMNAS_CUENTAS = [
+    ('Nombre', lambda c: c.nombre),
+    ('Tipo', lambda c: c.get_tipo_cuenta_display()),
+    ('Email', lambda c: c.email),
+    ('Usuario', lambda c: c.usuario),
+    ('Estado', lambda c: c.get_estado_display()),
+    ('Sede', lambda c: _texto(c.sede)),
+    ('Área', lambda c: _texto(c.area)),
+    ('Personal asignado', lambda c: _texto(c.personal_asignado)),
+    ('Plan', lambda c: c.plan_suscripcion),
+    ('Costo mensual', lambda c: c.costo_mensual),
+    ('Proveedor', lambda c: c.proveedor),
+    ('Fecha de vencimiento', lambda c: c.fecha_vencimiento),
+]
+
+
+def escribir_xlsx(destino, columnas, objetos, titulo='Datos'):
+    """Escribe ``objetos`` en ``destino`` con una columna por ``(título, valor)``"""
+    from openpyxl import Workbook
+
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet(titulo)
+    hoja.append([encabezado for encabezado, _ in columnas])
+    for objeto in objetos:
+        hoja.append([_celda(valor(objeto)) for _, valor in columnas])
+    libro.save(destino)
+
+
+def respuesta_xlsx(queryset, columnas, nombre, titulo='Datos'):
+    """
+    Descarga XLSX de ``queryset``. El libro se arma en un temporal en disco
+    y la respuesta lo envía por bloques; el temporal se borra al cerrarla.
+    """
+    temporal = tempfile.TemporaryFile()
+    try:
+        escribir_xlsx(temporal, columnas, queryset.iterator(chunk_size=TAMANO_ITERADOR), titulo)
+    except Exception:
+        temporal.close()
+        raise
+    temporal.seek(0)
+    archivo = f"{nombre}_{timezone.now().strftime('%Y-%m-%d_%H-%M')}.xlsx"
+    return FileResponse(temporal, as_attachment=True, filename=archivo, content_type=TIPO_XLSX)
@@ -0,0 +1,359 @@
+"""
+Importación masiva de movimientos desde CSV o XLSX.
+
+El archivo se lee fila a fila y se procesa por lotes. Productos, tipos,
+sedes, áreas y personal se resuelven con ``in_bulk`` (una consulta por
+modelo y lote), los movimientos se insertan con ``bulk_create`` y al final
+se aplica una única actualización de stock por producto, todo dentro de
+una misma transacción. Las filas con errores se informan y se omiten.
+
+Una importación grande puede tardar más que el margen de la sincronización
+incremental: los movimientos y productos que toca se vuelven a fechar al
+confirmar, para que los clientes que sincronizaron mientras tanto los reciban.
+"""
+import csv
+import io
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+from functools import partial
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .cache import invalidar
+from .estadisticas import registrar_cambio_stock, registrar_movimientos
+from .models import Area, Movimiento, Personal, Producto, Sede, TipoMovimiento
+from .sincronizacion import fechar_ids_al_confirmar
+
+# Columnas reconocidas en la cabecera del archivo
+COLUMNAS = (
+    'producto', 'tipo_movimiento', 'cantidad', 'motivo', 'referencia',
+    'sede_origen', 'area_origen', 'sede_destino', 'area_destino',
+    'personal_origen', 'personal_destino',
+)
+COLUMNAS_OBLIGATORIAS = ('producto', 'tipo_movimiento', 'cantidad')
+
+# Columnas que referencian un objeto por id
+RELACIONES = {
+    'sede_origen': Sede,
+    'area_origen': Area,
+    'sede_destino': Sede,
+    'area_destino': Area,
+    'personal_origen': Personal,
+    'personal_destino': Personal,
+}
+
+TAMANO_LOTE = 500
+
+
+class ErrorImportacion(ValueError):
+    """El archivo no se puede importar"""
+
+
+class ResultadoImportacion:
+    """Resumen de una importación: movimientos creados y errores por fila"""
+
+    def __init__(self):
+        self.filas = 0
+        self.creados = 0
+        self.productos_actualizados = 0
+        self.errores = []
+
+    def agregar_error(self, fila, mensaje):
+        self.errores.append({'fila': fila, 'error': mensaje})
+
+    @property
+    def omitidas(self):
+        return len(self.errores)
+
+
+def _texto(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return str(valor).strip()
+
+
+def _entero(valor):
+    texto = _texto(valor)
+    if not texto:
+        return None
+    try:
+        numero = Decimal(texto)
+    except InvalidOperation:
+        raise ValueError(texto)
+    if numero != numero.to_integral_value():
+        raise ValueError(texto)
+    return int(numero)
+
+
+def _normalizar_cabecera(cabecera):
+    return [_texto(columna).lower().replace(' ', '_') for columna in cabecera]
+
+
+def _validar_cabecera(columnas):
+    faltantes = [columna for columna in COLUMNAS_OBLIGATORIAS if columna not in columnas]
+    if faltantes:
+        raise ErrorImportacion(f'Faltan columnas obligatorias: {", ".join(faltantes)}')
+
+
+def _filas_csv(archivo):
+    texto = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+    muestra = texto.read(4096)
+    texto.seek(0)
+    try:
+        dialecto = csv.Sniffer().sniff(muestra, delimiters=',;\t')
+    except csv.Error:
+        dialecto = csv.excel
+    lector = csv.reader(texto, dialecto)
+    try:
+        cabecera = _normalizar_cabecera(next(lector))
+    except StopIteration:
+        raise ErrorImportacion('El archivo está vacío')
+    except UnicodeDecodeError:
+        raise ErrorImportacion('El archivo CSV debe estar codificado en UTF-8')
+    _validar_cabecera(cabecera)
+    try:
+        for numero, valores in enumerate(lector, start=2):
+            if any(_texto(valor) for valor in valores):
+                yield numero, dict(zip(cabecera, valores))
+    except UnicodeDecodeError:
+        raise ErrorImportacion('El archivo CSV debe estar codificado en UTF-8')
+    finally:
+        texto.detach()
+
+
+def _filas_xlsx(archivo):
+    from openpyxl import load_workbook
+
+    try:
+        libro = load_workbook(archivo, read_only=True, data_only=True)
+    except Exception:
+        raise ErrorImportacion('No se pudo leer el archivo Excel')
+    try:
+        filas = libro.active.iter_rows(values_only=True)
+        try:
+            cabecera = _normalizar_cabecera(next(filas))
+        except StopIteration:
+            raise ErrorImportacion('El archivo está vacío')
+        _validar_cabecera(cabecera)
+        for numero, valores in enumerate(filas, start=2):
+            if any(_texto(valor) for valor in valores):
+                yield numero, dict(zip(cabecera, valores))
+    finally:
+        libro.close()
+
+
+def leer_filas(archivo, nombre_archivo):
+    """Genera ``(numero_de_fila, datos)`` de un archivo CSV o XLSX"""
+    extension = nombre_archivo.rsplit('.', 1)[-1].lower() if '.' in nombre_archivo else ''
+    if extension == 'csv':
+        return _filas_csv(archivo)
+    if extension == 'xlsx':
+        return _filas_xlsx(archivo)
+    raise ErrorImportacion('Formato no soportado: use un archivo .csv o .xlsx')
+
+
+def _lotes(filas, tamano):
+    lote = []
+    for fila in filas:
+        lote.append(fila)
+        if len(lote) >= tamano:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+class _Importador:
+    """Estado de una importación en curso (dentro de la transacción)"""
+
+    def __init__(self, usuario, resultado):
+        self.usuario = usuario
+        self.resultado = resultado
+        self.productos = {}
+        self.tipos = {}
+        self.relacionados = defaultdict(dict)
+        # Stock corriente y stock inicial de cada producto tocado
+        self.saldos = {}
+        self.saldos_iniciales = {}
+        # Productos cuyo stock cambió
+        self.actualizados = []
+        # Movimientos insertados (el id es un UUID asignado antes de insertar)
+        self.importados = []
+
+    def _cargar_productos(self, codigos):
+        nuevos = [codigo for codigo in codigos if codigo not in self.productos]
+        if not nuevos:
+            return
+        # Bloquear las filas hasta el commit: el saldo calculado aquí es el real
+        encontrados = Producto.objects.select_for_update().only(
+            'id', 'codigo', 'cantidad', 'precio_unitario'
+        ).in_bulk(nuevos, field_name='codigo')
+        for codigo in nuevos:
+            producto = encontrados.get(codigo)
+            self.productos[codigo] = producto
+            if producto is not None:
+                self.saldos[producto.pk] = producto.cantidad
+                self.saldos_iniciales[producto.pk] = producto.cantidad
+
+    def _cargar_tipos(self, nombres):
+        nuevos = [nombre for nombre in nombres if nombre not in self.tipos]
+        if nuevos:
+            encontrados = TipoMovimiento.objects.in_bulk(nuevos, field_name='nombre')
+            for nombre in nuevos:
+                self.tipos[nombre] = encontrados.get(nombre)
+
+    def _cargar_relacionados(self, ids_por_modelo):
+        for modelo, ids in ids_por_modelo.items():
+            cargados = self.relacionados[modelo]
+            nuevos = [pk for pk in ids if pk not in cargados]
+            if nuevos:
+                encontrados = modelo.objects.in_bulk(nuevos)
+                for pk in nuevos:
+                    cargados[pk] = encontrados.get(pk)
+
+    def _preparar(self, datos):
+        """Valida una fila y devuelve sus valores limpios o lanza ``ValueError``"""
+        limpio = {
+            'producto': _texto(datos.get('producto')),
+            'tipo_movimiento': _texto(datos.get('tipo_movimiento')),
+            'motivo': _texto(datos.get('motivo')) or 'Importación masiva',
+            'referencia': _texto(datos.get('referencia')) or None,
+        }
+        if not limpio['producto']:
+            raise ValueError('Falta el código del producto')
+        if not limpio['tipo_movimiento']:
+            raise ValueError('Falta el tipo de movimiento')
+        try:
+            limpio['cantidad'] = _entero(datos.get('cantidad'))
+        except ValueError:
+            raise ValueError(f'Cantidad inválida: {_texto(datos.get("cantidad"))}')
+        if not limpio['cantidad'] or limpio['cantidad'] < 1:
+            raise ValueError('La cantidad debe ser un entero mayor que cero')
+        for columna in RELACIONES:
+            try:
+                limpio[columna] = _entero(datos.get(columna))
+            except ValueError:
+                raise ValueError(f'{columna}: id inválido')
+        return limpio
+
+    def procesar_lote(self, lote):
+        preparadas = []
+        for numero, datos in lote:
+            try:
+                preparadas.append((numero, self._preparar(datos)))
+            except ValueError as e:
+                self.resultado.agregar_error(numero, str(e))
+
+        self._cargar_productos({fila['producto'] for _, fila in preparadas})
+        self._cargar_tipos({fila['tipo_movimiento'] for _, fila in preparadas})
+        ids_por_modelo = defaultdict(set)
+        for _, fila in preparadas:
+            for columna, modelo in RELACIONES.items():
+                if fila[columna] is not None:
+                    ids_por_modelo[modelo].add(fila[columna])
+        self._cargar_relacionados(ids_por_modelo)
+
+        movimientos = []
+        for numero, fila in preparadas:
+            producto = self.productos.get(fila['producto'])
+            if producto is None:
+                self.resultado.agregar_error(numero, f'Producto no encontrado: {fila["producto"]}')
+                continue
+            tipo = self.tipos.get(fila['tipo_movimiento'])
+            if tipo is None:
+                self.resultado.agregar_error(numero, f'Tipo de movimiento no encontrado: {fila["tipo_movimiento"]}')
+                continue
+            relacionados = {}
+            faltante = None
+            for columna, modelo in RELACIONES.items():
+                if fila[columna] is None:
+                    relacionados[columna] = None
+                    continue
+                relacionados[columna] = self.relacionados[modelo].get(fila[columna])
+                if relacionados[columna] is None:
+                    faltante = f'{columna}: no existe {modelo._meta.verbose_name} con id {fila[columna]}'
+                    break
+            if faltante:
+                self.resultado.agregar_error(numero, faltante)
+                continue
+
+            anterior = self.saldos[producto.pk]
+            nueva = anterior + (fila['cantidad'] if tipo.es_entrada else -fila['cantidad'])
+            if nueva < 0:
+                self.resultado.agregar_error(
+                    numero, f'Stock insuficiente en {producto.codigo}: disponible {anterior}, se pide {fila["cantidad"]}'
+                )
+                continue
+            self.saldos[producto.pk] = nueva
+
+            movimientos.append(Movimiento(
+                producto=producto,
+                tipo_movimiento=tipo,
+                cantidad=fila['cantidad'],
+                cantidad_anterior=anterior,
+                cantidad_nueva=nueva,
+                usuario=self.usuario,
+                motivo=fila['motivo'],
+                referencia=fila['referencia'],
+                **relacionados
+            ))
+
+        # ``bulk_create`` no pasa por ``Movimiento.save()``: el stock se aplica al final
+        Movimiento.objects.bulk_create(movimientos, batch_size=TAMANO_LOTE)
+        self.importados.extend(movimiento.pk for movimiento in movimientos)
+        self.resultado.creados += len(movimientos)
+
+    def aplicar_stock(self):
+        """Una actualización por producto con la diferencia acumulada"""
+        ahora = timezone.now()
+        productos = {producto.pk: producto for producto in self.productos.values() if producto is not None}
+        for producto_id, saldo_inicial in self.saldos_iniciales.items():
+            diferencia = self.saldos[producto_id] - saldo_inicial
+            if not diferencia:
+                continue
+            Producto.objects.filter(pk=producto_id).update(
+                cantidad=F('cantidad') + diferencia,
+                fecha_actualizacion=ahora,
+            )
+            registrar_cambio_stock(saldo_inicial, self.saldos[producto_id], productos[producto_id].precio_unitario)
+            self.actualizados.append(producto_id)
+            self.resultado.productos_actualizados += 1
+        if self.resultado.creados:
+            registrar_movimientos(self.resultado.creados)
+
+
+class _Simulacion(Exception):
+    pass
+
+
+def importar_movimientos(archivo, nombre_archivo, usuario, simular=False, tamano_lote=TAMANO_LOTE):
+    """
+    Importa los movimientos de ``archivo`` en nombre de ``usuario``.
+
+    Devuelve un ``ResultadoImportacion``. Con ``simular`` se valida todo
+    pero se deshace la transacción. Lanza ``ErrorImportacion`` si el
+    archivo no tiene un formato válido.
+    """
+    resultado = ResultadoImportacion()
+    filas = leer_filas(archivo, nombre_archivo)
+    try:
+        with transaction.atomic():
+            importador = _Importador(usuario, resultado)
+            for lote in _lotes(filas, tamano_lote):
+                resultado.filas += len(lote)
+                importador.procesar_lote(lote)
+            importador.aplicar_stock()
+            resultado.errores.sort(key=lambda error: error['fila'])
+            if simular:
+                raise _Simulacion()
+            # ``bulk_create`` y ``update()`` no emiten señales
+            transaction.on_commit(partial(invalidar, Producto, Movimiento))
+            fechar_ids_al_confirmar(Movimiento, importador.importados, 'fecha_actualizacion')
+            fechar_ids_al_confirmar(Producto, importador.actualizados, 'fecha_actualizacion')
+    except _Simulacion:
+        pass
+    return resultado
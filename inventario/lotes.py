@@ -0,0 +1,67 @@
+"""
+Generación de reportes por lotes en varios procesos.
+
+El renderizado con ReportLab usa una sola CPU, así que un lote (por
+ejemplo, el cierre de mes con los reportes de cada sede) se reparte en un
+``ProcessPoolExecutor``. Cada proceso abre su propia conexión a la base de
+datos, reserva el reporte con la misma reserva condicionada que el worker
+de la cola y guarda el resultado en su fila ``Reporte``.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+
+from .models import Sede
+from .procesos import generar_reporte, iniciar_proceso
+from .reportes import encolar_reporte
+
+# Procesos por defecto para generar lotes (None: uno por CPU)
+PROCESOS = getattr(settings, 'INVENTARIO_REPORTES_PROCESOS', None)
+
+TIPOS_LOTE = ('inventario', 'movimientos', 'categoria')
+
+
+def procesos_por_defecto():
+    return PROCESOS or os.cpu_count() or 1
+
+
+def encolar_lote(usuario, sedes=None, tipos=TIPOS_LOTE, parametros=None):
+    """
+    Encola un reporte de cada tipo para cada sede activa (o las indicadas)
+    y devuelve la lista de reportes creados.
+    """
+    if sedes is None:
+        sedes = Sede.objects.filter(activo=True).order_by('nombre')
+    reportes = []
+    for sede in sedes:
+        for tipo in tipos:
+            reportes.append(encolar_reporte(
+                tipo, usuario, {**(parametros or {}), 'sede_id': sede.id}, sufijo=f'_{sede.nombre}'
+            ))
+    return reportes
+
+
+def crear_pool(procesos=None):
+    """
+    Pool de procesos para ``generar_en_paralelo``. El inicializador y la
+    tarea viven en ``procesos``, que se puede importar antes de
+    ``django.setup()``.
+    """
+    return ProcessPoolExecutor(
+        max_workers=procesos or procesos_por_defecto(),
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=iniciar_proceso,
+    )
+
+
+def generar_en_paralelo(reporte_ids, pool):
+    """
+    Genera los reportes indicados en ``pool``. Produce ``(id, completado,
+    error)`` a medida que terminan; ``completado`` es ``None`` si el reporte
+    no estaba pendiente.
+    """
+    futuros = [pool.submit(generar_reporte, reporte_id) for reporte_id in reporte_ids]
+    for futuro in as_completed(futuros):
+        yield futuro.result()
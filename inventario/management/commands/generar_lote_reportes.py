@@ -0,0 +1,59 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventario.lotes import TIPOS_LOTE, crear_pool, encolar_lote, generar_en_paralelo, procesos_por_defecto
+from inventario.models import Reporte, Sede, Usuario
+
+
+class Command(BaseCommand):
+    help = 'Genera en paralelo un reporte de cada tipo por sede (lote de cierre)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuario', required=True, help='Usuario a nombre de quien quedan los reportes')
+        parser.add_argument('--sede', type=int, action='append', help='Id de sede (por defecto todas las activas)')
+        parser.add_argument('--tipo', choices=TIPOS_LOTE, action='append', help='Tipo de reporte (por defecto todos)')
+        parser.add_argument('--fecha-desde', help='Fecha inicial de los movimientos (AAAA-MM-DD)')
+        parser.add_argument('--fecha-hasta', help='Fecha final de los movimientos (AAAA-MM-DD)')
+        parser.add_argument('--procesos', type=int, default=procesos_por_defecto(), help='Procesos en paralelo')
+
+    def handle(self, *args, **options):
+        try:
+            usuario = Usuario.objects.get(username=options['usuario'])
+        except Usuario.DoesNotExist:
+            raise CommandError(f'Usuario no encontrado: {options["usuario"]}')
+
+        sedes = None
+        if options['sede']:
+            sedes = list(Sede.objects.filter(id__in=options['sede']).order_by('nombre'))
+            if not sedes:
+                raise CommandError('Ninguna de las sedes indicadas existe')
+
+        parametros = {'fecha_desde': options['fecha_desde'], 'fecha_hasta': options['fecha_hasta']}
+        reportes = encolar_lote(usuario, sedes, options['tipo'] or TIPOS_LOTE, parametros)
+        pendientes = [reporte.id for reporte in reportes if reporte.en_proceso]
+        reutilizados = len(reportes) - len(pendientes)
+        procesos = max(1, options['procesos'])
+        self.stdout.write(
+            f'{len(reportes)} reportes en el lote ({reutilizados} sin cambios), '
+            f'generando {len(pendientes)} con {procesos} procesos...'
+        )
+
+        inicio = time.monotonic()
+        completados = fallidos = 0
+        with crear_pool(procesos) as pool:
+            for reporte_id, completado, error in generar_en_paralelo(pendientes, pool):
+                nombre = Reporte.objects.filter(pk=reporte_id).values_list('nombre', flat=True).first()
+                if completado:
+                    completados += 1
+                    self.stdout.write(self.style.SUCCESS(f'Reporte "{nombre}" completado'))
+                elif completado is None:
+                    self.stdout.write(f'Reporte "{nombre}" lo tomó otro worker')
+                else:
+                    fallidos += 1
+                    self.stdout.write(self.style.WARNING(f'Reporte "{nombre}" falló: {error}'))
+
+        self.stdout.write(
+            f'Lote terminado en {time.monotonic() - inicio:.1f} s: '
+            f'{completados} generados, {reutilizados} reutilizados, {fallidos} con errores'
+        )
@@ -0,0 +1,43 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventario.importacion import TAMANO_LOTE, ErrorImportacion, importar_movimientos
+from inventario.models import Usuario
+
+
+class Command(BaseCommand):
+    help = 'Importa movimientos de inventario desde un archivo CSV o XLSX'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del archivo .csv o .xlsx')
+        parser.add_argument('--usuario', required=True, help='Usuario que registra los movimientos')
+        parser.add_argument('--simular', action='store_true', help='Valida el archivo sin guardar cambios')
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help='Filas procesadas por lote')
+
+    def handle(self, *args, **options):
+        try:
+            usuario = Usuario.objects.get(username=options['usuario'])
+        except Usuario.DoesNotExist:
+            raise CommandError(f'Usuario no encontrado: {options["usuario"]}')
+
+        ruta = options['archivo']
+        try:
+            with open(ruta, 'rb') as archivo:
+                resultado = importar_movimientos(
+                    archivo, os.path.basename(ruta), usuario,
+                    simular=options['simular'], tamano_lote=max(1, options['lote'])
+                )
+        except OSError as e:
+            raise CommandError(f'No se pudo abrir el archivo: {e}')
+        except ErrorImportacion as e:
+            raise CommandError(str(e))
+
+        for error in resultado.errores:
+            self.stderr.write(f'Fila {error["fila"]}: {error["error"]}')
+
+        prefijo = 'Simulación: ' if options['simular'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefijo}{resultado.filas} filas leídas, {resultado.creados} movimientos creados, '
+            f'{resultado.productos_actualizados} productos actualizados, {resultado.omitidas} filas con errores'
+        ))
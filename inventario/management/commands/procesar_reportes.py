@@ -0,0 +1,66 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from inventario.lotes import crear_pool, generar_en_paralelo
+from inventario.reportes import procesar_reporte, reportes_pendientes, tomar_reporte
+
+
+class Command(BaseCommand):
+    help = 'Genera los reportes pendientes de la cola (worker en segundo plano)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--una-vez', action='store_true', help='Procesa lo pendiente y termina')
+        parser.add_argument('--intervalo', type=float, default=2.0, help='Segundos de espera cuando no hay trabajo')
+        parser.add_argument('--procesos', type=int, default=1, help='Reportes generados en paralelo')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Worker de reportes iniciado')
+        self.procesados = 0
+        try:
+            if options['procesos'] > 1:
+                self._en_paralelo(options)
+            else:
+                self._en_serie(options)
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(f'Worker de reportes detenido: {self.procesados} reportes generados')
+
+    def _en_serie(self, options):
+        while True:
+            close_old_connections()
+            reporte = tomar_reporte()
+            if reporte is None:
+                if options['una_vez']:
+                    break
+                time.sleep(options['intervalo'])
+                continue
+
+            self.stdout.write(f'Generando "{reporte.nombre}" (intento {reporte.intentos})...')
+            if procesar_reporte(reporte):
+                self.procesados += 1
+                self.stdout.write(self.style.SUCCESS(f'Reporte "{reporte.nombre}" completado'))
+            else:
+                self.stdout.write(self.style.WARNING(
+                    f'Reporte "{reporte.nombre}" falló ({reporte.get_estado_display()}): {reporte.error}'
+                ))
+
+    def _en_paralelo(self, options):
+        with crear_pool(options['procesos']) as pool:
+            while True:
+                close_old_connections()
+                pendientes = reportes_pendientes()
+                if not pendientes:
+                    if options['una_vez']:
+                        break
+                    time.sleep(options['intervalo'])
+                    continue
+
+                self.stdout.write(f'Generando {len(pendientes)} reportes con {options["procesos"]} procesos...')
+                for reporte_id, completado, error in generar_en_paralelo(pendientes, pool):
+                    if completado:
+                        self.procesados += 1
+                        self.stdout.write(self.style.SUCCESS(f'Reporte {reporte_id} completado'))
+                    elif completado is False:
+                        self.stdout.write(self.style.WARNING(f'Reporte {reporte_id} falló: {error}'))
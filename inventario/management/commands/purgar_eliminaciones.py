@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from inventario.sincronizacion import RETENCION, purgar_eliminaciones
+
+
+class Command(BaseCommand):
+    help = (
+        'Borra los registros de eliminaciones más antiguos que INVENTARIO_SYNC_RETENCION_DIAS. '
+        'Los clientes con una marca anterior deberán sincronizar desde cero.'
+    )
+
+    def handle(self, *args, **options):
+        borradas = purgar_eliminaciones()
+        self.stdout.write(self.style.SUCCESS(
+            f'{borradas} eliminaciones con más de {RETENCION.days} días borradas'
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from inventario.estadisticas import recalcular_estadisticas
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye desde cero la tabla de estadísticas del inventario'
+
+    def handle(self, *args, **options):
+        resumen = recalcular_estadisticas()
+        self.stdout.write(self.style.SUCCESS(
+            f'Estadísticas recalculadas: {resumen.total_productos} productos, '
+            f'{resumen.total_movimientos} movimientos, '
+            f'{resumen.productos_stock_bajo} con stock bajo, '
+            f'valor total ${resumen.valor_total:,.2f}'
+        ))
@@ -0,0 +1,73 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from inventario.campos import Secreto
+from inventario.cifrado import ValorNoDescifrable, cifrado_con_clave_vigente, rotar
+from inventario.models import ConexionWinbox, Cuenta, Licencia
+
+# Campo cifrado de cada llavero
+CAMPOS_CIFRADOS = {
+    'licencias': (Licencia, 'clave_licencia'),
+    'cuentas': (Cuenta, 'password'),
+    'winbox': (ConexionWinbox, 'password'),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Re-cifra los secretos guardados con la clave vigente (la primera de cada llavero). '
+        'Trabaja por lotes; si se interrumpe, volver a ejecutarlo continúa donde quedó.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--llavero', choices=CAMPOS_CIFRADOS, action='append', help='Llavero a rotar (por defecto todos)'
+        )
+        parser.add_argument('--lote', type=int, default=500, help='Filas leídas y actualizadas por transacción')
+        parser.add_argument('--desde-id', type=int, default=0, help='Continuar a partir de este id')
+        parser.add_argument('--simular', action='store_true', help='Contar lo que se rotaría sin guardar cambios')
+
+    def handle(self, *args, **options):
+        lote = max(1, options['lote'])
+        for nombre in options['llavero'] or CAMPOS_CIFRADOS:
+            inicio = time.monotonic()
+            rotados, vigentes, fallidos = self._rotar_llavero(nombre, lote, options['desde_id'], options['simular'])
+            self.stdout.write(self.style.SUCCESS(
+                f'{nombre}: {rotados} re-cifrados, {vigentes} ya vigentes, {fallidos} sin descifrar '
+                f'({time.monotonic() - inicio:.1f} s)'
+            ))
+
+    def _rotar_llavero(self, nombre, lote, desde_id, simular):
+        modelo, campo = CAMPOS_CIFRADOS[nombre]
+        pendientes = modelo.objects.exclude(**{f'{campo}__isnull': True}).exclude(**{campo: ''}).order_by('pk')
+        rotados = vigentes = fallidos = 0
+        ultimo_id = desde_id
+        while True:
+            filas = list(pendientes.filter(pk__gt=ultimo_id).values_list('pk', campo)[:lote])
+            if not filas:
+                break
+            cambios = []
+            for pk, secreto in filas:
+                if cifrado_con_clave_vigente(nombre, secreto.token):
+                    vigentes += 1
+                    continue
+                try:
+                    cambios.append((pk, secreto, Secreto(nombre, token=rotar(nombre, secreto.token))))
+                except ValorNoDescifrable:
+                    fallidos += 1
+                    self.stdout.write(self.style.WARNING(f'{nombre}: id {pk} no se puede descifrar con ninguna clave'))
+
+            if not simular:
+                # Transacción corta por lote. Solo se actualiza si el valor no cambió desde
+                # la lectura, así que no hace falta bloquear filas ni tablas
+                with transaction.atomic():
+                    for pk, anterior, nuevo in cambios:
+                        rotados += modelo.objects.filter(pk=pk, **{campo: anterior}).update(**{campo: nuevo})
+            else:
+                rotados += len(cambios)
+
+            ultimo_id = filas[-1][0]
+            self.stdout.write(f'{nombre}: procesado hasta id {ultimo_id}')
+        return rotados, vigentes, fallidos
@@ -0,0 +1,45 @@
+"""
+Cifras de resumen de los reportes.
+
+Cada tipo de reporte declara sus métricas como el valor inicial y el aporte
+de cada fila, y se acumulan mientras el reporte recorre sus filas. Así la
+tabla se lee una sola vez y el total impreso siempre coincide con las filas
+impresas, aunque los datos cambien durante la generación.
+"""
+from decimal import Decimal
+
+from .estadisticas import UMBRAL_STOCK_BAJO
+
+METRICAS_PRODUCTOS = {
+    'total_productos': (0, lambda producto: 1),
+    'productos_stock_bajo': (0, lambda producto: int(producto.cantidad < UMBRAL_STOCK_BAJO)),
+    'valor_total': (
+        Decimal('0'), lambda producto: (producto.precio_unitario or Decimal('0')) * (producto.cantidad or 0)
+    ),
+}
+
+METRICAS_MOVIMIENTOS = {
+    'total_movimientos': (0, lambda movimiento: 1),
+    'entradas': (0, lambda movimiento: int(movimiento.tipo_movimiento.es_entrada)),
+    'salidas': (0, lambda movimiento: int(not movimiento.tipo_movimiento.es_entrada)),
+}
+
+
+class Metricas(dict):
+    """Métricas de un reporte, acumuladas fila a fila con ``agregar``"""
+
+    def __init__(self, definicion):
+        super().__init__({nombre: inicial for nombre, (inicial, _) in definicion.items()})
+        self._aportes = [(nombre, aporte) for nombre, (_, aporte) in definicion.items()]
+
+    def agregar(self, objeto):
+        for nombre, aporte in self._aportes:
+            self[nombre] += aporte(objeto)
+
+
+def metricas_productos():
+    return Metricas(METRICAS_PRODUCTOS)
+
+
+def metricas_movimientos():
+    return Metricas(METRICAS_MOVIMIENTOS)
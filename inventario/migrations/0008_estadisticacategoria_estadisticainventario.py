@@ -0,0 +1,40 @@
+# Generated by Django 5.2.4 on 2026-10-17 15:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0007_planificacionsemanal_conexionwinbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadisticaCategoria',
+            fields=[
+                ('categoria', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='estadistica', serialize=False, to='inventario.categoria')),
+                ('total_productos', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Estadística de Categoría',
+                'verbose_name_plural': 'Estadísticas de Categorías',
+            },
+        ),
+        migrations.CreateModel(
+            name='EstadisticaInventario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_productos', models.IntegerField(default=0)),
+                ('total_movimientos', models.IntegerField(default=0)),
+                ('productos_stock_bajo', models.IntegerField(default=0)),
+                ('valor_total', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Estadística de Inventario',
+                'verbose_name_plural': 'Estadísticas de Inventario',
+            },
+        ),
+    ]
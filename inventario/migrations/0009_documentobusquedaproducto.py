@@ -0,0 +1,107 @@
+# Generated by Django 5.2.4 on 2026-10-17 16:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+TABLA = 'inventario_documentobusquedaproducto'
+TABLA_FTS = 'inventario_producto_fts'
+
+
+def _sqlite_tiene_fts5(cursor):
+    try:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+    except Exception:
+        return False
+
+
+def crear_indices(apps, schema_editor):
+    """Crea el índice de texto completo propio de cada motor"""
+    motor = schema_editor.connection.vendor
+    with schema_editor.connection.cursor() as cursor:
+        if motor == 'postgresql':
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            cursor.execute(
+                f"CREATE INDEX inventario_docbusq_tsv_idx ON {TABLA} "
+                f"USING GIN (to_tsvector('simple', contenido))"
+            )
+            cursor.execute(
+                f'CREATE INDEX inventario_docbusq_trgm_idx ON {TABLA} USING GIN (contenido gin_trgm_ops)'
+            )
+        elif motor == 'mysql':
+            cursor.execute(f'CREATE FULLTEXT INDEX inventario_docbusq_ft_idx ON {TABLA} (contenido)')
+        elif motor == 'sqlite' and _sqlite_tiene_fts5(cursor):
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE {TABLA_FTS} USING fts5("
+                f"contenido, content='{TABLA}', content_rowid='producto_id', "
+                f"tokenize='unicode61 remove_diacritics 2')"
+            )
+            cursor.execute(
+                f'CREATE TRIGGER {TABLA_FTS}_ai AFTER INSERT ON {TABLA} BEGIN '
+                f'INSERT INTO {TABLA_FTS}(rowid, contenido) VALUES (new.producto_id, new.contenido); END'
+            )
+            cursor.execute(
+                f'CREATE TRIGGER {TABLA_FTS}_ad AFTER DELETE ON {TABLA} BEGIN '
+                f"INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, contenido) "
+                f"VALUES ('delete', old.producto_id, old.contenido); END"
+            )
+            cursor.execute(
+                f'CREATE TRIGGER {TABLA_FTS}_au AFTER UPDATE ON {TABLA} BEGIN '
+                f"INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, contenido) "
+                f"VALUES ('delete', old.producto_id, old.contenido); "
+                f'INSERT INTO {TABLA_FTS}(rowid, contenido) VALUES (new.producto_id, new.contenido); END'
+            )
+
+
+def eliminar_indices(apps, schema_editor):
+    motor = schema_editor.connection.vendor
+    with schema_editor.connection.cursor() as cursor:
+        if motor == 'postgresql':
+            cursor.execute('DROP INDEX IF EXISTS inventario_docbusq_tsv_idx')
+            cursor.execute('DROP INDEX IF EXISTS inventario_docbusq_trgm_idx')
+        elif motor == 'mysql':
+            cursor.execute(f'DROP INDEX inventario_docbusq_ft_idx ON {TABLA}')
+        elif motor == 'sqlite':
+            for sufijo in ('ai', 'ad', 'au'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {TABLA_FTS}_{sufijo}')
+            cursor.execute(f'DROP TABLE IF EXISTS {TABLA_FTS}')
+
+
+def poblar_documentos(apps, schema_editor):
+    """Genera el documento de búsqueda de los productos existentes"""
+    Producto = apps.get_model('inventario', 'Producto')
+    DocumentoBusquedaProducto = apps.get_model('inventario', 'DocumentoBusquedaProducto')
+
+    lote = []
+    campos = ('id', 'codigo', 'nombre', 'marca', 'modelo')
+    for fila in Producto.objects.order_by().values_list(*campos).iterator(chunk_size=2000):
+        contenido = ' '.join(str(valor) for valor in fila[1:] if valor)
+        lote.append(DocumentoBusquedaProducto(producto_id=fila[0], contenido=contenido))
+        if len(lote) >= 2000:
+            DocumentoBusquedaProducto.objects.bulk_create(lote)
+            lote = []
+    if lote:
+        DocumentoBusquedaProducto.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0008_estadisticacategoria_estadisticainventario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentoBusquedaProducto',
+            fields=[
+                ('producto', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='documento_busqueda', serialize=False, to='inventario.producto')),
+                ('contenido', models.TextField(blank=True, default='')),
+            ],
+            options={
+                'verbose_name': 'Documento de Búsqueda',
+                'verbose_name_plural': 'Documentos de Búsqueda',
+            },
+        ),
+        migrations.RunPython(crear_indices, eliminar_indices),
+        migrations.RunPython(poblar_documentos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-17 16:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0009_documentobusquedaproducto'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(fields=['fecha_movimiento', 'id'], name='inventario_mov_fecha_id'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['nombre', 'id'], name='inventario_prod_nombre_id'),
+        ),
+    ]
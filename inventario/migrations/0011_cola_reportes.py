@@ -0,0 +1,60 @@
+# Generated by Django 5.2.4 on 2026-10-17 16:07
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def marcar_existentes_completados(apps, schema_editor):
+    """Los reportes anteriores a la cola ya se generaron dentro de la petición"""
+    Reporte = apps.get_model('inventario', 'Reporte')
+    Reporte.objects.update(estado='completado', progreso=100)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0010_indices_paginacion_cursor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reporte',
+            name='error',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='reporte',
+            name='estado',
+            field=models.CharField(choices=[('pendiente', 'Pendiente'), ('procesando', 'Procesando'), ('completado', 'Completado'), ('error', 'Error')], default='pendiente', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='reporte',
+            name='fecha_finalizacion',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='reporte',
+            name='fecha_inicio',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='reporte',
+            name='intentos',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='reporte',
+            name='programado_para',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='reporte',
+            name='progreso',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='reporte',
+            index=models.Index(fields=['estado', 'programado_para'], name='inventario_reporte_cola'),
+        ),
+        migrations.RunPython(marcar_existentes_completados, migrations.RunPython.noop),
+    ]
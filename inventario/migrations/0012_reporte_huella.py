@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-17 16:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0011_cola_reportes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reporte',
+            name='huella',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 5.2.4 on 2026-10-17 17:23
+
+import base64
+import binascii
+
+import inventario.campos
+from django.db import migrations, transaction
+
+# Todo token de Fernet empieza con la versión 0x80 en base64 URL
+PREFIJO_TOKEN = 'gAAAAA'
+TAMANO_LOTE = 500
+
+CAMPOS = (
+    ('licencia', 'clave_licencia'),
+    ('cuenta', 'password'),
+    ('conexionwinbox', 'password'),
+)
+
+
+def _compactar(valor):
+    """``base64(token)`` -> ``token``; ``None`` si el valor ya está compacto o no es reconocible"""
+    if valor.startswith(PREFIJO_TOKEN):
+        return None
+    try:
+        token = base64.b64decode(valor.encode(), validate=True).decode('ascii')
+    except (binascii.Error, UnicodeDecodeError):
+        return None
+    return token if token.startswith(PREFIJO_TOKEN) else None
+
+
+def _expandir(valor):
+    if not valor.startswith(PREFIJO_TOKEN):
+        return None
+    return base64.b64encode(valor.encode()).decode()
+
+
+def _convertir(apps, convertir):
+    # Lotes en transacciones separadas (la migración no es atómica): la tabla
+    # no queda bloqueada y, si se corta, lo ya convertido se detecta y se salta
+    for modelo, campo in CAMPOS:
+        Modelo = apps.get_model('inventario', modelo)
+        filas = Modelo.objects.exclude(**{f'{campo}__isnull': True}).exclude(**{campo: ''}).order_by('pk')
+        ultimo_id = 0
+        while True:
+            lote = list(filas.filter(pk__gt=ultimo_id).values_list('pk', campo)[:TAMANO_LOTE])
+            if not lote:
+                break
+            with transaction.atomic():
+                for pk, valor in lote:
+                    nuevo = convertir(valor)
+                    if nuevo is not None:
+                        Modelo.objects.filter(pk=pk, **{campo: valor}).update(**{campo: nuevo})
+            ultimo_id = lote[-1][0]
+
+
+def compactar_secretos(apps, schema_editor):
+    _convertir(apps, _compactar)
+
+
+def expandir_secretos(apps, schema_editor):
+    _convertir(apps, _expandir)
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('inventario', '0013_secuencia_codigo'),
+    ]
+
+    operations = [
+        # Se convierte con los campos todavía como texto, antes de cambiarlos
+        migrations.RunPython(compactar_secretos, expandir_secretos),
+        migrations.AlterField(
+            model_name='conexionwinbox',
+            name='password',
+            field=inventario.campos.CampoCifrado(blank=True, help_text='Contraseña encriptada', llavero='winbox', null=True),
+        ),
+        migrations.AlterField(
+            model_name='cuenta',
+            name='password',
+            field=inventario.campos.CampoCifrado(blank=True, help_text='Contraseña encriptada', llavero='cuentas', null=True),
+        ),
+        migrations.AlterField(
+            model_name='licencia',
+            name='clave_licencia',
+            field=inventario.campos.CampoCifrado(blank=True, help_text='Clave de licencia encriptada', llavero='licencias', null=True),
+        ),
+    ]
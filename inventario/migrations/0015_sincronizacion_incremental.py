@@ -0,0 +1,52 @@
+# Generated by Django 5.2.4 on 2026-10-17 17:26
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def fecha_actualizacion_desde_movimiento(apps, schema_editor):
+    """Los movimientos existentes se consideran modificados por última vez al registrarse"""
+    Movimiento = apps.get_model('inventario', 'Movimiento')
+    Movimiento.objects.update(fecha_actualizacion=models.F('fecha_movimiento'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0014_secretos_cifrados_compactos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Eliminacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(max_length=100)),
+                ('objeto_id', models.CharField(max_length=64)),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Eliminación',
+                'verbose_name_plural': 'Eliminaciones',
+                'ordering': ['fecha', 'id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='movimiento',
+            name='fecha_actualizacion',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(fecha_actualizacion_desde_movimiento, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(fields=['fecha_actualizacion', 'id'], name='inventario_mov_actualiz_id'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['fecha_actualizacion', 'id'], name='inventario_prod_actualiz_id'),
+        ),
+        migrations.AddIndex(
+            model_name='eliminacion',
+            index=models.Index(fields=['modelo', 'fecha', 'id'], name='inventario_elim_modelo_fecha'),
+        ),
+    ]
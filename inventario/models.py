@@ -1,11 +1,10 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator
 from django.utils import timezone
-from cryptography.fernet import Fernet
-from django.conf import settings
 import uuid
-import base64
+
+from .campos import CampoCifrado
 
 
 class Usuario(AbstractUser):
@@ -127,7 +126,7 @@ class Licencia(models.Model):
     precio = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
     cantidad_licencias = models.IntegerField(default=1)
     licencias_disponibles = models.IntegerField(default=1, help_text="Cantidad de licencias disponibles para asignar")
-    clave_licencia = models.TextField(blank=True, null=True, help_text="Clave de licencia encriptada")
+    clave_licencia = CampoCifrado(llavero='licencias', blank=True, null=True, help_text="Clave de licencia encriptada")
     activo = models.BooleanField(default=True)
     observaciones = models.TextField(blank=True, null=True)
     fecha_creacion = models.DateTimeField(auto_now_add=True)
@@ -140,50 +139,13 @@ class Licencia(models.Model):
     def __str__(self):
         return self.nombre
     
-    def _get_encryption_key(self):
-        """Obtiene la clave de encriptación desde settings o genera una nueva"""
-        if hasattr(settings, 'LICENSE_ENCRYPTION_KEY'):
-            # La clave ya está en bytes, no necesita encode()
-            return settings.LICENSE_ENCRYPTION_KEY
-        else:
-            # Generar una clave si no existe en settings
-            key = Fernet.generate_key()
-            return key
-    
-    def encrypt_license_key(self, license_key):
-        """Encripta la clave de licencia"""
-        if not license_key:
-            return None
-        
-        try:
-            fernet = Fernet(self._get_encryption_key())
-            encrypted_data = fernet.encrypt(license_key.encode())
-            return base64.b64encode(encrypted_data).decode()
-        except Exception as e:
-            # En caso de error, devolver None
-            return None
-    
-    def decrypt_license_key(self):
-        """Desencripta la clave de licencia"""
-        if not self.clave_licencia:
-            return None
-        
-        try:
-            fernet = Fernet(self._get_encryption_key())
-            encrypted_data = base64.b64decode(self.clave_licencia.encode())
-            decrypted_data = fernet.decrypt(encrypted_data)
-            return decrypted_data.decode()
-        except Exception as e:
-            # En caso de error, devolver None
-            return None
-    
     def set_license_key(self, license_key):
-        """Establece la clave de licencia encriptada"""
-        self.clave_licencia = self.encrypt_license_key(license_key)
+        """Establece la clave de licencia (se encripta al guardar)"""
+        self.clave_licencia = license_key
     
     def get_license_key(self):
         """Obtiene la clave de licencia desencriptada"""
-        return self.decrypt_license_key()
+        return self.clave_licencia.texto_o_none() if self.clave_licencia else None
 
 
 class Producto(models.Model):
@@ -243,6 +205,12 @@ class Producto(models.Model):
         verbose_name = 'Producto'
         verbose_name_plural = 'Productos'
         ordering = ['categoria', 'nombre']
+        indexes = [
+            # Paginación por cursor ordenada por (nombre, id)
+            models.Index(fields=['nombre', 'id'], name='inventario_prod_nombre_id'),
+            # Sincronización incremental ordenada por (fecha_actualizacion, id)
+            models.Index(fields=['fecha_actualizacion', 'id'], name='inventario_prod_actualiz_id'),
+        ]
     
     def __str__(self):
         return f"{self.codigo} - {self.nombre}"
@@ -254,6 +222,45 @@ class Producto(models.Model):
             return self.precio_unitario * self.cantidad
         return 0
 
+    def _valores_persistidos(self):
+        """Lee (y bloquea) los valores guardados que alimentan las estadísticas"""
+        return Producto.objects.select_for_update().filter(pk=self.pk).values(
+            'categoria_id', 'cantidad', 'precio_unitario'
+        ).first()
+    
+    def save(self, *args, **kwargs):
+        from .busqueda import indexar_producto
+        from .estadisticas import registrar_cambio_producto, valores_producto
+        
+        with transaction.atomic():
+            anterior = None if self._state.adding else self._valores_persistidos()
+            super().save(*args, **kwargs)
+            registrar_cambio_producto(anterior, valores_producto(self))
+            indexar_producto(self)
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            # Las estadísticas se descuentan en post_delete (también en las eliminaciones
+            # en cascada) con los valores de la instancia: tomar los guardados, no los de memoria
+            persistidos = self._valores_persistidos()
+            for campo, valor in (persistidos or {}).items():
+                setattr(self, campo, valor)
+            return super().delete(*args, **kwargs)
+
+
+class SecuenciaCodigo(models.Model):
+    """Último número asignado a los códigos automáticos de cada prefijo (``LAP-00001``)"""
+    prefijo = models.CharField(max_length=20, unique=True)
+    ultimo = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        verbose_name = 'Secuencia de Código'
+        verbose_name_plural = 'Secuencias de Códigos'
+        ordering = ['prefijo']
+    
+    def __str__(self):
+        return f"{self.prefijo}: {self.ultimo}"
+
 
 class ProductoLicencia(models.Model):
     """Modelo intermedio para relacionar productos con licencias"""
@@ -272,6 +279,19 @@ class ProductoLicencia(models.Model):
         return f"{self.producto.codigo} - {self.licencia.nombre}"
 
 
+class DocumentoBusquedaProducto(models.Model):
+    """Documento de búsqueda desnormalizado de un producto (ver busqueda.py)"""
+    producto = models.OneToOneField(Producto, on_delete=models.CASCADE, primary_key=True, related_name='documento_busqueda')
+    contenido = models.TextField(blank=True, default='')
+    
+    class Meta:
+        verbose_name = 'Documento de Búsqueda'
+        verbose_name_plural = 'Documentos de Búsqueda'
+    
+    def __str__(self):
+        return self.contenido
+
+
 class TipoMovimiento(models.Model):
     """Modelo para tipos de movimientos"""
     nombre = models.CharField(max_length=100, unique=True)
@@ -298,6 +318,7 @@ class Movimiento(models.Model):
     cantidad_nueva = models.IntegerField()
     usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE)
     fecha_movimiento = models.DateTimeField(auto_now_add=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
     motivo = models.TextField()
     referencia = models.CharField(max_length=100, blank=True, null=True)
     
@@ -321,23 +342,48 @@ class Movimiento(models.Model):
         verbose_name = 'Movimiento'
         verbose_name_plural = 'Movimientos'
         ordering = ['-fecha_movimiento']
+        indexes = [
+            # Paginación por cursor ordenada por (fecha_movimiento, id)
+            models.Index(fields=['fecha_movimiento', 'id'], name='inventario_mov_fecha_id'),
+            # Sincronización incremental ordenada por (fecha_actualizacion, id)
+            models.Index(fields=['fecha_actualizacion', 'id'], name='inventario_mov_actualiz_id'),
+        ]
     
     def __str__(self):
         return f"{self.producto.codigo} - {self.tipo_movimiento.nombre} - {self.cantidad}"
     
     def save(self, *args, **kwargs):
-        if not self.pk:  # Solo para nuevos movimientos
-            self.cantidad_anterior = self.producto.cantidad
-            if self.tipo_movimiento.es_entrada:
-                self.cantidad_nueva = self.cantidad_anterior + self.cantidad
-            else:
-                self.cantidad_nueva = self.cantidad_anterior - self.cantidad
-            
-            # Actualizar stock del producto
-            self.producto.cantidad = self.cantidad_nueva
-            self.producto.save()
+        from .estadisticas import registrar_movimientos
+        from .stock import aplicar_movimiento
         
-        super().save(*args, **kwargs)
+        # El pk es un UUID con valor por defecto: ``_state`` indica si es nuevo
+        es_nuevo = self._state.adding
+        with transaction.atomic():
+            if es_nuevo:
+                # Actualizar stock del producto de forma atómica
+                aplicar_movimiento(self)
+            
+            super().save(*args, **kwargs)
+            if es_nuevo:
+                registrar_movimientos(1)
+
+
+class Eliminacion(models.Model):
+    """Registro de un objeto eliminado, para informarlo en la sincronización incremental"""
+    modelo = models.CharField(max_length=100)
+    objeto_id = models.CharField(max_length=64)
+    fecha = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        verbose_name = 'Eliminación'
+        verbose_name_plural = 'Eliminaciones'
+        ordering = ['fecha', 'id']
+        indexes = [
+            models.Index(fields=['modelo', 'fecha', 'id'], name='inventario_elim_modelo_fecha'),
+        ]
+    
+    def __str__(self):
+        return f"{self.modelo} {self.objeto_id} ({self.fecha:%d/%m/%Y %H:%M})"
 
 
 class Reporte(models.Model):
@@ -350,6 +396,13 @@ class Reporte(models.Model):
         ('estado', 'Reporte por Estado'),
     )
     
+    ESTADOS = (
+        ('pendiente', 'Pendiente'),
+        ('procesando', 'Procesando'),
+        ('completado', 'Completado'),
+        ('error', 'Error'),
+    )
+    
     nombre = models.CharField(max_length=200)
     tipo = models.CharField(max_length=20, choices=TIPOS_REPORTE)
     usuario = models.ForeignKey(Usuario, on_delete=models.CASCADE)
@@ -357,13 +410,62 @@ class Reporte(models.Model):
     parametros = models.JSONField(blank=True, null=True)  # Para almacenar filtros aplicados
     archivo = models.FileField(upload_to='reportes/', blank=True, null=True)
     
+    # Cola de generación en segundo plano
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='pendiente')
+    progreso = models.PositiveSmallIntegerField(default=0)
+    intentos = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    programado_para = models.DateTimeField(default=timezone.now)
+    fecha_inicio = models.DateTimeField(blank=True, null=True)
+    fecha_finalizacion = models.DateTimeField(blank=True, null=True)
+    
+    # Hash de tipo, parámetros y versión de datos: reportes con la misma
+    # huella comparten el mismo archivo
+    huella = models.CharField(max_length=64, blank=True, default='', db_index=True)
+    
     class Meta:
         verbose_name = 'Reporte'
         verbose_name_plural = 'Reportes'
         ordering = ['-fecha_generacion']
+        indexes = [
+            models.Index(fields=['estado', 'programado_para'], name='inventario_reporte_cola'),
+        ]
     
     def __str__(self):
         return f"{self.nombre} - {self.get_tipo_display()}"
+    
+    @property
+    def en_proceso(self):
+        return self.estado in ('pendiente', 'procesando')
+
+
+class EstadisticaInventario(models.Model):
+    """Resumen precalculado del inventario (una sola fila) para el dashboard"""
+    total_productos = models.IntegerField(default=0)
+    total_movimientos = models.IntegerField(default=0)
+    productos_stock_bajo = models.IntegerField(default=0)
+    valor_total = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Estadística de Inventario'
+        verbose_name_plural = 'Estadísticas de Inventario'
+    
+    def __str__(self):
+        return f"Estadísticas al {self.fecha_actualizacion:%d/%m/%Y %H:%M}"
+
+
+class EstadisticaCategoria(models.Model):
+    """Conteo precalculado de productos por categoría"""
+    categoria = models.OneToOneField(Categoria, on_delete=models.CASCADE, primary_key=True, related_name='estadistica')
+    total_productos = models.IntegerField(default=0)
+    
+    class Meta:
+        verbose_name = 'Estadística de Categoría'
+        verbose_name_plural = 'Estadísticas de Categorías'
+    
+    def __str__(self):
+        return f"{self.categoria.nombre}: {self.total_productos}"
 
 
 class ConfiguracionSistema(models.Model):
@@ -406,7 +508,7 @@ class Cuenta(models.Model):
     tipo_cuenta = models.CharField(max_length=20, choices=TIPOS_CUENTA, default='office365', verbose_name='Tipo de Cuenta')
     email = models.EmailField(help_text="Correo electrónico de la cuenta")
     usuario = models.CharField(max_length=100, help_text="Nombre de usuario")
-    password = models.TextField(blank=True, null=True, help_text="Contraseña encriptada")
+    password = CampoCifrado(llavero='cuentas', blank=True, null=True, help_text="Contraseña encriptada")
     url_acceso = models.URLField(blank=True, null=True, help_text="URL de acceso a la plataforma")
     
     # Información de la cuenta
@@ -438,53 +540,13 @@ class Cuenta(models.Model):
     def __str__(self):
         return f"{self.nombre} ({self.get_tipo_cuenta_display()})"
     
-    def _get_encryption_key(self):
-        """Obtiene la clave de encriptación desde settings o genera una nueva"""
-        if hasattr(settings, 'ACCOUNT_ENCRYPTION_KEY'):
-            return settings.ACCOUNT_ENCRYPTION_KEY
-        else:
-            # Usar la misma clave que las licencias si no existe una específica
-            if hasattr(settings, 'LICENSE_ENCRYPTION_KEY'):
-                return settings.LICENSE_ENCRYPTION_KEY
-            else:
-                # Generar una clave si no existe en settings
-                key = Fernet.generate_key()
-                return key
-    
-    def encrypt_password(self, password):
-        """Encripta la contraseña"""
-        if not password:
-            return None
-        
-        try:
-            fernet = Fernet(self._get_encryption_key())
-            encrypted_data = fernet.encrypt(password.encode())
-            return base64.b64encode(encrypted_data).decode()
-        except Exception as e:
-            # En caso de error, devolver None
-            return None
-    
-    def decrypt_password(self):
-        """Desencripta la contraseña"""
-        if not self.password:
-            return None
-        
-        try:
-            fernet = Fernet(self._get_encryption_key())
-            encrypted_data = base64.b64decode(self.password.encode())
-            decrypted_data = fernet.decrypt(encrypted_data)
-            return decrypted_data.decode()
-        except Exception as e:
-            # En caso de error, devolver None
-            return None
-    
     def set_password(self, password):
-        """Establece la contraseña encriptada"""
-        self.password = self.encrypt_password(password)
+        """Establece la contraseña (se encripta al guardar)"""
+        self.password = password
     
     def get_password(self):
         """Obtiene la contraseña desencriptada"""
-        return self.decrypt_password()
+        return self.password.texto_o_none() if self.password else None
     
     @property
     def dias_vencimiento(self):
@@ -610,7 +672,7 @@ class ConexionWinbox(models.Model):
     
     # Credenciales (encriptadas)
     usuario = models.CharField(max_length=100, help_text="Usuario de acceso")
-    password = models.TextField(blank=True, null=True, help_text="Contraseña encriptada")
+    password = CampoCifrado(llavero='winbox', blank=True, null=True, help_text="Contraseña encriptada")
     
     # Ubicación
     sede = models.ForeignKey(Sede, on_delete=models.CASCADE, related_name='conexiones_winbox', blank=True, null=True)
@@ -642,51 +704,13 @@ class ConexionWinbox(models.Model):
     def __str__(self):
         return f"{self.nombre} ({self.ip_address}:{self.puerto})"
     
-    def _get_encryption_key(self):
-        """Obtiene la clave de encriptación desde settings o genera una nueva"""
-        if hasattr(settings, 'WINBOX_ENCRYPTION_KEY'):
-            return settings.WINBOX_ENCRYPTION_KEY
-        else:
-            # Usar la misma clave que las licencias si no existe una específica
-            if hasattr(settings, 'LICENSE_ENCRYPTION_KEY'):
-                return settings.LICENSE_ENCRYPTION_KEY
-            else:
-                # Generar una clave si no existe en settings
-                key = Fernet.generate_key()
-                return key
-    
-    def encrypt_password(self, password):
-        """Encripta la contraseña"""
-        if not password:
-            return None
-        
-        try:
-            fernet = Fernet(self._get_encryption_key())
-            encrypted_data = fernet.encrypt(password.encode())
-            return base64.b64encode(encrypted_data).decode()
-        except Exception as e:
-            return None
-    
-    def decrypt_password(self):
-        """Desencripta la contraseña"""
-        if not self.password:
-            return None
-        
-        try:
-            fernet = Fernet(self._get_encryption_key())
-            encrypted_data = base64.b64decode(self.password.encode())
-            decrypted_data = fernet.decrypt(encrypted_data)
-            return decrypted_data.decode()
-        except Exception as e:
-            return None
-    
     def set_password(self, password):
-        """Establece la contraseña encriptada"""
-        self.password = self.encrypt_password(password)
+        """Establece la contraseña (se encripta al guardar)"""
+        self.password = password
     
     def get_password(self):
         """Obtiene la contraseña desencriptada"""
-        return self.decrypt_password()
+        return self.password.texto_o_none() if self.password else None
     
     @property
     def url_conexion(self):
@@ -0,0 +1,147 @@
+"""
+Paginación por cursor (keyset).
+
+En lugar de ``OFFSET`` y ``COUNT(*)`` cada página se pide a partir de los
+valores de orden de la última fila vista, de modo que la página 5.000
+cuesta lo mismo que la primera. Los cursores son opacos para el cliente:
+un JSON con esos valores codificado en base64 URL-safe.
+"""
+import base64
+import binascii
+import json
+
+from django.db.models import Q
+
+# Órdenes estables: el último campo siempre es la clave primaria
+ORDEN_MOVIMIENTOS = ('-fecha_movimiento', '-id')
+ORDEN_PRODUCTOS = ('nombre', 'id')
+
+SIGUIENTE = 's'
+ANTERIOR = 'a'
+
+
+class CursorInvalido(ValueError):
+    """El cursor recibido no se puede decodificar"""
+
+
+class PaginaCursor:
+    """Página de resultados con los cursores hacia la siguiente y la anterior"""
+
+    def __init__(self, object_list, cursor_siguiente=None, cursor_anterior=None):
+        self.object_list = object_list
+        self.cursor_siguiente = cursor_siguiente
+        self.cursor_anterior = cursor_anterior
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def has_next(self):
+        return self.cursor_siguiente is not None
+
+    def has_previous(self):
+        return self.cursor_anterior is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def codificar_cursor(valores, direccion=SIGUIENTE):
+    """Convierte los valores de orden de una fila en un cursor opaco"""
+    datos = json.dumps({'d': direccion, 'v': valores}, default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(datos.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Devuelve ``(valores, direccion)`` de un cursor o lanza ``CursorInvalido``"""
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        datos = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        direccion = datos['d']
+        valores = datos['v']
+    except (binascii.Error, ValueError, TypeError, KeyError, UnicodeDecodeError):
+        raise CursorInvalido('Cursor de paginación inválido')
+    if direccion not in (SIGUIENTE, ANTERIOR) or not isinstance(valores, list):
+        raise CursorInvalido('Cursor de paginación inválido')
+    return valores, direccion
+
+
+def _campos(orden):
+    return [(campo.lstrip('-'), campo.startswith('-')) for campo in orden]
+
+
+def _valor(fila, campo):
+    if isinstance(fila, dict):
+        return fila[campo]
+    return getattr(fila, campo)
+
+
+def _valores_fila(fila, orden):
+    return [_valor(fila, campo) for campo, _ in _campos(orden)]
+
+
+def _convertir_valores(modelo, orden, valores):
+    """Reconstruye los valores del cursor con el tipo de cada campo"""
+    campos = _campos(orden)
+    if len(valores) != len(campos):
+        raise CursorInvalido('Cursor de paginación inválido')
+    try:
+        return [
+            modelo._meta.get_field(campo).to_python(valor)
+            for (campo, _), valor in zip(campos, valores)
+        ]
+    except Exception:
+        raise CursorInvalido('Cursor de paginación inválido')
+
+
+def _filtro_posterior(orden, valores, hacia_atras=False):
+    """
+    Condición "fila después de ``valores``" para un orden compuesto:
+    (a > x) OR (a = x AND b > y) ... respetando el sentido de cada campo.
+    """
+    condicion = Q()
+    iguales = {}
+    for (campo, descendente), valor in zip(_campos(orden), valores):
+        menor = descendente != hacia_atras
+        condicion |= Q(**iguales, **{f'{campo}__{"lt" if menor else "gt"}': valor})
+        iguales[campo] = valor
+    return condicion
+
+
+def paginar_por_cursor(queryset, orden, cursor=None, por_pagina=25):
+    """
+    Devuelve una ``PaginaCursor`` de ``queryset`` ordenado por ``orden``.
+
+    ``orden`` debe identificar cada fila de forma única (terminar en la
+    clave primaria). Lanza ``CursorInvalido`` si el cursor no es válido.
+    """
+    direccion = SIGUIENTE
+    if cursor:
+        valores, direccion = decodificar_cursor(cursor)
+        valores = _convertir_valores(queryset.model, orden, valores)
+        queryset = queryset.filter(_filtro_posterior(orden, valores, hacia_atras=direccion == ANTERIOR))
+
+    if direccion == ANTERIOR:
+        invertido = [campo[1:] if campo.startswith('-') else f'-{campo}' for campo in orden]
+        filas = list(queryset.order_by(*invertido)[:por_pagina + 1])
+        hay_mas = len(filas) > por_pagina
+        filas = filas[:por_pagina][::-1]
+        hay_anterior, hay_siguiente = hay_mas, True
+    else:
+        filas = list(queryset.order_by(*orden)[:por_pagina + 1])
+        hay_mas = len(filas) > por_pagina
+        filas = filas[:por_pagina]
+        hay_anterior, hay_siguiente = bool(cursor), hay_mas
+
+    cursor_siguiente = cursor_anterior = None
+    if filas:
+        if hay_siguiente:
+            cursor_siguiente = codificar_cursor(_valores_fila(filas[-1], orden), SIGUIENTE)
+        if hay_anterior:
+            cursor_anterior = codificar_cursor(_valores_fila(filas[0], orden), ANTERIOR)
+    return PaginaCursor(filas, cursor_siguiente, cursor_anterior)
@@ -0,0 +1,30 @@
+"""
+Puntos de entrada de los procesos del pool de reportes.
+
+Los procesos arrancan con "spawn" y, antes de ejecutar el inicializador,
+importan este módulo para deserializar las funciones. Por eso aquí no se
+importa nada de Django a nivel de módulo: los modelos se cargan dentro de
+cada función, después de ``django.setup()``.
+"""
+
+
+def iniciar_proceso():
+    # Sin Django configurado y sin heredar las conexiones abiertas del
+    # proceso principal
+    import django
+    django.setup()
+
+
+def generar_reporte(reporte_id):
+    """Genera un reporte dentro de un proceso del pool"""
+    from django.db import close_old_connections
+
+    from .reportes import procesar_reporte, reservar_reporte
+
+    close_old_connections()
+    reporte = reservar_reporte(reporte_id)
+    if reporte is None:
+        # Otro worker lo tomó o ya no está pendiente
+        return reporte_id, None, ''
+    completado = procesar_reporte(reporte)
+    return reporte_id, completado, reporte.error
@@ -0,0 +1,637 @@
+"""
+Generación de reportes PDF en segundo plano.
+
+Las vistas solo encolan un ``Reporte`` en estado pendiente y responden al
+instante. El comando ``procesar_reportes`` toma los pendientes de la base
+de datos, genera el PDF informando el progreso y guarda el archivo. Si la
+generación falla se reintenta más tarde hasta ``MAX_INTENTOS`` veces.
+
+Cada reporte lleva una huella calculada con su tipo, sus parámetros y la
+versión de los datos que consulta. Si ya existe un reporte completado con
+la misma huella se reutiliza su archivo en lugar de generarlo otra vez, y
+los archivos se guardan con el hash de su contenido como nombre, así que
+un mismo PDF nunca se almacena dos veces.
+"""
+import hashlib
+import json
+import logging
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files import File
+from django.db.models import F, Q
+from django.utils import timezone
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import LongTable, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from .cache import version_datos
+from .estadisticas import obtener_resumen
+from .metricas import metricas_movimientos, metricas_productos
+from .models import Categoria, EstadisticaCategoria, Movimiento, Producto, Reporte, Sede, TipoMovimiento, Usuario
+
+logger = logging.getLogger(__name__)
+
+# Intentos antes de marcar un reporte con error
+MAX_INTENTOS = getattr(settings, 'INVENTARIO_REPORTES_MAX_INTENTOS', 3)
+# Espera antes de reintentar (segundos, se multiplica por el número de intento)
+ESPERA_REINTENTO = getattr(settings, 'INVENTARIO_REPORTES_ESPERA_REINTENTO', 60)
+# Un reporte "procesando" más tiempo que esto se considera abandonado
+TIEMPO_MAXIMO_PROCESO = getattr(settings, 'INVENTARIO_REPORTES_TIEMPO_MAXIMO', 30 * 60)
+
+# Filas de cada tabla del PDF (aprox. una página) y filas leídas por consulta
+FILAS_POR_BLOQUE = 40
+TAMANO_ITERADOR = 2000
+
+# Modelos cuyos cambios invalidan un reporte ya generado
+MODELOS_POR_TIPO = {
+    'inventario': (Producto, Categoria, Sede),
+    'movimientos': (Movimiento, Producto, TipoMovimiento, Usuario, Sede),
+    'categoria': (Producto, Categoria, Sede),
+}
+
+PREFIJOS_NOMBRE = {
+    'inventario': 'Reporte_Inventario',
+    'movimientos': 'Reporte_Movimientos',
+    'categoria': 'Reporte_Categoria',
+}
+
+
+class _Avance:
+    """
+    Informa el porcentaje de filas procesadas sin escribir en cada fila.
+
+    ``estimar`` da el total esperado sin recorrer la tabla del reporte (la
+    leen una sola vez las filas); con filtros puede quedar por encima, y el
+    porcentaje nunca pasa de ``hasta``.
+    """
+
+    def __init__(self, progreso, estimar, desde=5, hasta=90):
+        self.progreso = progreso
+        self.total = estimar() if progreso else 0
+        self.desde = desde
+        self.hasta = hasta
+        self.filas = 0
+        self.ultimo = None
+
+    def fila(self):
+        if not self.progreso or not self.total:
+            return
+        self.filas += 1
+        porcentaje = self.desde + (self.hasta - self.desde) * min(self.filas, self.total) // self.total
+        if self.ultimo is None or porcentaje - self.ultimo >= 5 or self.filas == self.total:
+            self.ultimo = porcentaje
+            self.progreso(porcentaje)
+
+
+def _productos_estimados(filtros):
+    """Productos del reporte según las estadísticas precalculadas"""
+    categoria_id = (filtros or {}).get('categoria')
+    if categoria_id:
+        estadistica = EstadisticaCategoria.objects.filter(categoria_id=categoria_id).first()
+        return estadistica.total_productos if estadistica else 0
+    return obtener_resumen().total_productos
+
+
+def _movimientos_estimados():
+    return obtener_resumen().total_movimientos
+
+
+class _HistoriaPerezosa(list):
+    """
+    Lista de flowables que se rellena a demanda desde un generador.
+
+    ``doc.build`` consume la historia desde el principio preguntando su
+    longitud en cada vuelta, así que en memoria solo queda el bloque que
+    se está maquetando y no el reporte completo.
+    """
+
+    def __init__(self, flowables):
+        super().__init__()
+        self._pendientes = iter(flowables)
+
+    def __len__(self):
+        if not super().__len__():
+            siguiente = next(self._pendientes, None)
+            if siguiente is not None:
+                self.append(siguiente)
+        return super().__len__()
+
+
+ESTILO_TABLA = [
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('FONTSIZE', (0, 1), (-1, -1), 8),
+]
+
+ESTILO_TOTAL = [
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('BACKGROUND', (0, 0), (-1, -1), colors.lightgrey),
+    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('FONTSIZE', (0, 0), (-1, -1), 8),
+]
+
+
+def _encabezado(titulo, info_text=None):
+    """Título del reporte y, si hay filtros, el bloque de información"""
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=16,
+        spaceAfter=30,
+        alignment=TA_CENTER
+    )
+    yield Paragraph(titulo, title_style)
+    yield Spacer(1, 20)
+    if info_text:
+        yield Paragraph(info_text, styles['Normal'])
+        yield Spacer(1, 20)
+
+
+def _tabla_por_bloques(cabecera, filas, anchos):
+    """
+    Genera una ``LongTable`` por cada ``FILAS_POR_BLOQUE`` filas, todas con
+    la cabecera repetida, en lugar de una única tabla con todo el reporte.
+    """
+    bloque = []
+    for fila in filas:
+        bloque.append(fila)
+        if len(bloque) >= FILAS_POR_BLOQUE:
+            yield _tabla(cabecera, bloque, anchos)
+            bloque = []
+    if bloque:
+        yield _tabla(cabecera, bloque, anchos)
+
+
+def _tabla(cabecera, filas, anchos):
+    tabla = LongTable([cabecera] + filas, colWidths=anchos, repeatRows=1)
+    tabla.setStyle(TableStyle(ESTILO_TABLA))
+    return tabla
+
+
+def _fila_total(valores, anchos):
+    tabla = Table([valores], colWidths=anchos)
+    tabla.setStyle(TableStyle(ESTILO_TOTAL))
+    return tabla
+
+
+def _resumen(texto):
+    return Paragraph(texto, getSampleStyleSheet()['Normal'])
+
+
+def _construir(historia, destino=None):
+    """Maqueta la historia en ``destino`` (un ``BytesIO`` si no se indica)"""
+    if destino is None:
+        destino = BytesIO()
+    # Sin fecha de creación ni ID aleatorio en el PDF: los mismos datos dan los
+    # mismos bytes y el archivo guardado por hash se reutiliza. La fecha de
+    # generación queda en el ``Reporte``, no dentro del documento.
+    doc = SimpleDocTemplate(destino, pagesize=A4, invariant=True)
+    doc.build(_HistoriaPerezosa(historia))
+    destino.seek(0)
+    return destino
+
+
+def crear_pdf_inventario(productos, filtros=None, progreso=None, destino=None, metricas=None):
+    """Crear PDF del reporte de inventario; ``metricas`` se acumula al recorrer las filas"""
+    if metricas is None:
+        metricas = metricas_productos()
+    
+    # Información del reporte
+    info_text = None
+    if filtros:
+        info_text = ''
+        if filtros.get('categoria'):
+            categoria = Categoria.objects.get(id=filtros['categoria'])
+            info_text += f"<b>Categoría:</b> {categoria.nombre}<br/>"
+        if filtros.get('estado'):
+            info_text += f"<b>Estado:</b> {filtros['estado']}<br/>"
+        if filtros.get('sede'):
+            info_text += f"<b>Sede:</b> {Sede.objects.get(id=filtros['sede']).nombre}<br/>"
+    
+    cabecera = ['Código', 'Nombre', 'Categoría', 'Cantidad', 'Precio Unit.', 'Valor Total', 'Estado']
+    anchos = [1*inch, 2*inch, 1.5*inch, 0.8*inch, 1*inch, 1.2*inch, 1*inch]
+    avance = _Avance(progreso, lambda: _productos_estimados(filtros))
+    
+    def filas():
+        for producto in productos.iterator(chunk_size=TAMANO_ITERADOR):
+            avance.fila()
+            metricas.agregar(producto)
+            valor_producto = (producto.precio_unitario or 0) * (producto.cantidad or 0)
+            
+            yield [
+                producto.codigo,
+                producto.nombre,
+                producto.categoria.nombre,
+                str(producto.cantidad),
+                f"${producto.precio_unitario or 0:,.2f}",
+                f"${valor_producto:,.2f}",
+                producto.get_estado_display()
+            ]
+    
+    def historia():
+        yield from _encabezado("REPORTE DE INVENTARIO", info_text)
+        yield from _tabla_por_bloques(cabecera, filas(), anchos)
+        # Las métricas solo están completas después de recorrer todas las filas
+        yield _fila_total(['', '', 'TOTAL', '', '', f"${metricas['valor_total']:,.2f}", ''], anchos)
+        yield Spacer(1, 20)
+        yield _resumen(f"""
+        <b>Resumen del Reporte:</b><br/>
+        • Total de productos: {metricas['total_productos']}<br/>
+        • Valor total del inventario: ${metricas['valor_total']:,.2f}<br/>
+        • Productos con stock bajo: {metricas['productos_stock_bajo']}<br/>
+        """)
+    
+    return _construir(historia(), destino)
+
+
+def crear_pdf_movimientos(movimientos, filtros=None, progreso=None, destino=None, metricas=None):
+    """Crear PDF del reporte de movimientos; ``metricas`` se acumula al recorrer las filas"""
+    if metricas is None:
+        metricas = metricas_movimientos()
+    
+    # Información del reporte
+    info_text = None
+    if filtros:
+        info_text = ''
+        if filtros.get('fecha_desde'):
+            info_text += f"<b>Desde:</b> {filtros['fecha_desde']}<br/>"
+        if filtros.get('fecha_hasta'):
+            info_text += f"<b>Hasta:</b> {filtros['fecha_hasta']}<br/>"
+        if filtros.get('tipo_movimiento'):
+            tipo = TipoMovimiento.objects.get(id=filtros['tipo_movimiento'])
+            info_text += f"<b>Tipo de movimiento:</b> {tipo.nombre}<br/>"
+        if filtros.get('sede'):
+            info_text += f"<b>Sede:</b> {Sede.objects.get(id=filtros['sede']).nombre}<br/>"
+    
+    cabecera = ['Fecha', 'Producto', 'Tipo', 'Cantidad', 'Usuario', 'Motivo']
+    anchos = [1.2*inch, 2*inch, 1*inch, 0.8*inch, 1.5*inch, 2*inch]
+    avance = _Avance(progreso, _movimientos_estimados)
+    
+    def filas():
+        for movimiento in movimientos.iterator(chunk_size=TAMANO_ITERADOR):
+            avance.fila()
+            metricas.agregar(movimiento)
+            yield [
+                movimiento.fecha_movimiento.strftime('%d/%m/%Y %H:%M'),
+                movimiento.producto.nombre,
+                movimiento.tipo_movimiento.nombre,
+                str(movimiento.cantidad),
+                movimiento.usuario.get_full_name(),
+                movimiento.motivo[:50] + '...' if len(movimiento.motivo) > 50 else movimiento.motivo
+            ]
+    
+    def historia():
+        yield from _encabezado("REPORTE DE MOVIMIENTOS", info_text)
+        yield from _tabla_por_bloques(cabecera, filas(), anchos)
+        yield Spacer(1, 20)
+        yield _resumen(f"""
+        <b>Resumen del Reporte:</b><br/>
+        • Total de movimientos: {metricas['total_movimientos']}<br/>
+        • Entradas: {metricas['entradas']}<br/>
+        • Salidas: {metricas['salidas']}<br/>
+        """)
+    
+    return _construir(historia(), destino)
+
+
+def crear_pdf_categoria(productos, filtros=None, progreso=None, destino=None, metricas=None):
+    """Crear PDF del reporte por categoría; ``metricas`` se acumula al recorrer las filas"""
+    if metricas is None:
+        metricas = metricas_productos()
+    
+    # Información del reporte
+    info_text = None
+    if filtros:
+        info_text = ''
+        if filtros.get('categoria'):
+            categoria = Categoria.objects.get(id=filtros['categoria'])
+            info_text += f"<b>Categoría:</b> {categoria.nombre}<br/>"
+        if filtros.get('orden'):
+            orden_text = {
+                'mayor_menor': 'Cantidad (Mayor a Menor)',
+                'menor_mayor': 'Cantidad (Menor a Mayor)',
+                'valor': 'Valor (Mayor a Menor)'
+            }.get(filtros['orden'], filtros['orden'])
+            info_text += f"<b>Orden:</b> {orden_text}<br/>"
+        if filtros.get('sede'):
+            info_text += f"<b>Sede:</b> {Sede.objects.get(id=filtros['sede']).nombre}<br/>"
+    
+    cabecera = ['Código', 'Nombre', 'Categoría', 'Cantidad', 'Precio Unit.', 'Valor Total']
+    anchos = [1*inch, 2*inch, 1.5*inch, 0.8*inch, 1*inch, 1.2*inch]
+    avance = _Avance(progreso, lambda: _productos_estimados(filtros))
+    
+    def filas():
+        for producto in productos.iterator(chunk_size=TAMANO_ITERADOR):
+            avance.fila()
+            metricas.agregar(producto)
+            valor_producto = (producto.precio_unitario or 0) * (producto.cantidad or 0)
+            
+            yield [
+                producto.codigo,
+                producto.nombre,
+                producto.categoria.nombre,
+                str(producto.cantidad),
+                f"${producto.precio_unitario or 0:,.2f}",
+                f"${valor_producto:,.2f}"
+            ]
+    
+    def historia():
+        yield from _encabezado("REPORTE POR CATEGORÍA", info_text)
+        yield from _tabla_por_bloques(cabecera, filas(), anchos)
+        yield _fila_total(['', '', 'TOTAL', '', '', f"${metricas['valor_total']:,.2f}"], anchos)
+        yield Spacer(1, 20)
+        yield _resumen(f"""
+        <b>Resumen del Reporte:</b><br/>
+        • Total de productos: {metricas['total_productos']}<br/>
+        • Valor total: ${metricas['valor_total']:,.2f}<br/>
+        """)
+    
+    return _construir(historia(), destino)
+
+
+def productos_reporte_inventario(parametros):
+    """Productos del reporte de inventario según sus parámetros"""
+    productos = Producto.objects.select_related('categoria').all()
+    if parametros.get('categoria_id'):
+        productos = productos.filter(categoria_id=parametros['categoria_id'])
+    if parametros.get('estado') and parametros['estado'] != 'todos':
+        productos = productos.filter(estado=parametros['estado'])
+    if parametros.get('sede_id'):
+        productos = productos.filter(sede_id=parametros['sede_id'])
+    return productos
+
+
+def movimientos_reporte(parametros):
+    """Movimientos del reporte de movimientos según sus parámetros"""
+    movimientos = Movimiento.objects.select_related('producto', 'tipo_movimiento', 'usuario').all()
+    if parametros.get('fecha_desde'):
+        movimientos = movimientos.filter(fecha_movimiento__date__gte=parametros['fecha_desde'])
+    if parametros.get('fecha_hasta'):
+        movimientos = movimientos.filter(fecha_movimiento__date__lte=parametros['fecha_hasta'])
+    if parametros.get('tipo_movimiento_id') and parametros['tipo_movimiento_id'] != 'todos':
+        movimientos = movimientos.filter(tipo_movimiento_id=parametros['tipo_movimiento_id'])
+    if parametros.get('sede_id'):
+        movimientos = movimientos.filter(
+            Q(sede_origen_id=parametros['sede_id']) | Q(sede_destino_id=parametros['sede_id'])
+        )
+    return movimientos
+
+
+def productos_reporte_categoria(parametros):
+    """Productos del reporte por categoría según sus parámetros"""
+    productos = Producto.objects.select_related('categoria').all()
+    if parametros.get('categoria_id') and parametros['categoria_id'] != 'todos':
+        productos = productos.filter(categoria_id=parametros['categoria_id'])
+    if parametros.get('sede_id'):
+        productos = productos.filter(sede_id=parametros['sede_id'])
+    orden = parametros.get('orden')
+    if orden == 'mayor_menor':
+        productos = productos.order_by('-cantidad')
+    elif orden == 'menor_mayor':
+        productos = productos.order_by('cantidad')
+    elif orden == 'valor':
+        productos = productos.order_by('-precio_unitario')
+    return productos
+
+
+def _resumen_json(metricas):
+    """Métricas listas para guardarse en ``Reporte.parametros``"""
+    return {clave: float(valor) if isinstance(valor, Decimal) else valor for clave, valor in metricas.items()}
+
+
+def generar_pdf(reporte, progreso=None, destino=None):
+    """Genera el PDF de un reporte en ``destino``; devuelve ``(archivo, resumen)``"""
+    parametros = reporte.parametros or {}
+    if reporte.tipo == 'inventario':
+        productos = productos_reporte_inventario(parametros)
+        metricas = metricas_productos()
+        filtros = {
+            'categoria': parametros.get('categoria_id'),
+            'estado': parametros.get('estado'),
+            'sede': parametros.get('sede_id'),
+        }
+        archivo = crear_pdf_inventario(productos, filtros, progreso, destino, metricas)
+        return archivo, _resumen_json(metricas)
+    if reporte.tipo == 'movimientos':
+        movimientos = movimientos_reporte(parametros)
+        metricas = metricas_movimientos()
+        filtros = {
+            'fecha_desde': parametros.get('fecha_desde'),
+            'fecha_hasta': parametros.get('fecha_hasta'),
+            'tipo_movimiento': parametros.get('tipo_movimiento_id'),
+            'sede': parametros.get('sede_id'),
+        }
+        archivo = crear_pdf_movimientos(movimientos, filtros, progreso, destino, metricas)
+        return archivo, _resumen_json(metricas)
+    if reporte.tipo == 'categoria':
+        productos = productos_reporte_categoria(parametros)
+        metricas = metricas_productos()
+        filtros = {
+            'categoria': parametros.get('categoria_id'),
+            'orden': parametros.get('orden'),
+            'sede': parametros.get('sede_id'),
+        }
+        archivo = crear_pdf_categoria(productos, filtros, progreso, destino, metricas)
+        return archivo, _resumen_json(metricas)
+    raise ValueError(f'Tipo de reporte no soportado: {reporte.tipo}')
+
+
+def huella_reporte(tipo, parametros):
+    """Hash del tipo, los parámetros y la versión de los datos del reporte"""
+    contenido = json.dumps({
+        'tipo': tipo,
+        'parametros': parametros or {},
+        'version': version_datos(*MODELOS_POR_TIPO.get(tipo, ())),
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(contenido.encode()).hexdigest()
+
+
+def reencolar_reporte(reporte):
+    """Vuelve a poner en la cola un reporte cuyo archivo ya no existe"""
+    reporte.archivo.name = ''
+    reporte.estado = 'pendiente'
+    reporte.progreso = 0
+    reporte.intentos = 0
+    reporte.error = ''
+    reporte.programado_para = timezone.now()
+    reporte.fecha_inicio = None
+    reporte.fecha_finalizacion = None
+    reporte.save(update_fields=[
+        'archivo', 'estado', 'progreso', 'intentos', 'error',
+        'programado_para', 'fecha_inicio', 'fecha_finalizacion',
+    ])
+
+
+def _reporte_equivalente(huella, excluir=None):
+    """Último reporte completado con la misma huella cuyo archivo sigue existiendo"""
+    if not huella:
+        return None
+    candidatos = Reporte.objects.filter(huella=huella, estado='completado').exclude(archivo='')
+    if excluir is not None:
+        candidatos = candidatos.exclude(pk=excluir.pk)
+    for reporte in candidatos.order_by('-fecha_finalizacion')[:3]:
+        if reporte.archivo.storage.exists(reporte.archivo.name):
+            return reporte
+    return None
+
+
+def _reutilizar(reporte, existente):
+    """Completa ``reporte`` con el archivo y el resumen de ``existente``"""
+    reporte.archivo.name = existente.archivo.name
+    reporte.parametros = existente.parametros
+    reporte.estado = 'completado'
+    reporte.progreso = 100
+    reporte.error = ''
+    reporte.fecha_finalizacion = timezone.now()
+
+
+def encolar_reporte(tipo, usuario, parametros, sufijo=''):
+    """
+    Crea un reporte pendiente para que lo genere el worker. Si los mismos
+    datos ya se reportaron con los mismos parámetros, el reporte se crea
+    completado con el archivo existente.
+    """
+    nombre = f"{PREFIJOS_NOMBRE.get(tipo, 'Reporte')}{sufijo}_{timezone.now().strftime('%Y-%m-%d_%H-%M')}"
+    reporte = Reporte(
+        nombre=nombre,
+        tipo=tipo,
+        usuario=usuario,
+        parametros=parametros,
+        estado='pendiente',
+        huella=huella_reporte(tipo, parametros),
+    )
+    existente = _reporte_equivalente(reporte.huella)
+    if existente is not None:
+        _reutilizar(reporte, existente)
+    reporte.save()
+    return reporte
+
+
+def _guardar_archivo(reporte, archivo):
+    """
+    Guarda el PDF con el hash de su contenido como nombre. Si ese archivo ya
+    existe no se vuelve a escribir: el reporte apunta al que ya está.
+    """
+    digest = hashlib.sha256()
+    for bloque in iter(lambda: archivo.read(64 * 1024), b''):
+        digest.update(bloque)
+    hash_contenido = digest.hexdigest()
+    nombre = f'reportes/{hash_contenido[:2]}/{hash_contenido}.pdf'
+    storage = reporte.archivo.storage
+    if not storage.exists(nombre):
+        archivo.seek(0)
+        nombre = storage.save(nombre, File(archivo))
+    reporte.archivo.name = nombre
+
+
+def eliminar_reporte(reporte):
+    """Borra el reporte y su archivo si ningún otro reporte lo comparte"""
+    nombre = reporte.archivo.name if reporte.archivo else ''
+    storage = reporte.archivo.storage
+    reporte.delete()
+    if nombre and not Reporte.objects.filter(archivo=nombre).exists():
+        storage.delete(nombre)
+
+
+def _recuperar_abandonados(ahora):
+    """Devuelve a la cola los reportes de workers que murieron a mitad de trabajo"""
+    limite = ahora - timedelta(seconds=TIEMPO_MAXIMO_PROCESO)
+    abandonados = Reporte.objects.filter(estado='procesando', fecha_inicio__lt=limite)
+    abandonados.filter(intentos__lt=MAX_INTENTOS).update(estado='pendiente', programado_para=ahora)
+    abandonados.update(estado='error', error='El proceso de generación no terminó a tiempo')
+
+
+def tomar_reporte():
+    """
+    Reserva el siguiente reporte pendiente para este worker.
+
+    La reserva es un ``UPDATE`` condicionado al estado, así que dos workers
+    nunca toman el mismo reporte. Devuelve ``None`` si no hay trabajo.
+    """
+    for reporte_id in reportes_pendientes(10):
+        reporte = reservar_reporte(reporte_id)
+        if reporte is not None:
+            return reporte
+    return None
+
+
+def reportes_pendientes(limite=None):
+    """Ids de los reportes listos para generarse, en orden de llegada"""
+    ahora = timezone.now()
+    _recuperar_abandonados(ahora)
+    candidatos = Reporte.objects.filter(
+        estado='pendiente', programado_para__lte=ahora
+    ).order_by('programado_para', 'id').values_list('id', flat=True)
+    return list(candidatos[:limite] if limite else candidatos)
+
+
+def reservar_reporte(reporte_id):
+    """Reserva un reporte pendiente concreto; ``None`` si otro worker ya lo tomó"""
+    reservado = Reporte.objects.filter(pk=reporte_id, estado='pendiente').update(
+        estado='procesando',
+        progreso=0,
+        intentos=F('intentos') + 1,
+        fecha_inicio=timezone.now(),
+        error='',
+    )
+    if reservado:
+        return Reporte.objects.select_related('usuario').get(pk=reporte_id)
+    return None
+
+
+def procesar_reporte(reporte):
+    """Genera el archivo de un reporte reservado con ``tomar_reporte``"""
+    def progreso(porcentaje):
+        Reporte.objects.filter(pk=reporte.pk).update(progreso=porcentaje)
+
+    # Otro reporte igual pudo completarse mientras este esperaba en la cola
+    existente = _reporte_equivalente(reporte.huella, excluir=reporte)
+    if existente is not None:
+        _reutilizar(reporte, existente)
+        reporte.save(update_fields=['parametros', 'archivo', 'estado', 'progreso', 'error', 'fecha_finalizacion'])
+        return True
+
+    try:
+        # El PDF se escribe en disco, no en memoria, para reportes muy grandes
+        with tempfile.TemporaryFile() as temporal:
+            _, resumen = generar_pdf(reporte, progreso, destino=temporal)
+            reporte.parametros = {**(reporte.parametros or {}), **resumen}
+            _guardar_archivo(reporte, temporal)
+    except Exception as e:
+        logger.exception('Error al generar el reporte %s', reporte.pk)
+        _registrar_fallo(reporte, e)
+        return False
+
+    reporte.estado = 'completado'
+    reporte.progreso = 100
+    reporte.error = ''
+    reporte.fecha_finalizacion = timezone.now()
+    reporte.save(update_fields=['parametros', 'archivo', 'estado', 'progreso', 'error', 'fecha_finalizacion'])
+    return True
+
+
+def _registrar_fallo(reporte, error):
+    ahora = timezone.now()
+    cambios = {'error': str(error)[:1000], 'fecha_finalizacion': ahora}
+    if reporte.intentos < MAX_INTENTOS:
+        cambios['estado'] = 'pendiente'
+        cambios['programado_para'] = ahora + timedelta(seconds=ESPERA_REINTENTO * reporte.intentos)
+    else:
+        cambios['estado'] = 'error'
+    Reporte.objects.filter(pk=reporte.pk).update(**cambios)
+    for campo, valor in cambios.items():
+        setattr(reporte, campo, valor)
@@ -0,0 +1,62 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import invalidar
+from .codigos import cubrir_codigo
+from .escaneo import FICHA_PRODUCTO
+from .estadisticas import registrar_cambio_producto, registrar_movimientos, valores_producto
+from .models import (
+    Area, Categoria, Eliminacion, Licencia, Movimiento, Personal, Producto, Sede, TipoMovimiento, Usuario
+)
+from .sincronizacion import fechar_fila_al_confirmar
+
+# Modelos cuyos cambios invalidan las consultas y fragmentos cacheados
+MODELOS_VERSIONADOS = (
+    Producto, Movimiento, Categoria, Sede, Area, Personal, Licencia, TipoMovimiento, Usuario,
+)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidar_cache_modelo(sender, **kwargs):
+    """Incrementa la versión de datos del modelo que cambió al confirmar la transacción"""
+    if sender in MODELOS_VERSIONADOS:
+        modelos = (sender, FICHA_PRODUCTO) if sender is Producto else (sender,)
+        transaction.on_commit(partial(invalidar, *modelos), using=kwargs.get('using'))
+
+
+@receiver(post_save, sender=Producto)
+def adelantar_secuencia_codigo(sender, instance, **kwargs):
+    """Reserva en la secuencia los códigos automáticos cargados a mano"""
+    cubrir_codigo(instance.codigo)
+
+
+@receiver(post_delete, sender=Producto)
+def descontar_producto(sender, instance, origin=None, **kwargs):
+    """Quita el producto eliminado de las estadísticas, aunque se elimine en cascada"""
+    valores = valores_producto(instance)
+    if isinstance(origin, Categoria) or getattr(origin, 'model', None) is Categoria:
+        # La categoría se elimina con su fila de estadísticas: no hay conteo que ajustar
+        valores['categoria_id'] = None
+    registrar_cambio_producto(valores, None)
+
+
+@receiver(post_delete, sender=Movimiento)
+def descontar_movimiento(sender, instance, **kwargs):
+    """Quita el movimiento eliminado del total, aunque se elimine en cascada"""
+    registrar_movimientos(-1)
+
+
+@receiver(post_delete, sender=Producto)
+@receiver(post_delete, sender=Movimiento)
+def registrar_eliminacion(sender, instance, using=None, **kwargs):
+    """Deja constancia de la eliminación para los clientes que sincronizan por cambios"""
+    eliminacion = Eliminacion.objects.using(using).create(
+        modelo=sender._meta.label_lower, objeto_id=str(instance.pk)
+    )
+    # Una eliminación en cascada puede confirmar mucho después de crear la
+    # fila: las de toda la transacción se vuelven a fechar juntas al confirmar
+    fechar_fila_al_confirmar(Eliminacion, eliminacion.pk, 'fecha', using)
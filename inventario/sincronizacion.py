@@ -0,0 +1,197 @@
+"""
+Sincronización incremental de productos y movimientos.
+
+El cliente guarda la ``marca`` de la última respuesta y la vuelve a enviar:
+recibe solo las filas creadas o modificadas desde entonces, ordenadas por
+``(fecha_actualizacion, id)``, y los ids eliminados, que salen de la tabla
+de ``Eliminacion`` que llenan las señales. Sin marca se envía todo lo
+vigente (sincronización inicial) y ninguna eliminación anterior.
+
+Solo se leen filas con fecha anterior a ``ahora - INVENTARIO_SYNC_MARGEN``
+para no adelantar la marca sobre transacciones que todavía no confirmaron.
+El margen cubre transacciones cortas; las que pueden durar más (importar
+movimientos, eliminaciones en cascada) registran sus filas con
+``fechar_ids_al_confirmar`` (o ``fechar_fila_al_confirmar``, que acumula
+las de toda la transacción) y se vuelven a fechar después del commit, así que
+quedan detrás de cualquier marca enviada mientras la transacción seguía
+abierta. Un cliente puede recibir la misma fila dos veces, nunca perderla.
+
+Las eliminaciones se conservan ``INVENTARIO_SYNC_RETENCION_DIAS``; una
+marca más antigua ya no es confiable y el cliente debe sincronizar de cero.
+"""
+import threading
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Eliminacion
+from .paginacion import CursorInvalido, codificar_cursor, decodificar_cursor
+
+MARGEN = timedelta(seconds=getattr(settings, 'INVENTARIO_SYNC_MARGEN', 5))
+RETENCION = timedelta(days=getattr(settings, 'INVENTARIO_SYNC_RETENCION_DIAS', 90))
+
+# Filas que se vuelven a fechar por ``UPDATE`` (cada uno confirma por separado)
+TAMANO_LOTE_FECHAS = 500
+
+
+class MarcaInvalida(ValueError):
+    """La marca recibida no se puede decodificar"""
+
+
+class MarcaVencida(MarcaInvalida):
+    """La marca es anterior a las eliminaciones conservadas"""
+
+
+def _fecha(valor):
+    fecha = parse_datetime(valor) if isinstance(valor, str) else None
+    if fecha is None:
+        raise MarcaInvalida('Marca de sincronización inválida')
+    return fecha
+
+
+def _posicion(fecha, objeto_id, a_python):
+    if fecha is None:
+        return None
+    try:
+        return _fecha(fecha), None if objeto_id is None else a_python(objeto_id)
+    except (TypeError, ValueError) as e:
+        raise MarcaInvalida('Marca de sincronización inválida') from e
+
+
+def _leer_marca(marca, modelo, hasta):
+    """Posiciones ``(fecha, id)`` ya enviadas de cambios y de eliminaciones"""
+    if not marca:
+        # Sincronización inicial: todo lo vigente y ninguna eliminación previa
+        return None, (hasta, None)
+    try:
+        valores, _ = decodificar_cursor(marca)
+    except CursorInvalido as e:
+        raise MarcaInvalida('Marca de sincronización inválida') from e
+    if len(valores) != 4 or valores[2] is None:
+        raise MarcaInvalida('Marca de sincronización inválida')
+    cambios = _posicion(valores[0], valores[1], modelo._meta.pk.to_python)
+    eliminados = _posicion(valores[2], valores[3], int)
+    if eliminados[0] < timezone.now() - RETENCION:
+        raise MarcaVencida('La marca es demasiado antigua; sincronice desde cero')
+    return cambios, eliminados
+
+
+def _posteriores(queryset, campo_fecha, posicion):
+    if posicion is None:
+        return queryset
+    fecha, objeto_id = posicion
+    if objeto_id is None:
+        return queryset.filter(**{f'{campo_fecha}__gt': fecha})
+    return queryset.filter(
+        Q(**{f'{campo_fecha}__gt': fecha}) | Q(**{campo_fecha: fecha, 'id__gt': objeto_id})
+    )
+
+
+def _siguiente_posicion(filas, limite, campo_fecha, hasta):
+    """Posición tras ``filas``: la última leída o ``hasta`` si no quedó nada pendiente"""
+    if len(filas) > limite:
+        del filas[limite:]
+        return (filas[-1][campo_fecha], filas[-1]['id']), True
+    return (hasta, None), False
+
+
+def cambios_desde(queryset, proyeccion, marca, limite):
+    """
+    Filas de ``queryset`` (proyectadas con ``proyeccion``) y ids eliminados
+    desde ``marca``, de a ``limite`` como máximo cada uno. Devuelve
+    ``(cambios, eliminados, marca_nueva, hay_mas)``.
+    """
+    modelo = queryset.model
+    hasta = timezone.now() - MARGEN
+    pos_cambios, pos_eliminados = _leer_marca(marca, modelo, hasta)
+
+    filas = _posteriores(queryset.filter(fecha_actualizacion__lte=hasta), 'fecha_actualizacion', pos_cambios)
+    filas = list(proyeccion.aplicar(filas.order_by('fecha_actualizacion', 'id'))[:limite + 1])
+    pos_cambios, mas_cambios = _siguiente_posicion(filas, limite, 'fecha_actualizacion', hasta)
+
+    eliminaciones = Eliminacion.objects.filter(modelo=modelo._meta.label_lower, fecha__lte=hasta)
+    eliminaciones = _posteriores(eliminaciones, 'fecha', pos_eliminados)
+    eliminaciones = list(eliminaciones.order_by('fecha', 'id').values('id', 'fecha', 'objeto_id')[:limite + 1])
+    pos_eliminados, mas_eliminados = _siguiente_posicion(eliminaciones, limite, 'fecha', hasta)
+
+    marca_nueva = codificar_cursor([*pos_cambios, *pos_eliminados])
+    return (
+        [proyeccion.fila(valores) for valores in filas],
+        [modelo._meta.pk.to_python(eliminacion['objeto_id']) for eliminacion in eliminaciones],
+        marca_nueva,
+        mas_cambios or mas_eliminados,
+    )
+
+
+def purgar_eliminaciones():
+    """Borra las eliminaciones más antiguas que la retención; devuelve cuántas"""
+    borradas, _ = Eliminacion.objects.filter(fecha__lt=timezone.now() - RETENCION).delete()
+    return borradas
+
+
+def _fechar_ids(filas, ids, campo):
+    for inicio in range(0, len(ids), TAMANO_LOTE_FECHAS):
+        # Hora tomada por lote: cada ``UPDATE`` confirma enseguida y no se
+        # vuelve a abrir la ventana que cubre ``MARGEN``
+        filas.filter(pk__in=ids[inicio:inicio + TAMANO_LOTE_FECHAS]).update(**{campo: timezone.now()})
+
+
+def fechar_ids_al_confirmar(modelo, ids, campo, using=None):
+    """
+    Al confirmar la transacción en curso, pone ``campo`` de las filas
+    ``ids`` de ``modelo`` en la hora del commit. Si la transacción se
+    deshace no hace nada.
+    """
+    using = using or DEFAULT_DB_ALIAS
+    transaction.on_commit(partial(_fechar_ids, modelo._base_manager.using(using), list(ids), campo), using=using)
+
+
+# Lotes de ``fechar_fila_al_confirmar`` aún sin confirmar, por hilo
+_acumulados = threading.local()
+
+
+class _FilasAcumuladas:
+    """Callback ``on_commit`` que vuelve a fechar juntas las filas de una transacción"""
+
+    def __init__(self, clave):
+        self.clave = clave
+        self.ids = []
+        self.conexion = transaction.get_connection(clave[2])
+        self.indice = len(self.conexion.run_on_commit)
+
+    def vigente(self):
+        """Si sigue registrado en la transacción en curso"""
+        # Un callback anterior a este solo se descarta si este también (al
+        # deshacer la transacción o un savepoint que contiene a ambos), así
+        # que su posición no cambia mientras siga registrado
+        registrados = self.conexion.run_on_commit
+        return self.indice < len(registrados) and registrados[self.indice][1] is self
+
+    def __call__(self):
+        lotes = vars(_acumulados).setdefault('lotes', {})
+        if lotes.get(self.clave) is self:
+            del lotes[self.clave]
+        modelo, campo, using = self.clave
+        _fechar_ids(modelo._base_manager.using(using), self.ids, campo)
+
+
+def fechar_fila_al_confirmar(modelo, pk, campo, using=None):
+    """
+    Como ``fechar_ids_al_confirmar`` para la fila ``pk`` de ``modelo``, pero las
+    filas de una misma transacción se acumulan en un solo callback y se
+    vuelven a fechar juntas, por lotes, sin volver a consultarlas.
+    """
+    clave = (modelo, campo, using or DEFAULT_DB_ALIAS)
+    lotes = vars(_acumulados).setdefault('lotes', {})
+    lote = lotes.get(clave)
+    if lote is not None and lote.vigente():
+        lote.ids.append(pk)
+        return
+    lote = lotes[clave] = _FilasAcumuladas(clave)
+    lote.ids.append(pk)
+    transaction.on_commit(lote, using=clave[2])
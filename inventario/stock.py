@@ -0,0 +1,74 @@
+"""
+Registro de movimientos sobre el stock de los productos.
+
+El stock nunca se lee, modifica y guarda desde Python: cada movimiento
+aplica su diferencia con un único ``UPDATE ... SET cantidad = cantidad ± n``
+dentro de la transacción que guarda el movimiento. La fila del producto
+queda bloqueada hasta el commit, así que movimientos simultáneos sobre el
+mismo producto se serializan sin perder actualizaciones.
+"""
+from functools import partial
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .cache import invalidar
+from .estadisticas import registrar_cambio_stock
+from .models import Producto
+
+
+class StockInsuficiente(ValueError):
+    """La salida dejaría el stock del producto en negativo"""
+
+
+def diferencia_stock(movimiento):
+    """Cantidad que un movimiento suma (entrada) o resta (salida) al stock"""
+    if movimiento.tipo_movimiento.es_entrada:
+        return movimiento.cantidad
+    return -movimiento.cantidad
+
+
+def aplicar_movimiento(movimiento):
+    """
+    Aplica un movimiento nuevo sobre el stock de su producto.
+
+    Rellena ``cantidad_anterior`` y ``cantidad_nueva`` con los valores
+    reales tras el bloqueo; el movimiento se guarda después en la misma
+    transacción (lo hace ``Movimiento.save()``). Lanza ``StockInsuficiente``
+    si una salida supera el stock disponible.
+    """
+    movimiento.cantidad = int(movimiento.cantidad)
+    delta = diferencia_stock(movimiento)
+
+    with transaction.atomic():
+        productos = Producto.objects.filter(pk=movimiento.producto_id)
+        if delta < 0:
+            productos = productos.filter(cantidad__gte=-delta)
+        actualizados = productos.update(
+            cantidad=F('cantidad') + delta,
+            fecha_actualizacion=timezone.now(),
+        )
+        if not actualizados:
+            if not Producto.objects.filter(pk=movimiento.producto_id).exists():
+                raise Producto.DoesNotExist('Producto no encontrado')
+            raise StockInsuficiente(
+                f'Stock insuficiente para retirar {movimiento.cantidad} unidades'
+            )
+
+        # La fila ya está bloqueada por el UPDATE: la lectura ve nuestro valor
+        cantidad_nueva, precio_unitario = Producto.objects.filter(
+            pk=movimiento.producto_id
+        ).values_list('cantidad', 'precio_unitario').get()
+
+        movimiento.cantidad_anterior = cantidad_nueva - delta
+        movimiento.cantidad_nueva = cantidad_nueva
+        registrar_cambio_stock(movimiento.cantidad_anterior, cantidad_nueva, precio_unitario)
+
+        # ``update()`` no emite señales: invalidar la caché de productos a mano
+        transaction.on_commit(partial(invalidar, Producto))
+
+    # Mantener al día la instancia del producto si ya estaba cargada
+    if type(movimiento).producto.is_cached(movimiento):
+        movimiento.producto.cantidad = cantidad_nueva
+    return cantidad_nueva
@@ -1,3 +1,1412 @@
-from django.test import TestCase
+import base64
+import io
+import os
+import re
+import shutil
+import tempfile
+import threading
+import unittest
+import zlib
+from concurrent.futures import Executor, Future
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from cryptography.fernet import Fernet
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import busqueda
+from .busqueda import buscar_productos
+from .cache import _clave_version, consulta_cacheada, invalidar, version_datos
+from .cifrado import cifrado_con_clave_vigente
+from . import campos
+from . import codigos
+from . import codigos_barras
+from . import escaneo
+from . import etiquetas
+from .codigos import generar_codigo, reservar_codigos, siguiente_codigo
+from .estadisticas import obtener_resumen, productos_por_categoria, recalcular_estadisticas
+from .exportacion import COLUMNAS_PRODUCTOS
+from .importacion import importar_movimientos
+from .lotes import crear_pool
+from . import reportes
+from .metricas import metricas_movimientos, metricas_productos
+from .models import Area, Categoria, Licencia, Movimiento, Producto, Reporte, Sede, TipoMovimiento, Usuario
+from .paginacion import ORDEN_MOVIMIENTOS, ORDEN_PRODUCTOS, codificar_cursor, paginar_por_cursor
+from .reportes import crear_pdf_inventario, crear_pdf_movimientos, encolar_reporte, procesar_reporte, reservar_reporte, tomar_reporte
+from .stock import StockInsuficiente, diferencia_stock
+
+CACHE_LOCAL = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+class MediaTemporal:
+    """Guarda los archivos de la prueba en un directorio temporal y usa una caché en memoria"""
+
+    def setUp(self):
+        super().setUp()
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio, ignore_errors=True)
+        ajustes = self.settings(MEDIA_ROOT=directorio, CACHES=CACHE_LOCAL)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        cache.clear()
+
+
+class RegistroStockTest(TestCase):
+    """Aplicación de movimientos sobre el stock"""
+
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user('tecnico', password='clave')
+        categoria = Categoria.objects.create(nombre='Equipos')
+        self.producto = Producto.objects.create(codigo='EQ-001', nombre='Switch', categoria=categoria, cantidad=5)
+        self.entrada = TipoMovimiento.objects.create(nombre='Entrada', es_entrada=True)
+        self.salida = TipoMovimiento.objects.create(nombre='Salida', es_entrada=False)
+
+    def test_movimiento_actualiza_stock_una_vez(self):
+        movimiento = Movimiento.objects.create(
+            producto=self.producto, tipo_movimiento=self.entrada, cantidad=3,
+            usuario=self.usuario, motivo='Compra'
+        )
+        self.assertEqual((movimiento.cantidad_anterior, movimiento.cantidad_nueva), (5, 8))
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.cantidad, 8)
+
+    def test_salida_sin_stock_suficiente(self):
+        with self.assertRaises(StockInsuficiente):
+            Movimiento.objects.create(
+                producto=self.producto, tipo_movimiento=self.salida, cantidad=6,
+                usuario=self.usuario, motivo='Baja'
+            )
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.cantidad, 5)
+        self.assertFalse(Movimiento.objects.exists())
+
+
+class EstadisticasIncrementalesTest(TestCase):
+    """Las estadísticas mantenidas por diferencias coinciden con un recálculo completo"""
+
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user('tecnico', password='clave')
+        self.otro_usuario = Usuario.objects.create_user('auxiliar', password='clave')
+        self.equipos = Categoria.objects.create(nombre='Equipos')
+        self.redes = Categoria.objects.create(nombre='Redes')
+        self.sede = Sede.objects.create(nombre='Central')
+        self.area = Area.objects.create(nombre='Soporte', sede=self.sede)
+        entrada = TipoMovimiento.objects.create(nombre='Entrada', es_entrada=True)
+        # Construir el resumen antes de los cambios para que se mantenga por diferencias
+        obtener_resumen()
+
+        self.switch = Producto.objects.create(
+            codigo='EQ-001', nombre='Switch', categoria=self.redes, cantidad=2, precio_unitario='25.00'
+        )
+        self.laptop = Producto.objects.create(
+            codigo='EQ-002', nombre='Laptop', categoria=self.equipos, cantidad=10, precio_unitario='800.00',
+            sede=self.sede, area=self.area,
+        )
+        Producto.objects.create(codigo='EQ-003', nombre='Monitor', categoria=self.equipos, cantidad=1)
+        for usuario in (self.usuario, self.otro_usuario):
+            Movimiento.objects.create(
+                producto=self.switch, tipo_movimiento=entrada, cantidad=1, usuario=usuario, motivo='Compra'
+            )
+        Movimiento.objects.create(
+            producto=self.laptop, tipo_movimiento=entrada, cantidad=2, usuario=self.usuario, motivo='Compra'
+        )
+
+    def _estado(self, resumen):
+        categorias = {fila['nombre']: fila['total_productos'] for fila in productos_por_categoria()}
+        return (
+            resumen.total_productos, resumen.total_movimientos, resumen.productos_stock_bajo,
+            resumen.valor_total, categorias,
+        )
+
+    def _assert_coincide_con_recalculo(self):
+        incremental = self._estado(obtener_resumen())
+        self.assertEqual(incremental, self._estado(recalcular_estadisticas()))
+        return incremental
+
+    def test_altas_y_movimientos(self):
+        total_productos, total_movimientos, *_ = self._assert_coincide_con_recalculo()
+        self.assertEqual((total_productos, total_movimientos), (3, 3))
+
+    def test_eliminar_categoria_en_cascada(self):
+        self.redes.delete()
+        total_productos, total_movimientos, _, valor_total, _ = self._assert_coincide_con_recalculo()
+        self.assertEqual((total_productos, total_movimientos, valor_total), (2, 1, 9600))
+
+    def test_eliminar_sede_en_cascada(self):
+        self.sede.delete()
+        estado = self._assert_coincide_con_recalculo()
+        self.assertEqual(estado[:2], (2, 2))
+        self.assertEqual(estado[4], {'Equipos': 1, 'Redes': 1})
+
+    def test_eliminar_usuario_en_cascada(self):
+        self.otro_usuario.delete()
+        self.assertEqual(self._assert_coincide_con_recalculo()[1], 2)
+
+    def test_eliminar_producto_con_movimientos(self):
+        self.switch.delete()
+        self.assertEqual(self._assert_coincide_con_recalculo()[:2], (2, 1))
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class CacheVersionesTest(TestCase):
+    """Las consultas cacheadas se descartan cuando cambian los modelos de los que dependen"""
+
+    def setUp(self):
+        cache.clear()
+        self.categoria = Categoria.objects.create(nombre='Equipos')
+
+    def _total_productos(self):
+        return consulta_cacheada('total', (Producto,), Producto.objects.count)
+
+    def test_guardar_y_eliminar_cambian_la_version(self):
+        version = version_datos(Producto)
+        with self.captureOnCommitCallbacks(execute=True):
+            producto = Producto.objects.create(codigo='EQ-001', nombre='Switch', categoria=self.categoria)
+        despues_de_guardar = version_datos(Producto)
+        self.assertNotEqual(despues_de_guardar, version)
+        with self.captureOnCommitCallbacks(execute=True):
+            producto.delete()
+        self.assertNotIn(version_datos(Producto), (version, despues_de_guardar))
+
+    def test_consulta_cacheada_se_invalida(self):
+        self.assertEqual(self._total_productos(), 0)
+        # Sin invalidar, el resultado sale de la caché
+        Producto.objects.bulk_create([Producto(codigo='EQ-001', nombre='Switch', categoria=self.categoria)])
+        self.assertEqual(self._total_productos(), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            Producto.objects.create(codigo='EQ-002', nombre='Router', categoria=self.categoria)
+        self.assertEqual(self._total_productos(), 2)
+
+    def test_invalidaciones_concurrentes_no_repiten_version(self):
+        anterior = version_datos(Producto)
+        invalidar(Producto)
+        primera = version_datos(Producto)
+        # Otro proceso que leyó la versión anterior escribe la suya después
+        cache.set(_clave_version(Producto), anterior, timeout=None)
+        invalidar(Producto)
+        self.assertNotIn(version_datos(Producto), (anterior, primera))
+
+
+class BusquedaProductosTest(TestCase):
+    """Búsqueda de texto completo y sus términos buscados con ``icontains``"""
+
+    def setUp(self):
+        categoria = Categoria.objects.create(nombre='Equipos')
+        for codigo, nombre, marca in (
+            ('LAP-00123', 'Laptop ProBook', 'HP'),
+            ('LAP-00124', 'Laptop ThinkPad', 'Lenovo'),
+            ('MOU-00007', 'Mouse inalámbrico', 'Logitech'),
+        ):
+            Producto.objects.create(codigo=codigo, nombre=nombre, marca=marca, categoria=categoria)
+
+    def _codigos(self, texto):
+        return sorted(buscar_productos(Producto.objects.all(), texto).values_list('codigo', flat=True))
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', 'Prueba del índice FTS5 de SQLite')
+    def test_indice_fts5_por_prefijo(self):
+        self.assertTrue(busqueda._hay_fts_sqlite())
+        self.assertEqual(self._codigos('lenov'), ['LAP-00124'])
+        self.assertEqual(self._codigos('laptop'), ['LAP-00123', 'LAP-00124'])
+        self.assertEqual(self._codigos('laptop hp'), ['LAP-00123'])
+
+    def test_terminos_con_digitos_buscan_dentro_del_codigo(self):
+        self.assertEqual(self._codigos('123'), ['LAP-00123'])
+        self.assertEqual(self._codigos('laptop 124'), ['LAP-00124'])
+
+    def test_terminos_cortos_en_mysql(self):
+        # En MySQL "HP" es más corto que innodb_ft_min_token_size: no se consulta el índice
+        with mock.patch.object(busqueda, 'connection', mock.Mock(vendor='mysql')):
+            self.assertEqual(self._codigos('HP'), ['LAP-00123'])
+            self.assertEqual(self._codigos('pc'), [])
+
+    def test_sin_indice_usa_icontains(self):
+        with mock.patch.object(busqueda, '_hay_fts_sqlite', return_value=False), \
+                mock.patch.object(busqueda, 'connection', mock.Mock(vendor='sqlite')):
+            self.assertEqual(self._codigos('think'), ['LAP-00124'])
+            self.assertEqual(self._codigos('00007'), ['MOU-00007'])
+
+
+class PaginacionCursorTest(TestCase):
+    """Paginación por cursor con claves de orden repetidas"""
+
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user('tecnico', password='clave')
+        categoria = Categoria.objects.create(nombre='Equipos')
+        for n, nombre in enumerate(['Router', 'Laptop', 'Laptop', 'Monitor', 'Laptop', 'Router', 'Monitor']):
+            Producto.objects.create(codigo=f'EQ-{n:03d}', nombre=nombre, categoria=categoria, cantidad=100)
+        entrada = TipoMovimiento.objects.create(nombre='Entrada', es_entrada=True)
+        producto = Producto.objects.first()
+        for _ in range(5):
+            Movimiento.objects.create(
+                producto=producto, tipo_movimiento=entrada, cantidad=1, usuario=self.usuario, motivo='Compra'
+            )
+        # Todos los movimientos con la misma fecha: el orden lo decide el id
+        Movimiento.objects.update(fecha_movimiento=Movimiento.objects.first().fecha_movimiento)
+
+    def _recorrer(self, queryset, orden, por_pagina):
+        """Páginas hacia adelante y luego hacia atrás desde la última"""
+        adelante = [list(paginar_por_cursor(queryset, orden, None, por_pagina))]
+        pagina = paginar_por_cursor(queryset, orden, None, por_pagina)
+        while pagina.has_next():
+            pagina = paginar_por_cursor(queryset, orden, pagina.cursor_siguiente, por_pagina)
+            adelante.append(list(pagina))
+        atras = [list(pagina)]
+        while pagina.has_previous():
+            pagina = paginar_por_cursor(queryset, orden, pagina.cursor_anterior, por_pagina)
+            atras.append(list(pagina))
+        return adelante, atras[::-1]
+
+    def test_productos_con_nombres_repetidos(self):
+        adelante, atras = self._recorrer(Producto.objects.all(), ORDEN_PRODUCTOS, 3)
+        self.assertEqual([len(pagina) for pagina in adelante], [3, 3, 1])
+        self.assertEqual(sum(adelante, []), list(Producto.objects.order_by(*ORDEN_PRODUCTOS)))
+        self.assertEqual(atras, adelante)
+
+    def test_movimientos_descendentes_con_fechas_iguales(self):
+        adelante, atras = self._recorrer(Movimiento.objects.all(), ORDEN_MOVIMIENTOS, 2)
+        self.assertEqual(sum(adelante, []), list(Movimiento.objects.order_by(*ORDEN_MOVIMIENTOS)))
+        self.assertEqual(atras, adelante)
+
+    def test_cursor_invalido(self):
+        self.client.force_login(self.usuario)
+        url = reverse('inventario:api_movimientos')
+        for cursor in ('no-es-un-cursor', codificar_cursor(['2026-01-01'])):
+            respuesta = self.client.get(url, {'cursor': cursor}, secure=True)
+            self.assertEqual(respuesta.status_code, 400)
+
+
+class ImportacionMovimientosTest(TestCase):
+    """Importación masiva de movimientos desde CSV"""
+
+    CSV = (
+        'producto;tipo_movimiento;cantidad;motivo\n'
+        'EQ-001;Entrada;4;Compra\n'
+        'EQ-002;Salida;1;Baja\n'
+        'EQ-404;Entrada;1;Compra\n'
+        'EQ-001;Salida;dos;Baja\n'
+        'EQ-002;Salida;9;Baja\n'
+        'EQ-001;Salida;3;Préstamo\n'
+    )
+
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user('tecnico', password='clave')
+        categoria = Categoria.objects.create(nombre='Equipos')
+        self.switch = Producto.objects.create(codigo='EQ-001', nombre='Switch', categoria=categoria, cantidad=5)
+        self.router = Producto.objects.create(codigo='EQ-002', nombre='Router', categoria=categoria, cantidad=2)
+        TipoMovimiento.objects.create(nombre='Entrada', es_entrada=True)
+        TipoMovimiento.objects.create(nombre='Salida', es_entrada=False)
+
+    def _importar(self, **opciones):
+        archivo = io.BytesIO(self.CSV.encode())
+        return importar_movimientos(archivo, 'movimientos.csv', self.usuario, tamano_lote=2, **opciones)
+
+    def _cantidades(self):
+        return list(Producto.objects.order_by('codigo').values_list('cantidad', flat=True))
+
+    def test_importacion_actualiza_stock(self):
+        resultado = self._importar()
+        self.assertEqual((resultado.filas, resultado.creados, resultado.productos_actualizados), (6, 3, 2))
+        self.assertEqual(self._cantidades(), [6, 1])
+        saldos = Movimiento.objects.filter(producto=self.switch).order_by('cantidad_anterior')
+        self.assertEqual(list(saldos.values_list('cantidad_anterior', 'cantidad_nueva')), [(5, 9), (9, 6)])
+
+    def test_filas_con_errores(self):
+        errores = self._importar().errores
+        self.assertEqual([error['fila'] for error in errores], [4, 5, 6])
+        self.assertIn('EQ-404', errores[0]['error'])
+        self.assertIn('Cantidad inválida', errores[1]['error'])
+        self.assertIn('Stock insuficiente', errores[2]['error'])
+
+    def test_simular_no_guarda_cambios(self):
+        resultado = self._importar(simular=True)
+        self.assertEqual(resultado.creados, 3)
+        self.assertEqual(self._cantidades(), [5, 2])
+        self.assertFalse(Movimiento.objects.exists())
+
+    def test_comando(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8') as archivo:
+            archivo.write(self.CSV)
+        self.addCleanup(os.remove, archivo.name)
+        salida, errores = io.StringIO(), io.StringIO()
+        call_command('importar_movimientos', archivo.name, usuario='tecnico', stdout=salida, stderr=errores)
+        self.assertIn('3 movimientos creados', salida.getvalue())
+        self.assertIn('Fila 4:', errores.getvalue())
+        self.assertEqual(self._cantidades(), [6, 1])
+
+
+class ColaReportesTest(MediaTemporal, TestCase):
+    """Reserva, reintentos y recuperación de los reportes en cola"""
+
+    def setUp(self):
+        super().setUp()
+        self.usuario = Usuario.objects.create_user('tecnico', password='clave')
+        categoria = Categoria.objects.create(nombre='Equipos')
+        Producto.objects.create(codigo='EQ-001', nombre='Switch', categoria=categoria, cantidad=3)
+
+    def _encolar(self):
+        return encolar_reporte('inventario', self.usuario, {'estado': 'todos'})
+
+    def test_reserva_y_generacion(self):
+        reporte = self._encolar()
+        tomado = tomar_reporte()
+        self.assertEqual((tomado.pk, tomado.estado, tomado.intentos), (reporte.pk, 'procesando', 1))
+        # Ya reservado: ni otro worker ni una segunda reserva lo toman
+        self.assertIsNone(tomar_reporte())
+        self.assertIsNone(reservar_reporte(reporte.pk))
+
+        self.assertTrue(procesar_reporte(tomado))
+        reporte.refresh_from_db()
+        self.assertEqual((reporte.estado, reporte.progreso), ('completado', 100))
+        self.assertTrue(reporte.archivo.storage.exists(reporte.archivo.name))
+        self.assertEqual(reporte.parametros['total_productos'], 1)
+
+    def test_reintentos_hasta_el_maximo(self):
+        reporte = self._encolar()
+        with mock.patch.object(reportes, 'generar_pdf', side_effect=RuntimeError('sin memoria')), \
+                self.assertLogs('inventario.reportes', 'ERROR'):
+            for intento in range(1, reportes.MAX_INTENTOS + 1):
+                tomado = tomar_reporte()
+                self.assertEqual(tomado.intentos, intento)
+                self.assertFalse(procesar_reporte(tomado))
+                reporte.refresh_from_db()
+                if intento < reportes.MAX_INTENTOS:
+                    # Reintento programado más adelante: todavía no se puede tomar
+                    self.assertEqual(reporte.estado, 'pendiente')
+                    self.assertGreater(reporte.programado_para, timezone.now())
+                    self.assertIsNone(tomar_reporte())
+                    Reporte.objects.filter(pk=reporte.pk).update(programado_para=timezone.now())
+        self.assertEqual((reporte.estado, reporte.error), ('error', 'sin memoria'))
+        self.assertIsNone(tomar_reporte())
+
+    def test_recuperacion_de_reportes_abandonados(self):
+        reporte = self._encolar()
+        agotado = self._encolar()
+        vencido = timezone.now() - timedelta(seconds=reportes.TIEMPO_MAXIMO_PROCESO + 1)
+        Reporte.objects.filter(pk=reporte.pk).update(estado='procesando', intentos=1, fecha_inicio=vencido)
+        Reporte.objects.filter(pk=agotado.pk).update(
+            estado='procesando', intentos=reportes.MAX_INTENTOS, fecha_inicio=vencido
+        )
+
+        tomado = tomar_reporte()
+        self.assertEqual((tomado.pk, tomado.intentos), (reporte.pk, 2))
+        agotado.refresh_from_db()
+        self.assertEqual(agotado.estado, 'error')
+
+
+def contenido_pdf(datos):
+    """Número de páginas y texto de los streams (comprimidos o no) de un PDF"""
+    paginas = len(re.findall(rb'/Type /Page\b', datos))
+    textos = []
+    for stream in re.findall(rb'stream\r?\n(.*?)endstream', datos, re.S):
+        stream = stream.strip()
+        if stream.endswith(b'~>'):
+            stream = base64.a85decode(stream, adobe=True)
+        try:
+            textos.append(zlib.decompress(stream))
+        except zlib.error:
+            textos.append(stream)
+    return paginas, b'\n'.join(textos).decode('latin-1')
+
+
+class ReportePorBloquesTest(TestCase):
+    """El PDF armado por bloques incluye todas las filas aunque ocupe varias páginas"""
+
+    def test_reporte_de_varios_bloques_completo(self):
+        categoria = Categoria.objects.create(nombre='Equipos')
+        total = reportes.FILAS_POR_BLOQUE * 3 + 5
+        Producto.objects.bulk_create([
+            Producto(codigo=f'EQ-{n:04d}', nombre=f'Equipo {n}', categoria=categoria, cantidad=1, precio_unitario=2)
+            for n in range(total)
+        ])
+        productos = Producto.objects.select_related('categoria').order_by('codigo')
+        paginas, texto = contenido_pdf(crear_pdf_inventario(productos).getvalue())
+
+        self.assertGreaterEqual(paginas, 4)
+        self.assertEqual(len(re.findall(r'\(EQ-\d{4}\)', texto)), total)
+        self.assertIn(f'(EQ-{total - 1:04d})', texto)
+        self.assertIn(f'Total de productos: {total}', texto)
+        self.assertIn(f'${total * 2:,.2f}', texto)
+
+
+class ReporteMismosBytesTest(MediaTemporal, TestCase):
+    """Reportes de los mismos datos generados en otro momento comparten el archivo"""
+
+    def test_mismos_datos_mismo_archivo(self):
+        usuario = Usuario.objects.create_user('tecnico', password='clave')
+        categoria = Categoria.objects.create(nombre='Equipos')
+        Producto.objects.create(codigo='EQ-001', nombre='Switch', categoria=categoria, cantidad=3)
+        primero = Reporte.objects.create(
+            nombre='A', tipo='inventario', usuario=usuario, parametros={'categoria_id': categoria.pk}
+        )
+        segundo = Reporte.objects.create(
+            nombre='B', tipo='inventario', usuario=usuario, parametros={'categoria_id': categoria.pk}
+        )
+        procesar_reporte(primero)
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() + timedelta(days=1)):
+            procesar_reporte(segundo)
+        primero.refresh_from_db()
+        segundo.refresh_from_db()
+        self.assertEqual((primero.estado, segundo.estado), ('completado', 'completado'))
+        self.assertEqual(segundo.archivo.name, primero.archivo.name)
+
+
+class ExportacionXlsxTest(TestCase):
+    """Exportación de listados con el libro de solo escritura de openpyxl"""
+
+    def setUp(self):
+        self.client.force_login(Usuario.objects.create_user('tecnico', password='clave'))
+        categoria = Categoria.objects.create(nombre='Equipos')
+        for n in range(3):
+            Producto.objects.create(codigo=f'EQ-00{n}', nombre=f'Equipo {n}', categoria=categoria, cantidad=n)
+
+    def test_exportar_productos(self):
+        from openpyxl import load_workbook
+
+        respuesta = self.client.get(reverse('inventario:exportar_productos'), secure=True)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn('attachment; filename="Productos_', respuesta['Content-Disposition'])
+        contenido = b''.join(respuesta.streaming_content)
+        respuesta.close()
+        libro = load_workbook(io.BytesIO(contenido), read_only=True)
+        filas = list(libro['Productos'].iter_rows(values_only=True))
+        libro.close()
+
+        self.assertEqual(list(filas[0]), [titulo for titulo, _ in COLUMNAS_PRODUCTOS])
+        self.assertEqual(len(filas), 4)
+        self.assertEqual(sorted((fila[0], fila[11]) for fila in filas[1:]), [('EQ-000', 0), ('EQ-001', 1), ('EQ-002', 2)])
+
+
+class DescargaReportesTest(MediaTemporal, TestCase):
+    """Descarga de reportes con validación de caché y rangos"""
+
+    CONTENIDO = bytes(range(256)) * 4
+
+    def setUp(self):
+        super().setUp()
+        usuario = Usuario.objects.create_user('tecnico', password='clave')
+        self.client.force_login(usuario)
+        reporte = Reporte(
+            nombre='Inventario', tipo='inventario', usuario=usuario, estado='completado',
+            fecha_finalizacion=timezone.now(),
+        )
+        reporte.archivo.save('reporte.pdf', ContentFile(self.CONTENIDO), save=False)
+        reporte.save()
+        self.url = reverse('inventario:descargar_reporte', args=[reporte.pk])
+
+    def _descargar(self, **encabezados):
+        respuesta = self.client.get(self.url, secure=True, headers=encabezados)
+        contenido = b''.join(respuesta.streaming_content) if respuesta.streaming else respuesta.content
+        respuesta.close()
+        return respuesta, contenido
+
+    def test_archivo_completo_y_no_modificado(self):
+        respuesta, contenido = self._descargar()
+        self.assertEqual((respuesta.status_code, contenido), (200, self.CONTENIDO))
+        self.assertEqual(respuesta['Accept-Ranges'], 'bytes')
+        respuesta, _ = self._descargar(if_none_match=respuesta['ETag'])
+        self.assertEqual(respuesta.status_code, 304)
+
+    def test_rango(self):
+        respuesta, contenido = self._descargar(range='bytes=10-19')
+        self.assertEqual((respuesta.status_code, contenido), (206, self.CONTENIDO[10:20]))
+        self.assertEqual(respuesta['Content-Range'], f'bytes 10-19/{len(self.CONTENIDO)}')
+        respuesta, contenido = self._descargar(range='bytes=-4')
+        self.assertEqual((respuesta.status_code, contenido), (206, self.CONTENIDO[-4:]))
+
+    def test_nombre_con_comillas_y_no_ascii_en_ambas_respuestas(self):
+        Reporte.objects.update(nombre='Sede "Ñuñoa"')
+        completo, _ = self._descargar()
+        tramo, _ = self._descargar(range='bytes=0-9')
+        self.assertEqual(tramo.status_code, 206)
+        self.assertEqual(tramo['Content-Disposition'], completo['Content-Disposition'])
+        self.assertIn("filename*=utf-8''Sede%20%22%C3%91u%C3%B1oa%22", tramo['Content-Disposition'])
+
+    def test_if_range_con_etag_vencido(self):
+        etag = self._descargar()[0]['ETag']
+        respuesta, _ = self._descargar(range='bytes=10-19', if_range=etag)
+        self.assertEqual(respuesta.status_code, 206)
+        respuesta, contenido = self._descargar(range='bytes=10-19', if_range='"otra-version"')
+        self.assertEqual((respuesta.status_code, contenido), (200, self.CONTENIDO))
+
+    def test_rango_fuera_del_archivo(self):
+        respuesta, _ = self._descargar(range=f'bytes={len(self.CONTENIDO)}-')
+        self.assertEqual(respuesta.status_code, 416)
+        self.assertEqual(respuesta['Content-Range'], f'bytes */{len(self.CONTENIDO)}')
+
+
+class MetricasReportesTest(TestCase):
+    """El resumen de los reportes se acumula en la misma pasada que imprime las filas"""
+
+    def setUp(self):
+        usuario = Usuario.objects.create_user('tecnico', password='clave')
+        categoria = Categoria.objects.create(nombre='Equipos')
+        switch = Producto.objects.create(
+            codigo='EQ-001', nombre='Switch', categoria=categoria, cantidad=2, precio_unitario='10.50'
+        )
+        Producto.objects.create(codigo='EQ-002', nombre='Laptop', categoria=categoria, cantidad=7, precio_unitario=100)
+        Producto.objects.create(codigo='EQ-003', nombre='Cable', categoria=categoria, cantidad=1)
+        entrada = TipoMovimiento.objects.create(nombre='Entrada', es_entrada=True)
+        salida = TipoMovimiento.objects.create(nombre='Salida', es_entrada=False)
+        for tipo in (entrada, entrada, salida):
+            Movimiento.objects.create(producto=switch, tipo_movimiento=tipo, cantidad=1, usuario=usuario, motivo='x')
+
+    def test_productos_en_una_sola_consulta(self):
+        metricas = metricas_productos()
+        productos = Producto.objects.select_related('categoria').order_by('codigo')
+        with self.assertNumQueries(1):
+            _, texto = contenido_pdf(crear_pdf_inventario(productos, metricas=metricas).getvalue())
+        # Switch: 3 x 10.50 (dos entradas y una salida sobre 2), Laptop: 7 x 100
+        self.assertEqual(dict(metricas), {
+            'total_productos': 3, 'productos_stock_bajo': 2, 'valor_total': Decimal('731.50'),
+        })
+        self.assertIn('($731.50)', texto)
+
+    def test_progreso_sin_volver_a_leer_la_tabla(self):
+        obtener_resumen()
+        productos = Producto.objects.select_related('categoria').order_by('codigo')
+        avances = []
+        with CaptureQueriesContext(connection) as consultas:
+            crear_pdf_inventario(productos, progreso=avances.append)
+        lecturas = [c['sql'] for c in consultas.captured_queries if 'FROM "inventario_producto"' in c['sql']]
+        self.assertEqual(len(lecturas), 1)
+        self.assertEqual(avances[-1], 90)
+        self.assertEqual(avances, sorted(avances))
+
+    def test_movimientos(self):
+        metricas = metricas_movimientos()
+        movimientos = Movimiento.objects.select_related('producto', 'tipo_movimiento', 'usuario')
+        crear_pdf_movimientos(movimientos, metricas=metricas)
+        self.assertEqual(dict(metricas), {'total_movimientos': 3, 'entradas': 2, 'salidas': 1})
+
+
+class PoolEnProceso(Executor):
+    """Ejecuta cada tarea al enviarla, en este proceso y con la conexión de la prueba"""
+
+    def submit(self, funcion, *args, **kwargs):
+        futuro = Future()
+        futuro.set_result(funcion(*args, **kwargs))
+        return futuro
+
+
+@mock.patch('django.db.close_old_connections')
+class LoteReportesTest(MediaTemporal, TestCase):
+    """Lote de cierre: un reporte de cada tipo por sede activa"""
+
+    def setUp(self):
+        super().setUp()
+        Usuario.objects.create_user('admin', password='clave')
+        categoria = Categoria.objects.create(nombre='Equipos')
+        for nombre in ('Central', 'Norte'):
+            sede = Sede.objects.create(nombre=nombre)
+            Producto.objects.create(codigo=f'{nombre[:3].upper()}-001', nombre='Switch', categoria=categoria, sede=sede)
+        Sede.objects.create(nombre='Cerrada', activo=False)
+
+    def _generar_lote(self):
+        salida = io.StringIO()
+        with mock.patch(
+            'inventario.management.commands.generar_lote_reportes.crear_pool', return_value=PoolEnProceso()
+        ):
+            call_command('generar_lote_reportes', usuario='admin', procesos=2, stdout=salida)
+        return salida.getvalue()
+
+    def test_lote_generado_y_reutilizado(self, _):
+        salida = self._generar_lote()
+        self.assertIn('6 reportes en el lote (0 sin cambios)', salida)
+        self.assertIn('6 generados, 0 reutilizados, 0 con errores', salida)
+        self.assertEqual(Reporte.objects.filter(estado='completado').count(), 6)
+        self.assertFalse(Reporte.objects.filter(nombre__contains='Cerrada').exists())
+        resumenes = Reporte.objects.filter(tipo='inventario').values_list('parametros__total_productos', flat=True)
+        self.assertEqual(list(resumenes), [1, 1])
+
+        # Sin cambios en los datos, un segundo lote reutiliza todos los archivos
+        salida = self._generar_lote()
+        self.assertIn('0 generados, 6 reutilizados', salida)
+
+
+def _modelo_en_proceso():
+    return os.getpid(), Reporte._meta.label_lower
+
+
+class PoolProcesosTest(unittest.TestCase):
+    """El pool real arranca con "spawn" y carga Django en cada proceso"""
+
+    def test_procesos_cargan_los_modelos(self):
+        with crear_pool(2) as pool:
+            resultados = [futuro.result(timeout=60) for futuro in [pool.submit(_modelo_en_proceso) for _ in range(4)]]
+        self.assertEqual({etiqueta for _, etiqueta in resultados}, {'inventario.reporte'})
+        self.assertNotIn(os.getpid(), {pid for pid, _ in resultados})
+
+
+class AlmacenCodigosBarrasTest(unittest.TestCase):
+    """Caché en memoria y en disco de las imágenes de códigos de barras"""
+
+    def setUp(self):
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio, ignore_errors=True)
+        for nombre, valor in (('DIRECTORIO', directorio), ('_escrituras', 0)):
+            parche = mock.patch.object(codigos_barras, nombre, valor)
+            parche.start()
+            self.addCleanup(parche.stop)
+        codigos_barras._memoria.clear()
+        self.addCleanup(codigos_barras._memoria.clear)
+        parche = mock.patch.object(codigos_barras, '_dibujar', wraps=codigos_barras._dibujar)
+        self.dibujar = parche.start()
+        self.addCleanup(parche.stop)
+
+    def _archivos(self):
+        return sorted(
+            nombre for _, _, nombres in os.walk(codigos_barras.DIRECTORIO) for nombre in nombres
+        )
+
+    def test_segunda_imagen_sale_de_la_cache(self):
+        imagen = codigos_barras.imagen_codigo_barras('EQ-001', 'svg')
+        self.assertEqual(codigos_barras.imagen_codigo_barras('EQ-001', 'svg'), imagen)
+        self.assertEqual(self.dibujar.call_count, 1)
+        self.assertEqual(len(self._archivos()), 1)
+
+        # Otro proceso (memoria vacía) la lee del disco sin dibujarla
+        codigos_barras._memoria.clear()
+        self.assertEqual(codigos_barras.imagen_codigo_barras('EQ-001', 'svg'), imagen)
+        self.assertEqual(self.dibujar.call_count, 1)
+
+        # Otro formato es otra imagen
+        codigos_barras.imagen_codigo_barras('EQ-001', 'png')
+        self.assertEqual(self.dibujar.call_count, 2)
+
+    def test_poda_borra_las_menos_usadas(self):
+        for n in range(5):
+            codigos_barras.imagen_codigo_barras(f'EQ-00{n}', 'svg')
+        rutas = {
+            n: codigos_barras._ruta(codigos_barras.clave_codigo_barras(f'EQ-00{n}', 'svg'), 'svg') for n in range(5)
+        }
+        for n, ruta in rutas.items():
+            os.utime(ruta, (1000 + n, 1000 + n))
+        # Leer del disco marca el uso: EQ-000 pasa a ser la más reciente
+        codigos_barras._memoria.clear()
+        codigos_barras.imagen_codigo_barras('EQ-000', 'svg')
+
+        self.assertEqual(codigos_barras.podar_almacen(3), 2)
+        self.assertEqual([n for n, ruta in rutas.items() if os.path.exists(ruta)], [0, 3, 4])
+        self.assertEqual(codigos_barras.podar_almacen(3), 0)
+
+    def test_poda_automatica_al_escribir(self):
+        with mock.patch.object(codigos_barras, 'MAX_ARCHIVOS', 3), \
+                mock.patch.object(codigos_barras, 'ESCRITURAS_POR_PODA', 5):
+            for n in range(5):
+                codigos_barras.imagen_codigo_barras(f'EQ-00{n}', 'svg')
+        self.assertEqual(len(self._archivos()), 3)
+
+
+class SvgCodigoBarrasTest(unittest.TestCase):
+    """El SVG compacto dibuja exactamente los módulos de Code128 de python-barcode"""
+
+    def _modulos_svg(self, svg):
+        opciones = codigos_barras.OPCIONES_SVG
+        modulo, margen = opciones['module_width'], opciones['quiet_zone']
+        ancho = float(re.search(r'viewBox="0 0 ([\d.]+) ', svg).group(1))
+        modulos = ['0'] * round((ancho - 2 * margen) / modulo)
+        trazo = re.search(r'<path d="([^"]*)"', svg).group(1)
+        for inicio, largo in re.findall(r'M([\d.]+) 0h([\d.]+)v', trazo):
+            primero, cantidad = round((float(inicio) - margen) / modulo), round(float(largo) / modulo)
+            modulos[primero:primero + cantidad] = '1' * cantidad
+        return ''.join(modulos)
+
+    def test_svg_coincide_con_python_barcode(self):
+        import barcode
+
+        for codigo in ('EQ-001', 'LAP-00123', 'abc 987/xyz'):
+            svg = codigos_barras._svg(codigo, codigos_barras.OPCIONES_SVG).decode()
+            self.assertEqual(self._modulos_svg(svg), barcode.Code128(codigo).build()[0], codigo)
+
+
+class ImagenCodigoBarrasTest(TestCase):
+    """Endpoint cacheable de la imagen del código de barras"""
+
+    def setUp(self):
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio, ignore_errors=True)
+        parche = mock.patch.object(codigos_barras, 'DIRECTORIO', directorio)
+        parche.start()
+        self.addCleanup(parche.stop)
+        self.client.force_login(Usuario.objects.create_user('tecnico', password='clave'))
+        categoria = Categoria.objects.create(nombre='Equipos')
+        self.producto = Producto.objects.create(codigo='EQ-001', nombre='Switch', categoria=categoria)
+
+    def _pedir(self, formato='svg', parametros=None, **encabezados):
+        url = reverse('inventario:codigo_barras_producto', args=[self.producto.pk, formato])
+        return self.client.get(url, parametros or {}, secure=True, headers=encabezados)
+
+    def test_imagen_y_304_con_etag(self):
+        respuesta = self._pedir()
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta['Content-Type'], 'image/svg+xml')
+        self.assertTrue(respuesta.content.startswith(b'<svg'))
+
+        respuesta = self._pedir(if_none_match=respuesta['ETag'])
+        self.assertEqual(respuesta.status_code, 304)
+        self.assertEqual(respuesta.content, b'')
+        self.assertEqual(self._pedir('png', if_none_match=respuesta['ETag']).status_code, 200)
+
+    def test_immutable_solo_con_el_codigo_vigente(self):
+        self.assertIn('immutable', self._pedir(parametros={'c': 'EQ-001'})['Cache-Control'])
+        self.assertEqual(self._pedir()['Cache-Control'], 'private, no-cache')
+        # URL de antes de editar el código: se revalida en lugar de cachearse para siempre
+        self.assertEqual(self._pedir(parametros={'c': 'EQ-000'})['Cache-Control'], 'private, no-cache')
+
+    def test_formato_desconocido(self):
+        self.assertEqual(self._pedir('gif').status_code, 404)
+
+
+class HojaEtiquetasTest(TestCase):
+    """Hoja de etiquetas en PDF y selección de productos a imprimir"""
+
+    def setUp(self):
+        self.client.force_login(Usuario.objects.create_user('tecnico', password='clave'))
+        self.laptops = Categoria.objects.create(nombre='Laptops')
+        self.monitores = Categoria.objects.create(nombre='Monitores')
+        Producto.objects.bulk_create([
+            Producto(codigo=f'LAP-{n:03d}', nombre=f'Laptop {n}', categoria=self.laptops) for n in range(3)
+        ] + [
+            Producto(codigo=f'MON-{n:03d}', nombre=f'Monitor {n}', categoria=self.monitores) for n in range(2)
+        ])
+
+    def test_salto_de_hoja_al_completar_la_grilla(self):
+        for nombre, plantilla in etiquetas.PLANTILLAS.items():
+            por_hoja = plantilla['columnas'] * plantilla['filas']
+            for total, hojas in ((1, 1), (por_hoja, 1), (por_hoja + 1, 2), (2 * por_hoja + 1, 3)):
+                productos = [Producto(codigo=f'EQ-{n:04d}', nombre=f'Equipo {n}') for n in range(total)]
+                destino = io.BytesIO()
+                self.assertEqual(etiquetas.escribir_hoja_etiquetas(destino, productos, nombre), total)
+                paginas, texto = contenido_pdf(destino.getvalue())
+                self.assertEqual(paginas, hojas, (nombre, total))
+                self.assertEqual(len(re.findall(r'\(EQ-\d{4}\)', texto)), total)
+
+    def _codigos(self, parametros, metodo='get'):
+        url = reverse('inventario:imprimir_etiquetas')
+        if metodo == 'post':
+            respuesta = self.client.post(url + '?formato=zpl', parametros, secure=True)
+        else:
+            respuesta = self.client.get(url, {**parametros, 'formato': 'zpl'}, secure=True)
+        self.assertEqual(respuesta.status_code, 200)
+        zpl = b''.join(respuesta.streaming_content).decode()
+        return re.findall(r'\^BC[^\^]*\^FH\^FD([^\^]+)\^FS', zpl)
+
+    def test_ids_seleccionados_o_filtros_del_listado(self):
+        ids = dict(Producto.objects.values_list('codigo', 'id'))
+        seleccion = {'ids': [f"{ids['MON-001']},{ids['LAP-002']}", str(ids['LAP-000'])]}
+        self.assertEqual(self._codigos(seleccion), ['LAP-000', 'LAP-002', 'MON-001'])
+        self.assertEqual(self._codigos(seleccion, 'post'), ['LAP-000', 'LAP-002', 'MON-001'])
+        # Los ids tienen prioridad sobre los filtros
+        self.assertEqual(self._codigos({**seleccion, 'categoria': self.monitores.pk}), ['LAP-000', 'LAP-002', 'MON-001'])
+        # Sin ids se imprime lo filtrado
+        self.assertEqual(sorted(self._codigos({'categoria': self.monitores.pk})), ['MON-000', 'MON-001'])
+
+    def test_pdf_con_plantilla(self):
+        respuesta = self.client.get(
+            reverse('inventario:imprimir_etiquetas'), {'plantilla': 'carta_3x10'}, secure=True
+        )
+        self.assertEqual(respuesta['Content-Type'], 'application/pdf')
+        paginas, texto = contenido_pdf(b''.join(respuesta.streaming_content))
+        self.assertEqual(paginas, 1)
+        self.assertEqual(len(re.findall(r'\((?:LAP|MON)-\d{3}\)', texto)), 5)
+
+    def test_codigo_sin_code128_solo_en_texto(self):
+        camaras = Categoria.objects.create(nombre='Cámaras')
+        Producto.objects.create(codigo='CÁM-00001', nombre='Cámara IP', categoria=camaras)
+        respuesta = self.client.get(reverse('inventario:imprimir_etiquetas'), secure=True)
+        self.assertEqual(respuesta.status_code, 200)
+        paginas, texto = contenido_pdf(b''.join(respuesta.streaming_content))
+        self.assertEqual(paginas, 1)
+        self.assertEqual(len(re.findall(r'\((?:LAP|MON)-\d{3}\)', texto)), 5)
+        self.assertRegex(texto, r'\(C.{1,4}M-00001\)')
+
+    @mock.patch('inventario.views.MAX_ETIQUETAS', 4)
+    def test_redirige_si_supera_el_maximo(self):
+        url = reverse('inventario:imprimir_etiquetas')
+        respuesta = self.client.get(url, secure=True)
+        self.assertRedirects(respuesta, reverse('inventario:lista_productos'), fetch_redirect_response=False)
+        self.assertEqual([m.level_tag for m in get_messages(respuesta.wsgi_request)], ['error'])
+        # Con un filtro que deja menos productos sí se imprime
+        respuesta = self.client.get(url, {'categoria': self.laptops.pk}, secure=True)
+        self.assertEqual(respuesta.status_code, 200)
+
+
+class EtiquetaZplTest(TestCase):
+    """Etiquetas ZPL para impresoras Zebra"""
+
+    def test_escapa_caracteres_de_control_y_no_ascii(self):
+        self.assertEqual(etiquetas._texto_zpl('EQ-001 abc'), 'EQ-001 abc')
+        self.assertEqual(etiquetas._texto_zpl('a^b~c_d'), 'a_5Eb_7Ec_5Fd')
+        self.assertEqual(etiquetas._texto_zpl('Ñandú\n'), '_C3_91and_C3_BA_0A')
+
+    def test_cada_etiqueta_entre_xa_y_xz(self):
+        self.client.force_login(Usuario.objects.create_user('tecnico', password='clave'))
+        sede = Sede.objects.create(nombre='Sede ^Norte~')
+        categoria = Categoria.objects.create(nombre='Equipos')
+        for n in range(3):
+            Producto.objects.create(codigo=f'EQ_{n}', nombre=f'Cámara {n}', categoria=categoria, sede=sede)
+        respuesta = self.client.get(reverse('inventario:imprimir_etiquetas'), {'formato': 'zpl'}, secure=True)
+        zpl = b''.join(respuesta.streaming_content).decode()
+
+        bloques = re.findall(r'\^XA\n(.*?)\^XZ\n', zpl, re.S)
+        self.assertEqual(len(bloques), 3)
+        self.assertEqual(re.sub(r'\^XA\n.*?\^XZ\n', '', zpl, flags=re.S), '')
+        for n, bloque in enumerate(bloques):
+            self.assertNotIn('^XA', bloque)
+            self.assertIn(f'^FH^FDC_C3_A1mara {n}^FS', bloque)
+            self.assertIn('^BCN', bloque)
+            self.assertIn(f'^FH^FDEQ_5F{n}^FS', bloque)
+            self.assertIn('^FDSede _5ENorte_7E^FS', bloque)
+            # Todo campo con escapes va precedido de ^FH
+            self.assertEqual(bloque.count('^FD'), bloque.count('^FH^FD'))
+
+
+@override_settings(CACHES=CACHE_LOCAL)
+class EscaneoProductosTest(TestCase):
+    """Búsqueda por lectura de código de barras o serie"""
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = Usuario.objects.create_user('tecnico', password='clave')
+        self.client.force_login(self.usuario)
+        categoria = Categoria.objects.create(nombre='Equipos')
+        self.switch = Producto.objects.create(
+            codigo='EQ-001', nombre='Switch', categoria=categoria, serie='SN-1', cantidad=4
+        )
+        self.gemelos = [
+            Producto.objects.create(codigo=f'EQ-01{n}', nombre=f'Monitor {n}', categoria=categoria, serie='SN-2')
+            for n in range(2)
+        ]
+
+    def _escanear(self, codigo, estado=200):
+        respuesta = self.client.get(reverse('inventario:api_escanear'), {'codigo': codigo}, secure=True)
+        self.assertEqual(respuesta.status_code, estado)
+        return respuesta.json()
+
+    def test_coincidencia_por_codigo_y_serie(self):
+        datos = self._escanear('  eq-001 ')
+        self.assertEqual(datos['coincidencia'], 'codigo')
+        self.assertEqual((datos['producto']['id'], datos['producto']['cantidad']), (self.switch.pk, 4))
+        self.assertEqual(self._escanear('sn-1')['coincidencia'], 'serie')
+        self._escanear('EQ-999', 404)
+        self._escanear(' ', 400)
+
+    def test_serie_compartida_devuelve_409(self):
+        datos = self._escanear('SN-2', 409)
+        self.assertEqual(datos['coincidencia'], 'serie')
+        self.assertEqual(sorted(p['id'] for p in datos['productos']), sorted(p.pk for p in self.gemelos))
+
+    def test_mayusculas_solo_se_ignoran_sin_ambiguedad(self):
+        categoria = self.switch.categoria
+        minuscula = Producto.objects.create(codigo='eq-001', nombre='Router', categoria=categoria, serie='sn-1')
+        self.assertEqual(self._escanear('EQ-001')['producto']['id'], self.switch.pk)
+        self.assertEqual(self._escanear('eq-001')['producto']['id'], minuscula.pk)
+        self.assertEqual(self._escanear('sn-1')['producto']['id'], minuscula.pk)
+        # 'Eq-001' podría ser cualquiera de los dos: no se adivina
+        self._escanear('Eq-001', 404)
+        # Sin otro valor que difiera solo en mayúsculas se sigue encontrando
+        self.assertEqual(len(self._escanear('sn-2', 409)['productos']), 2)
+
+    def test_reconstruye_al_guardar_y_no_con_movimientos(self):
+        self.assertIn('EQ-001', escaneo.indice_actual()['codigos'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.switch.codigo = 'EQ-100'
+            self.switch.save()
+        self._escanear('EQ-001', 404)
+        self.assertEqual(self._escanear('EQ-100')['producto']['nombre'], 'Switch')
+
+        indice = escaneo.indice_actual()
+        entrada = TipoMovimiento.objects.create(nombre='Entrada', es_entrada=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            Movimiento.objects.create(
+                producto=self.switch, tipo_movimiento=entrada, cantidad=3, usuario=self.usuario, motivo='Compra'
+            )
+        # El stock se lee al responder: el índice sigue siendo el mismo
+        self.assertIs(escaneo.indice_actual(), indice)
+        self.assertEqual(self._escanear('EQ-100')['producto']['cantidad'], 7)
+
+
+CLAVE_ANTERIOR = Fernet.generate_key().decode()
+CLAVE_NUEVA = Fernet.generate_key().decode()
+
+
+@override_settings(LICENSE_ENCRYPTION_KEY=CLAVE_ANTERIOR)
+class RotacionClavesTest(TestCase):
+    """Re-cifrado de los secretos guardados con ``rotar_claves``"""
+
+    def setUp(self):
+        self.licencias = [
+            Licencia.objects.create(nombre=f'Office {n}', clave_licencia=f'CLAVE-{n}') for n in range(3)
+        ]
+
+    def _tokens(self):
+        return {pk: secreto.token for pk, secreto in Licencia.objects.values_list('pk', 'clave_licencia')}
+
+    def _rotar(self, **opciones):
+        salida = io.StringIO()
+        call_command('rotar_claves', llavero=['licencias'], lote=2, stdout=salida, **opciones)
+        return salida.getvalue()
+
+    def test_recifra_con_la_clave_nueva_y_repetir_no_cambia_nada(self):
+        with self.settings(LICENSE_ENCRYPTION_KEY=f'{CLAVE_NUEVA},{CLAVE_ANTERIOR}'):
+            self.assertIn('licencias: 3 re-cifrados, 0 ya vigentes', self._rotar())
+            tokens = self._tokens()
+            nueva = Fernet(CLAVE_NUEVA)
+            self.assertEqual(
+                [nueva.decrypt(tokens[licencia.pk].encode()).decode() for licencia in self.licencias],
+                ['CLAVE-0', 'CLAVE-1', 'CLAVE-2'],
+            )
+
+            self.assertIn('licencias: 0 re-cifrados, 3 ya vigentes', self._rotar())
+            self.assertEqual(self._tokens(), tokens)
+        # Retirada la clave anterior, los secretos se siguen leyendo
+        with self.settings(LICENSE_ENCRYPTION_KEY=CLAVE_NUEVA):
+            self.assertEqual(Licencia.objects.get(pk=self.licencias[0].pk).get_license_key(), 'CLAVE-0')
+
+    def test_continua_desde_id(self):
+        antes = self._tokens()
+        with self.settings(LICENSE_ENCRYPTION_KEY=f'{CLAVE_NUEVA},{CLAVE_ANTERIOR}'):
+            self.assertIn('licencias: 2 re-cifrados', self._rotar(desde_id=self.licencias[0].pk))
+            despues = self._tokens()
+            self.assertEqual(despues[self.licencias[0].pk], antes[self.licencias[0].pk])
+            for licencia in self.licencias[1:]:
+                self.assertTrue(cifrado_con_clave_vigente('licencias', despues[licencia.pk]))
+
+    def test_simular_no_guarda(self):
+        antes = self._tokens()
+        with self.settings(LICENSE_ENCRYPTION_KEY=f'{CLAVE_NUEVA},{CLAVE_ANTERIOR}'):
+            self.assertIn('licencias: 3 re-cifrados', self._rotar(simular=True))
+        self.assertEqual(self._tokens(), antes)
+
+    def test_sin_clave_configurada(self):
+        with self.settings(LICENSE_ENCRYPTION_KEY=''):
+            with self.assertRaisesMessage(ImproperlyConfigured, 'LICENSE_ENCRYPTION_KEY'):
+                self._rotar()
+        with self.settings(LICENSE_ENCRYPTION_KEY='no-es-una-clave'):
+            with self.assertRaises(ImproperlyConfigured):
+                self._rotar()
+
+
+@override_settings(LICENSE_ENCRYPTION_KEY=CLAVE_ANTERIOR)
+class CampoCifradoTest(TestCase):
+    """``CampoCifrado`` descifra solo al pedir el texto y nunca lo muestra"""
+
+    def test_listado_no_descifra(self):
+        for n in range(3):
+            Licencia.objects.create(nombre=f'Office {n}', clave_licencia=f'CLAVE-{n}')
+        with mock.patch('inventario.campos.descifrar', wraps=campos.descifrar) as descifrado:
+            licencias = list(Licencia.objects.order_by('nombre'))
+            self.assertTrue(all(licencia.clave_licencia for licencia in licencias))
+            self.assertEqual([str(licencia.clave_licencia) for licencia in licencias], ['********'] * 3)
+            self.assertEqual(descifrado.call_count, 0)
+
+            self.assertEqual(licencias[1].get_license_key(), 'CLAVE-1')
+            self.assertEqual(licencias[1].clave_licencia.texto, 'CLAVE-1')
+            self.assertEqual(descifrado.call_count, 1)
+
+    def test_texto_asignado_se_cifra_al_guardar(self):
+        licencia = Licencia(nombre='Office', clave_licencia='CLAVE-SECRETA')
+        self.assertEqual(str(licencia.clave_licencia), '********')
+        self.assertNotIn('CLAVE-SECRETA', repr(licencia.clave_licencia))
+        licencia.save()
+        token = Licencia.objects.filter(pk=licencia.pk).values_list('clave_licencia', flat=True).get().token
+        self.assertNotIn('CLAVE-SECRETA', token)
+        self.assertEqual(Fernet(CLAVE_ANTERIOR).decrypt(token.encode()), b'CLAVE-SECRETA')
+        # Vacío se guarda como NULL y no se puede descifrar un token ajeno
+        licencia.clave_licencia = ''
+        licencia.save()
+        self.assertIsNone(Licencia.objects.get(pk=licencia.pk).clave_licencia)
+        ajeno = campos.Secreto('licencias', token=Fernet(CLAVE_NUEVA).encrypt(b'x').decode())
+        self.assertIsNone(ajeno.texto_o_none())
+
+
+class MigracionSecretosCompactosTest(TransactionTestCase):
+    """0014 pasa los secretos de ``base64(token)`` al token y vuelve atrás"""
+
+    anterior = [('inventario', '0013_secuencia_codigo')]
+    compacta = [('inventario', '0014_secretos_cifrados_compactos')]
+
+    def _migrar(self, destino):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(destino)
+        return executor.loader.project_state(destino).apps
+
+    def tearDown(self):
+        self._migrar(MigrationExecutor(connection).loader.graph.leaf_nodes())
+        super().tearDown()
+
+    def test_compacta_y_expande(self):
+        apps = self._migrar(self.anterior)
+        Licencia = apps.get_model('inventario', 'Licencia')
+        Cuenta = apps.get_model('inventario', 'Cuenta')
+        tokens = [Fernet(Fernet.generate_key()).encrypt(f'clave {n}'.encode()).decode() for n in range(3)]
+        formato_anterior = [base64.b64encode(token.encode()).decode() for token in tokens]
+        licencias = [
+            Licencia.objects.create(nombre='Con formato anterior', clave_licencia=formato_anterior[0]).pk,
+            # Ya compacta (migración cortada a la mitad) y valor no reconocible: se dejan igual
+            Licencia.objects.create(nombre='Ya compacta', clave_licencia=tokens[1]).pk,
+            Licencia.objects.create(nombre='Texto plano', clave_licencia='no es un token').pk,
+            Licencia.objects.create(nombre='Sin clave', clave_licencia=None).pk,
+        ]
+        cuenta = Cuenta.objects.create(
+            nombre='Correo', email='a@b.com', usuario='a', password=formato_anterior[2]
+        ).pk
+
+        def valores():
+            # Valores crudos, sin pasar por ``CampoCifrado``
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT id, clave_licencia FROM inventario_licencia')
+                filas = dict(cursor.fetchall())
+                cursor.execute('SELECT password FROM inventario_cuenta WHERE id = %s', [cuenta])
+                return [filas[pk] for pk in licencias], cursor.fetchone()[0]
+
+        self._migrar(self.compacta)
+        self.assertEqual(valores(), ([tokens[0], tokens[1], 'no es un token', None], tokens[2]))
+
+        self._migrar(self.anterior)
+        self.assertEqual(
+            valores(), ([formato_anterior[0], formato_anterior[1], 'no es un token', None], formato_anterior[2])
+        )
+
+
+class ApiProductosTest(TestCase):
+    """API de productos con campos a elección y páginas por cursor"""
+
+    def setUp(self):
+        self.client.force_login(Usuario.objects.create_user('tecnico', password='clave'))
+        self.equipos = Categoria.objects.create(nombre='Equipos')
+        otros = Categoria.objects.create(nombre='Otros')
+        precios = [Decimal('19.99'), None, Decimal('0.10'), Decimal('1250.50'), Decimal('3.33'), None, Decimal('7')]
+        # Nombres repetidos: el cursor desempata por id
+        self.productos = [
+            Producto.objects.create(
+                codigo=f'EQ-{n:03d}', nombre=f'Equipo {n % 3}', categoria=self.equipos if n % 2 else otros,
+                cantidad=n, precio_unitario=precio,
+            )
+            for n, precio in enumerate(precios)
+        ]
+
+    def _pedir(self, estado=200, **parametros):
+        respuesta = self.client.get(reverse('inventario:api_productos'), parametros, secure=True)
+        self.assertEqual(respuesta.status_code, estado)
+        return respuesta.json()
+
+    def test_campos_por_defecto_y_proyeccion(self):
+        fila = self._pedir()['productos'][0]
+        self.assertEqual(list(fila), ['id', 'codigo', 'nombre', 'categoria', 'cantidad', 'estado', 'valor_total'])
+        # Los campos del orden se leen para el cursor pero no se envían si no se piden
+        filas = self._pedir(fields='codigo, valor_total,codigo')['productos']
+        self.assertEqual({tuple(fila) for fila in filas}, {('codigo', 'valor_total')})
+
+    def test_campo_desconocido(self):
+        datos = self._pedir(400, fields='codigo,costo')
+        self.assertIn('costo', datos['error'])
+        self.assertIn('valor_total', datos['error'])
+        self._pedir(400, fields=',')
+
+    def test_valor_total_igual_a_la_propiedad_del_modelo(self):
+        filas = self._pedir(fields='id,valor_total,precio_unitario')['productos']
+        valores = {fila['id']: fila['valor_total'] for fila in filas}
+        for producto in self.productos:
+            self.assertEqual(valores[producto.pk], float(producto.valor_total), producto.codigo)
+
+    def test_cursor_recorre_todo_sin_repetir_ni_saltar(self):
+        esperados = list(Producto.objects.order_by('nombre', 'id').values_list('id', flat=True))
+        vistos, paginas, cursor = [], [], None
+        while True:
+            datos = self._pedir(limite=3, fields='id', **({'cursor': cursor} if cursor else {}))
+            paginas.append(datos)
+            vistos += [fila['id'] for fila in datos['productos']]
+            cursor = datos['siguiente']
+            if cursor is None:
+                break
+            if len(paginas) == 1:
+                # Un alta que queda antes del cursor no desplaza las páginas siguientes
+                Producto.objects.create(codigo='EQ-999', nombre='Antena', categoria=self.equipos)
+        self.assertEqual(vistos, esperados)
+        self.assertEqual(len(paginas), 3)
+        self.assertIsNone(paginas[0]['anterior'])
+
+        anterior = self._pedir(limite=3, fields='id', cursor=paginas[-1]['anterior'])
+        self.assertEqual(anterior['productos'], paginas[1]['productos'])
+        self._pedir(400, cursor='no-es-un-cursor')
+
+    def test_filtros_del_listado(self):
+        filas = self._pedir(categoria=self.equipos.pk, fields='codigo')['productos']
+        self.assertEqual(sorted(fila['codigo'] for fila in filas), ['EQ-001', 'EQ-003', 'EQ-005'])
+
+
+class CodigosAutomaticosTest(TestCase):
+    """Asignación de códigos de producto por secuencia"""
+
+    def setUp(self):
+        self.categoria = Categoria.objects.create(nombre='Laptops')
+        Producto.objects.create(codigo='LAP-00007', nombre='Laptop', categoria=self.categoria)
+        Producto.objects.create(codigo='LAP-ALQ-9', nombre='Laptop alquilada', categoria=self.categoria)
+
+    def test_secuencia_continua_desde_codigos_existentes(self):
+        self.assertEqual(siguiente_codigo(self.categoria), 'LAP-00008')
+        # La vista previa no reserva el número
+        self.assertEqual(siguiente_codigo(self.categoria), 'LAP-00008')
+        self.assertEqual(generar_codigo(self.categoria), 'LAP-00008')
+        self.assertEqual(generar_codigo(self.categoria), 'LAP-00009')
+
+    def test_reserva_de_rango(self):
+        self.assertEqual(reservar_codigos(self.categoria, 3), ['LAP-00008', 'LAP-00009', 'LAP-00010'])
+        self.assertEqual(generar_codigo(self.categoria), 'LAP-00011')
+
+    def test_codigos_existentes_se_recorren_una_sola_vez(self):
+        with mock.patch('inventario.codigos._ultimo_existente', wraps=codigos._ultimo_existente) as recorrido:
+            siguiente_codigo(self.categoria)
+            with self.assertNumQueries(1):
+                siguiente_codigo(self.categoria)
+            generar_codigo(self.categoria)
+        self.assertEqual(recorrido.call_count, 1)
+
+    def _crear(self, codigo, nombre='Laptop nueva', **datos):
+        self.client.force_login(Usuario.objects.get_or_create(username='tecnico')[0])
+        self.client.post(reverse('inventario:crear_producto'), {
+            'codigo': codigo, 'nombre': nombre, 'categoria': self.categoria.pk, **datos,
+        }, secure=True)
+        return Producto.objects.get(nombre=nombre).codigo
+
+    def test_vista_previa_sin_cambios_se_asigna_de_la_secuencia(self):
+        sugerido = siguiente_codigo(self.categoria)
+        # Otro usuario guarda antes con el mismo código sugerido
+        self.assertEqual(generar_codigo(self.categoria), sugerido)
+        self.assertEqual(self._crear(sugerido, codigo_sugerido=sugerido), 'LAP-00009')
+
+    def test_codigo_escrito_a_mano_se_respeta_y_adelanta_la_secuencia(self):
+        self.assertEqual(self._crear('LAP-00100'), 'LAP-00100')
+        self.assertEqual(siguiente_codigo(self.categoria), 'LAP-00101')
+        # También si el formulario tenía otra vista previa
+        self.assertEqual(self._crear('LAP-00200', 'Otra laptop', codigo_sugerido='LAP-00101'), 'LAP-00200')
+        self.assertEqual(generar_codigo(self.categoria), 'LAP-00201')
+
+    def test_codigo_manual_no_rebaja_la_secuencia(self):
+        reservar_codigos(self.categoria, 5)
+        Producto.objects.create(codigo='LAP-00003', nombre='Laptop vieja', categoria=self.categoria)
+        self.assertEqual(generar_codigo(self.categoria), 'LAP-00013')
+
+    def test_numero_fuera_de_rango_no_adelanta_la_secuencia(self):
+        otra = Categoria.objects.create(nombre='SN')
+        siguiente_codigo(otra)
+        Producto.objects.create(codigo='SN-123456789012', nombre='Con serie por código', categoria=otra)
+        self.assertEqual(siguiente_codigo(otra), 'SN-00001')
+        # Tampoco cuenta al crear la secuencia de un prefijo nuevo
+        redes = Categoria.objects.create(nombre='Redes')
+        Producto.objects.create(codigo='RED-123456789012', nombre='Switch con serie', categoria=redes)
+        self.assertEqual(generar_codigo(redes), 'RED-00001')
+
+
+@mock.patch('inventario.sincronizacion.MARGEN', timedelta(0))
+class SincronizacionIncrementalTest(TestCase):
+    """Cambios y eliminaciones de productos desde la marca del cliente"""
+
+    def setUp(self):
+        self.client.force_login(Usuario.objects.create_user('tecnico', password='clave'))
+        categoria = Categoria.objects.create(nombre='Equipos')
+        self.productos = [
+            Producto.objects.create(codigo=f'EQ-00{n}', nombre=f'Equipo {n}', categoria=categoria)
+            for n in range(3)
+        ]
+
+    def _sincronizar(self, recurso='productos', **parametros):
+        respuesta = self.client.get(reverse(f'inventario:api_sincronizar_{recurso}'), parametros, secure=True)
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.json()
+
+    def _marca_sin_confirmados(self):
+        """Marca de una respuesta dada ahora, sin ver lo que una transacción abierta no confirmó"""
+        ahora = timezone.now()
+        return codificar_cursor([ahora, None, ahora, None])
+
+    def _movimiento(self, producto, cantidad=1):
+        tipo, _ = TipoMovimiento.objects.get_or_create(nombre='Entrada', es_entrada=True)
+        return Movimiento.objects.create(
+            producto=producto, tipo_movimiento=tipo, cantidad=cantidad,
+            usuario=Usuario.objects.get(username='tecnico'), motivo='Compra',
+        )
+
+    def test_cambios_y_eliminaciones_desde_marca(self):
+        primera = self._sincronizar(limite=2)
+        segunda = self._sincronizar(limite=2, marca=primera['marca'])
+        self.assertTrue(primera['hay_mas'])
+        self.assertFalse(segunda['hay_mas'])
+        self.assertEqual(
+            [fila['id'] for fila in primera['cambios'] + segunda['cambios']],
+            [producto.pk for producto in self.productos],
+        )
+
+        modificado, eliminado, _ = self.productos
+        modificado.cantidad = 9
+        modificado.save()
+        eliminado_id = eliminado.pk
+        eliminado.delete()
+        tercera = self._sincronizar(marca=segunda['marca'])
+        self.assertEqual([(fila['id'], fila['cantidad']) for fila in tercera['cambios']], [(modificado.pk, 9)])
+        self.assertEqual(tercera['eliminados'], [eliminado_id])
+
+        cuarta = self._sincronizar(marca=tercera['marca'])
+        self.assertEqual((cuarta['cambios'], cuarta['eliminados']), ([], []))
+
+    def test_movimientos_nuevos_y_eliminados(self):
+        inicial = self._sincronizar('movimientos')
+        productos = self._sincronizar()
+        movimiento = self._movimiento(self.productos[1], 2)
+        datos = self._sincronizar('movimientos', marca=inicial['marca'], fields='id,producto_id,cantidad_nueva')
+        self.assertEqual(
+            datos['cambios'], [{'id': str(movimiento.pk), 'producto_id': self.productos[1].pk, 'cantidad_nueva': 2}]
+        )
+        # El stock que cambió el movimiento también llega en los productos
+        cambios = self._sincronizar(marca=productos['marca'])['cambios']
+        self.assertEqual([(fila['id'], fila['cantidad']) for fila in cambios], [(self.productos[1].pk, 2)])
+
+        movimiento_id = str(movimiento.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            movimiento.delete()
+        datos = self._sincronizar('movimientos', marca=datos['marca'])
+        self.assertEqual((datos['cambios'], datos['eliminados']), ([], [movimiento_id]))
+
+    def test_importacion_larga_llega_aunque_la_marca_la_haya_pasado(self):
+        archivo = io.BytesIO(b'producto,tipo_movimiento,cantidad\nEQ-000,Entrada,3\nEQ-002,Entrada,1\n')
+        TipoMovimiento.objects.create(nombre='Entrada', es_entrada=True)
+        with self.captureOnCommitCallbacks() as confirmar:
+            importar_movimientos(archivo, 'movimientos.csv', Usuario.objects.get(username='tecnico'), tamano_lote=1)
+            # Un movimiento ajeno del mismo usuario, con la misma fecha que los importados
+            ajeno = self._movimiento(self.productos[1], 5)
+            fecha = Movimiento.objects.exclude(pk=ajeno.pk).values_list('fecha_actualizacion', flat=True)[0]
+            Movimiento.objects.filter(pk=ajeno.pk).update(fecha_actualizacion=fecha)
+        # Un cliente sincroniza mientras la importación sigue abierta: su marca pasa las filas nuevas
+        marca = self._marca_sin_confirmados()
+        self.assertEqual(self._sincronizar('movimientos', marca=marca)['cambios'], [])
+        for callback in confirmar:
+            callback()
+
+        movimientos = self._sincronizar('movimientos', marca=marca, fields='producto_id,cantidad')['cambios']
+        self.assertEqual(
+            sorted((fila['producto_id'], fila['cantidad']) for fila in movimientos),
+            [(self.productos[0].pk, 3), (self.productos[2].pk, 1)],
+        )
+        productos = self._sincronizar(marca=marca, fields='id,cantidad')['cambios']
+        self.assertEqual(
+            sorted((fila['id'], fila['cantidad']) for fila in productos),
+            [(self.productos[0].pk, 3), (self.productos[2].pk, 1)],
+        )
+
+    def test_eliminacion_en_cascada_deja_lapidas(self):
+        movimientos = sorted(str(self._movimiento(producto).pk) for producto in self.productos[:2])
+        productos = [producto.pk for producto in self.productos]
+        with self.captureOnCommitCallbacks() as confirmar:
+            self.productos[0].categoria.delete()
+        marca = self._marca_sin_confirmados()
+        self.assertEqual(self._sincronizar(marca=marca)['eliminados'], [])
+        for callback in confirmar:
+            callback()
+
+        self.assertEqual(sorted(self._sincronizar(marca=marca)['eliminados']), productos)
+        self.assertEqual(sorted(self._sincronizar('movimientos', marca=marca)['eliminados']), movimientos)
+
+    def test_lapidas_de_la_transaccion_se_fechan_juntas(self):
+        for _ in range(20):
+            self._movimiento(self.productos[0])
+        eliminados = [self.productos[0].pk, self.productos[2].pk]
+        # Un savepoint deshecho descarta su callback; lo eliminado después registra otro
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.productos[1].delete()
+            raise RuntimeError
+        with self.captureOnCommitCallbacks() as confirmar:
+            self.productos[0].delete()
+            self.productos[2].delete()
+        marca = self._marca_sin_confirmados()
+        with CaptureQueriesContext(connection) as consultas:
+            for callback in confirmar:
+                callback()
+        sentencias = [c['sql'] for c in consultas.captured_queries if 'inventario_eliminacion' in c['sql']]
+        self.assertEqual([sql.split()[0] for sql in sentencias], ['UPDATE'])
+        self.assertEqual(len(self._sincronizar('movimientos', marca=marca)['eliminados']), 20)
+        self.assertEqual(sorted(self._sincronizar(marca=marca)['eliminados']), eliminados)
+
+    def test_marca_invalida(self):
+        respuesta = self.client.get(reverse('inventario:api_sincronizar_productos'), {'marca': 'xyz'}, secure=True)
+        self.assertEqual(respuesta.status_code, 400)
+
+
+@unittest.skipUnless(
+    connection.features.test_db_allows_multiple_connections,
+    'La base de datos de pruebas no admite conexiones concurrentes'
+)
+class RegistroStockConcurrenteTest(TransactionTestCase):
+    """Movimientos simultáneos sobre el mismo producto no pierden actualizaciones"""
+
+    HILOS = 8
+    MOVIMIENTOS_POR_HILO = 15
+    STOCK_INICIAL = 40
+
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user('tecnico', password='clave')
+        categoria = Categoria.objects.create(nombre='Equipos')
+        self.producto = Producto.objects.create(
+            codigo='EQ-001', nombre='Switch', categoria=categoria, cantidad=self.STOCK_INICIAL
+        )
+        self.entrada = TipoMovimiento.objects.create(nombre='Entrada', es_entrada=True)
+        self.salida = TipoMovimiento.objects.create(nombre='Salida', es_entrada=False)
+
+    def _registrar(self, indice, barrera, errores):
+        try:
+            barrera.wait()
+            for n in range(self.MOVIMIENTOS_POR_HILO):
+                tipo = self.entrada if (indice + n) % 2 else self.salida
+                try:
+                    Movimiento.objects.create(
+                        producto_id=self.producto.pk, tipo_movimiento=tipo, cantidad=1 + n % 3,
+                        usuario=self.usuario, motivo='Prueba de concurrencia'
+                    )
+                except StockInsuficiente:
+                    pass
+        except Exception as e:
+            errores.append(e)
+        finally:
+            connection.close()
+
+    def test_saldo_final_coincide_con_movimientos(self):
+        barrera = threading.Barrier(self.HILOS)
+        errores = []
+        hilos = [
+            threading.Thread(target=self._registrar, args=(indice, barrera, errores))
+            for indice in range(self.HILOS)
+        ]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        self.assertEqual(errores, [])
+
+        movimientos = list(Movimiento.objects.select_related('tipo_movimiento'))
+        self.assertTrue(movimientos)
+        saldo = self.STOCK_INICIAL + sum(diferencia_stock(m) for m in movimientos)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.cantidad, saldo)
+
+        # Cada movimiento vio el stock real: los saldos forman una cadena sin huecos
+        for movimiento in movimientos:
+            self.assertEqual(movimiento.cantidad_nueva - movimiento.cantidad_anterior, diferencia_stock(movimiento))
+            self.assertGreaterEqual(movimiento.cantidad_nueva, 0)
+        anteriores = sorted(m.cantidad_anterior for m in movimientos)
+        nuevos = sorted(m.cantidad_nueva for m in movimientos)
+        self.assertEqual(
+            sorted(anteriores + [self.producto.cantidad]),
+            sorted(nuevos + [self.STOCK_INICIAL]),
+        )
@@ -13,15 +13,21 @@ urlpatterns = [
     
     # Productos
     path('productos/', views.lista_productos, name='lista_productos'),
+    path('productos/exportar/', views.exportar_productos, name='exportar_productos'),
+    path('productos/etiquetas/', views.imprimir_etiquetas, name='imprimir_etiquetas'),
     path('productos/crear/', views.crear_producto, name='crear_producto'),
     path('productos/<int:producto_id>/', views.detalle_producto, name='detalle_producto'),
     path('productos/<int:producto_id>/editar/', views.editar_producto, name='editar_producto'),
     path('productos/<int:producto_id>/eliminar/', views.eliminar_producto, name='eliminar_producto'),
     path('productos/<int:producto_id>/imprimir-etiqueta/', views.imprimir_etiqueta, name='imprimir_etiqueta'),
+    path('productos/<int:producto_id>/etiqueta.zpl', views.etiqueta_zpl_producto, name='etiqueta_zpl_producto'),
+    path('productos/<int:producto_id>/barcode.<str:formato>', views.codigo_barras_producto, name='codigo_barras_producto'),
     
     # Movimientos
     path('movimientos/', views.lista_movimientos, name='lista_movimientos'),
     path('movimientos/crear/', views.crear_movimiento, name='crear_movimiento'),
+    path('movimientos/exportar/', views.exportar_movimientos, name='exportar_movimientos'),
+    path('movimientos/importar/', views.importar_movimientos, name='importar_movimientos'),
     path('movimientos/<uuid:movimiento_id>/', views.detalle_movimiento, name='detalle_movimiento'),
     path('movimientos/<uuid:movimiento_id>/editar/', views.editar_movimiento, name='editar_movimiento'),
     path('movimientos/<uuid:movimiento_id>/eliminar/', views.eliminar_movimiento, name='eliminar_movimiento'),
@@ -65,6 +71,7 @@ urlpatterns = [
     
     # URLs para gestión de licencias
     path('licencias/', views.lista_licencias, name='lista_licencias'),
+    path('licencias/exportar/', views.exportar_licencias, name='exportar_licencias'),
     path('licencias/crear/', views.crear_licencia, name='crear_licencia'),
     path('licencias/<int:licencia_id>/editar/', views.editar_licencia, name='editar_licencia'),
     path('licencias/<int:licencia_id>/eliminar/', views.eliminar_licencia, name='eliminar_licencia'),
@@ -75,7 +82,11 @@ urlpatterns = [
     
     # APIs
     path('api/productos/', views.api_productos, name='api_productos'),
+    path('api/productos/escanear/', views.api_escanear, name='api_escanear'),
     path('api/movimientos/', views.api_movimientos, name='api_movimientos'),
+    path('api/sync/productos/', views.api_sincronizar_productos, name='api_sincronizar_productos'),
+    path('api/sync/movimientos/', views.api_sincronizar_movimientos, name='api_sincronizar_movimientos'),
+    path('api/reportes/estado/', views.api_estado_reportes, name='api_estado_reportes'),
     path('api/generar-codigo/', views.api_generar_codigo, name='api_generar_codigo'),
     path('api/areas-por-sede/', views.api_areas_por_sede, name='api_areas_por_sede'),
     path('api/personal-por-area/', views.api_personal_por_area, name='api_personal_por_area'),
@@ -84,6 +95,7 @@ urlpatterns = [
     
     # URLs para gestión de cuentas
     path('cuentas/', views.lista_cuentas, name='lista_cuentas'),
+    path('cuentas/exportar/', views.exportar_cuentas, name='exportar_cuentas'),
     path('cuentas/crear/', views.crear_cuenta, name='crear_cuenta'),
     path('cuentas/<int:cuenta_id>/', views.detalle_cuenta, name='detalle_cuenta'),
     path('cuentas/<int:cuenta_id>/editar/', views.editar_cuenta, name='editar_cuenta'),
@@ -2,30 +2,24 @@ import os
 import json
 from datetime import datetime, timedelta
 from decimal import Decimal
+from urllib.parse import urlencode
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from django.http import HttpResponse, JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.db.models import Q, Sum, Count, F
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.functional import SimpleLazyObject
+from django.utils.http import quote_etag
 from django.core.paginator import Paginator
 from django.db import models
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth.forms import UserCreationForm
 from django import forms
-import barcode
-from barcode.writer import ImageWriter
-import base64
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.lib import colors
-from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
-from io import BytesIO
-import tempfile
 
 from .models import (
     Usuario, Categoria, Sede, Area, Personal, Producto, 
@@ -36,6 +30,27 @@ from .forms import (
     CategoriaForm, SedeForm, AreaForm, PersonalForm, LicenciaForm, AsignarLicenciaForm, CuentaForm,
     PlanificacionSemanalForm, ConexionWinboxForm
 )
+from .estadisticas import obtener_resumen, productos_por_categoria
+from .cache import consulta_cacheada, contexto_cache
+from .busqueda import buscar_productos
+from .paginacion import CursorInvalido, ORDEN_MOVIMIENTOS, ORDEN_PRODUCTOS, paginar_por_cursor
+from .stock import StockInsuficiente
+from .importacion import COLUMNAS as COLUMNAS_IMPORTACION, ErrorImportacion
+from .importacion import importar_movimientos as importar_movimientos_archivo
+from .exportacion import (
+    COLUMNAS_CUENTAS, COLUMNAS_LICENCIAS, COLUMNAS_MOVIMIENTOS, COLUMNAS_PRODUCTOS, respuesta_xlsx
+)
+from .reportes import eliminar_reporte as eliminar_reporte_archivo, encolar_reporte, reencolar_reporte
+from .descargas import respuesta_archivo
+from .lotes import encolar_lote
+from .api import CAMPOS_PRODUCTOS, CAMPOS_PRODUCTOS_POR_DEFECTO, CamposInvalidos, Proyeccion, campos_pedidos
+from .api import CAMPOS_MOVIMIENTOS, CAMPOS_MOVIMIENTOS_POR_DEFECTO
+from .sincronizacion import MarcaInvalida, MarcaVencida, cambios_desde
+from .codigos import es_vista_previa, generar_codigo, siguiente_codigo
+from .escaneo import buscar_por_lectura
+from .etiquetas import MAX_ETIQUETAS, PLANTILLA_POR_DEFECTO, PLANTILLAS as PLANTILLAS_ETIQUETAS
+from .etiquetas import respuesta_etiquetas, respuesta_zpl
+from .codigos_barras import FORMATO as FORMATO_CODIGO_BARRAS, TIPOS_CONTENIDO, clave_codigo_barras, imagen_codigo_barras
 
 
 def is_admin(user):
@@ -48,6 +63,31 @@ def is_user_or_admin(user):
     return user.is_authenticated
 
 
+def _consulta_sin_paginacion(request):
+    """Querystring actual sin los parámetros de paginación"""
+    consulta = request.GET.copy()
+    consulta.pop('page', None)
+    consulta.pop('cursor', None)
+    return consulta.urlencode()
+
+
+def _pagina_cursor(queryset, orden, cursor, por_pagina):
+    """Página por cursor; un cursor inválido vuelve a la primera página"""
+    try:
+        return paginar_por_cursor(queryset, orden, cursor, por_pagina)
+    except CursorInvalido:
+        return paginar_por_cursor(queryset, orden, None, por_pagina)
+
+
+def _limite_api(request, por_defecto=50, maximo=200):
+    """Tamaño de página pedido a una API, acotado a ``maximo``"""
+    try:
+        limite = int(request.GET.get('limite', por_defecto))
+    except (TypeError, ValueError):
+        limite = por_defecto
+    return max(1, min(limite, maximo))
+
+
 class LoginForm(forms.Form):
     """Formulario de login personalizado"""
     username = forms.CharField(
@@ -100,51 +140,34 @@ def logout_view(request):
 @login_required
 def dashboard(request):
     """Dashboard principal"""
-    # Estadísticas generales
-    total_productos = Producto.objects.count()
-    total_categorias = Categoria.objects.count()
-    total_movimientos = Movimiento.objects.count()
-    total_usuarios = Usuario.objects.count()
+    def calcular_estadisticas():
+        # Estadísticas generales (precalculadas en EstadisticaInventario)
+        resumen = obtener_resumen()
+        return {
+            'total_productos': resumen.total_productos,
+            'total_categorias': Categoria.objects.count(),
+            'total_movimientos': resumen.total_movimientos,
+            'total_usuarios': Usuario.objects.count(),
+            'productos_stock_bajo': resumen.productos_stock_bajo,
+            'valor_total': float(resumen.valor_total),
+            'productos_por_categoria': json.dumps(list(productos_por_categoria())),
+        }
     
-    # Productos con stock bajo (menos de 5 unidades)
-    productos_stock_bajo = Producto.objects.filter(cantidad__lt=5).count()
+    context = dict(consulta_cacheada(
+        'dashboard', (Producto, Movimiento, Categoria, Usuario), calcular_estadisticas
+    ))
     
-    # Movimientos recientes
-    movimientos_recientes = Movimiento.objects.select_related(
+    # Movimientos recientes (la consulta solo se ejecuta si el fragmento no está en caché)
+    context['movimientos_recientes'] = Movimiento.objects.select_related(
         'producto', 'tipo_movimiento', 'usuario'
     ).order_by('-fecha_movimiento')[:10]
-    
-    # Valor total del inventario
-    valor_total = float(sum(
-        (producto.precio_unitario or 0) * (producto.cantidad or 0)
-        for producto in Producto.objects.all()
-    ))
-    
-    # Productos por categoría (para gráfico)
-    productos_por_categoria = Categoria.objects.annotate(
-        total_productos=Count('productos')
-    ).values('nombre', 'total_productos').order_by('nombre')
-    
-    context = {
-        'total_productos': total_productos,
-        'total_categorias': total_categorias,
-        'total_movimientos': total_movimientos,
-        'total_usuarios': total_usuarios,
-        'productos_stock_bajo': productos_stock_bajo,
-        'movimientos_recientes': movimientos_recientes,
-        'valor_total': valor_total,
-        'productos_por_categoria': json.dumps(list(productos_por_categoria)),
-    }
+    context.update(contexto_cache(Movimiento, Producto, TipoMovimiento, Usuario))
     
     return render(request, 'inventario/dashboard.html', context)
 
 
-@login_required
-def lista_productos(request):
-    """Lista de productos con filtros y búsqueda"""
-    productos = Producto.objects.select_related('categoria').all()
-    
-    # Filtros
+def _filtrar_productos(request, productos):
+    """Aplica los filtros del listado de productos; devuelve ``(productos, filtros)``"""
     categoria_id = request.GET.get('categoria')
     estado = request.GET.get('estado')
     tipo_propiedad = request.GET.get('tipo_propiedad')
@@ -160,34 +183,57 @@ def lista_productos(request):
         productos = productos.filter(tipo_propiedad=tipo_propiedad)
     
     if search:
-        productos = productos.filter(
-            Q(nombre__icontains=search) |
-            Q(codigo__icontains=search) |
-            Q(marca__icontains=search) |
-            Q(modelo__icontains=search)
-        )
+        # Búsqueda de texto completo ordenada por relevancia
+        productos = buscar_productos(productos, search)
+    
+    return productos, {
+        'categoria': categoria_id,
+        'estado': estado,
+        'tipo_propiedad': tipo_propiedad,
+        'search': search,
+    }
+
+
+@login_required
+def lista_productos(request):
+    """Lista de productos con filtros y búsqueda"""
+    productos, filtros = _filtrar_productos(request, Producto.objects.select_related('categoria').all())
+    search = filtros['search']
     
-    # Paginación
-    paginator = Paginator(productos, 20)
+    # Paginación (perezosa: solo se consulta si el listado no está en caché).
+    # Por cursor salvo que se pida un número de página o se ordene por relevancia.
     page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    if page_number or search:
+        paginator = Paginator(productos, 20)
+        page_obj = SimpleLazyObject(lambda: paginator.get_page(page_number))
+    else:
+        cursor = request.GET.get('cursor')
+        page_obj = SimpleLazyObject(lambda: _pagina_cursor(productos, ORDEN_PRODUCTOS, cursor, 20))
     
     categorias = Categoria.objects.all()
     
     context = {
         'page_obj': page_obj,
         'categorias': categorias,
-        'filtros': {
-            'categoria': categoria_id,
-            'estado': estado,
-            'tipo_propiedad': tipo_propiedad,
-            'search': search,
-        }
+        'consulta': request.GET.urlencode(),
+        'consulta_cursor': _consulta_sin_paginacion(request),
+        'filtros': filtros,
+        'plantillas_etiquetas': PLANTILLAS_ETIQUETAS,
     }
+    context.update(contexto_cache(Producto, Categoria))
     
     return render(request, 'inventario/lista_productos.html', context)
 
 
+@login_required
+def exportar_productos(request):
+    """Exportar a XLSX los productos del listado con sus filtros"""
+    productos, _ = _filtrar_productos(request, Producto.objects.select_related(
+        'categoria', 'sede', 'area__sede', 'personal_asignado'
+    ).all())
+    return respuesta_xlsx(productos, COLUMNAS_PRODUCTOS, 'Productos', 'Productos')
+
+
 @login_required
 def detalle_producto(request, producto_id):
     """Detalle de un producto específico"""
@@ -196,8 +242,8 @@ def detalle_producto(request, producto_id):
         'tipo_movimiento', 'usuario'
     ).order_by('-fecha_movimiento')[:20]
     
-    # Generar código de barras
-    codigo_barras = generar_codigo_barras(producto.codigo)
+    # El código de barras se sirve aparte para que el navegador lo cachee
+    codigo_barras = url_codigo_barras(producto)
     
     # Calcular estado del alquiler si es un producto alquilado
     estado_alquiler = None
@@ -316,7 +362,10 @@ def crear_producto(request):
                         raise ValueError('Código de alquiler requerido para productos alquilados')
                 else:
                     # Para productos propios, generar código automáticamente
-                    codigo = generar_codigo_producto(categoria)
+                    codigo = generar_codigo(categoria)
+            elif es_vista_previa(categoria, codigo, request.POST.get('codigo_sugerido')):
+                # Código sugerido por el formulario: se asigna recién ahora, de la secuencia
+                codigo = generar_codigo(categoria)
             
             # Obtener objetos relacionados
             sede = None
@@ -437,6 +486,10 @@ def editar_producto(request, producto_id):
             # Obtener objetos relacionados
             categoria = Categoria.objects.get(id=categoria_id)
             
+            # Código sugerido por el formulario: se asigna recién ahora, de la secuencia
+            if codigo != producto.codigo and es_vista_previa(categoria, codigo, request.POST.get('codigo_sugerido')):
+                codigo = generar_codigo(categoria)
+            
             # Validar código único (excluyendo el producto actual)
             if Producto.objects.filter(codigo=codigo).exclude(id=producto.id).exists():
                 messages.error(request, 'El código ya existe en otro producto.')
@@ -453,7 +506,7 @@ def editar_producto(request, producto_id):
                         raise ValueError('Código de alquiler requerido para productos alquilados')
                 else:
                     # Para productos propios, generar código automáticamente
-                    codigo = generar_codigo_producto(categoria)
+                    codigo = generar_codigo(categoria)
             
             # Actualizar el producto
             producto.codigo = codigo
@@ -497,14 +550,8 @@ def editar_producto(request, producto_id):
     return render(request, 'inventario/editar_producto.html', context)
 
 
-@login_required
-def lista_movimientos(request):
-    """Lista de movimientos con filtros"""
-    movimientos = Movimiento.objects.select_related(
-        'producto', 'tipo_movimiento', 'usuario'
-    ).all()
-    
-    # Filtros
+def _filtrar_movimientos(request, movimientos):
+    """Aplica los filtros del listado de movimientos; devuelve ``(movimientos, filtros)``"""
     producto_id = request.GET.get('producto')
     tipo_movimiento_id = request.GET.get('tipo_movimiento')
     fecha_desde = request.GET.get('fecha_desde')
@@ -522,29 +569,53 @@ def lista_movimientos(request):
     if fecha_hasta:
         movimientos = movimientos.filter(fecha_movimiento__date__lte=fecha_hasta)
     
-    # Paginación
-    paginator = Paginator(movimientos, 25)
+    return movimientos, {
+        'producto': producto_id,
+        'tipo_movimiento': tipo_movimiento_id,
+        'fecha_desde': fecha_desde,
+        'fecha_hasta': fecha_hasta,
+    }
+
+
+@login_required
+def lista_movimientos(request):
+    """Lista de movimientos con filtros"""
+    movimientos, filtros = _filtrar_movimientos(request, Movimiento.objects.select_related(
+        'producto', 'tipo_movimiento', 'usuario'
+    ).all())
+    
+    # Paginación: por cursor salvo que se pida un número de página
     page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    if page_number:
+        paginator = Paginator(movimientos, 25)
+        page_obj = paginator.get_page(page_number)
+    else:
+        page_obj = _pagina_cursor(movimientos, ORDEN_MOVIMIENTOS, request.GET.get('cursor'), 25)
     
     productos = Producto.objects.all()
     tipos_movimiento = TipoMovimiento.objects.all()
     
     context = {
         'page_obj': page_obj,
+        'consulta_cursor': _consulta_sin_paginacion(request),
         'productos': productos,
         'tipos_movimiento': tipos_movimiento,
-        'filtros': {
-            'producto': producto_id,
-            'tipo_movimiento': tipo_movimiento_id,
-            'fecha_desde': fecha_desde,
-            'fecha_hasta': fecha_hasta,
-        }
+        'filtros': filtros,
     }
     
     return render(request, 'inventario/lista_movimientos.html', context)
 
 
+@login_required
+def exportar_movimientos(request):
+    """Exportar a XLSX los movimientos del listado con sus filtros"""
+    movimientos, _ = _filtrar_movimientos(request, Movimiento.objects.select_related(
+        'producto', 'tipo_movimiento', 'usuario',
+        'sede_origen', 'area_origen__sede', 'sede_destino', 'area_destino__sede'
+    ).all())
+    return respuesta_xlsx(movimientos, COLUMNAS_MOVIMIENTOS, 'Movimientos', 'Movimientos')
+
+
 @login_required
 def crear_movimiento(request):
     """Crear nuevo movimiento"""
@@ -591,20 +662,11 @@ def crear_movimiento(request):
             if personal_destino_id:
                 personal_destino = Personal.objects.get(id=personal_destino_id)
             
-            # Calcular cantidades
-            cantidad_anterior = producto.cantidad
-            if tipo_movimiento.es_entrada:
-                cantidad_nueva = cantidad_anterior + cantidad
-            else:
-                cantidad_nueva = cantidad_anterior - cantidad
-            
-            # Crear el movimiento
+            # Crear el movimiento (actualiza el stock del producto en la misma transacción)
             movimiento = Movimiento.objects.create(
                 producto=producto,
                 tipo_movimiento=tipo_movimiento,
                 cantidad=cantidad,
-                cantidad_anterior=cantidad_anterior,
-                cantidad_nueva=cantidad_nueva,
                 usuario=request.user,
                 motivo=motivo,
                 referencia=referencia,
@@ -616,17 +678,15 @@ def crear_movimiento(request):
                 personal_destino=personal_destino
             )
             
-            # Actualizar cantidad del producto
-            producto.cantidad = cantidad_nueva
-            producto.save()
-            
-            messages.success(request, f'Movimiento registrado exitosamente. Stock actual: {producto.cantidad}')
+            messages.success(request, f'Movimiento registrado exitosamente. Stock actual: {movimiento.cantidad_nueva}')
             return redirect('inventario:lista_movimientos')
             
         except Producto.DoesNotExist:
             messages.error(request, 'Producto no encontrado')
         except TipoMovimiento.DoesNotExist:
             messages.error(request, 'Tipo de movimiento no encontrado')
+        except StockInsuficiente as e:
+            messages.error(request, str(e))
         except Sede.DoesNotExist:
             messages.error(request, 'Sede no encontrada')
         except Area.DoesNotExist:
@@ -653,6 +713,43 @@ def crear_movimiento(request):
     return render(request, 'inventario/crear_movimiento.html', context)
 
 
+@login_required
+def importar_movimientos(request):
+    """Importación masiva de movimientos desde CSV o XLSX"""
+    resultado = None
+    if request.method == 'POST':
+        archivo = request.FILES.get('archivo')
+        simular = bool(request.POST.get('simular'))
+        if not archivo:
+            messages.error(request, 'Seleccione un archivo CSV o XLSX')
+        else:
+            try:
+                resultado = importar_movimientos_archivo(archivo, archivo.name, request.user, simular=simular)
+            except ErrorImportacion as e:
+                messages.error(request, str(e))
+            else:
+                if simular:
+                    messages.info(
+                        request,
+                        f'Simulación: se crearían {resultado.creados} movimientos '
+                        f'({resultado.omitidas} filas con errores).'
+                    )
+                elif resultado.creados:
+                    messages.success(
+                        request,
+                        f'Se importaron {resultado.creados} movimientos en '
+                        f'{resultado.productos_actualizados} productos.'
+                    )
+                if resultado.errores:
+                    messages.warning(request, f'{resultado.omitidas} filas no se importaron, revise el detalle.')
+    
+    context = {
+        'resultado': resultado,
+        'columnas': COLUMNAS_IMPORTACION,
+    }
+    return render(request, 'inventario/importar_movimientos.html', context)
+
+
 @login_required
 def reportes(request):
     """Página de reportes"""
@@ -664,12 +761,13 @@ def reportes(request):
     tipos_movimiento = TipoMovimiento.objects.all()
     
     # Estadísticas para las tarjetas
-    total_productos = Producto.objects.count()
-    valor_total = sum(p.valor_total for p in Producto.objects.all())
+    resumen = obtener_resumen()
+    total_productos = resumen.total_productos
+    valor_total = resumen.valor_total
     movimientos_hoy = Movimiento.objects.filter(
         fecha_movimiento__date=timezone.now().date()
     ).count()
-    stock_bajo = Producto.objects.filter(cantidad__lt=5).count()
+    stock_bajo = resumen.productos_stock_bajo
     
     if request.method == 'POST':
         tipo_reporte = request.POST.get('tipo_reporte')
@@ -680,6 +778,8 @@ def reportes(request):
             return generar_reporte_movimientos(request)
         elif tipo_reporte == 'categoria':
             return generar_reporte_categoria(request)
+        elif tipo_reporte == 'lote' and request.user.is_staff:
+            return generar_lote_reportes(request)
     
     context = {
         'reportes_recientes': reportes_recientes,
@@ -694,473 +794,94 @@ def reportes(request):
     return render(request, 'inventario/reportes.html', context)
 
 
-def crear_pdf_inventario(productos, filtros=None):
-    """Crear PDF del reporte de inventario"""
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
-    story = []
-    
-    # Estilos
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=16,
-        spaceAfter=30,
-        alignment=TA_CENTER
-    )
-    
-    # Título
-    story.append(Paragraph("REPORTE DE INVENTARIO", title_style))
-    story.append(Spacer(1, 20))
-    
-    # Información del reporte
-    if filtros:
-        info_text = f"<b>Fecha de generación:</b> {timezone.now().strftime('%d/%m/%Y %H:%M')}<br/>"
-        if filtros.get('categoria'):
-            categoria = Categoria.objects.get(id=filtros['categoria'])
-            info_text += f"<b>Categoría:</b> {categoria.nombre}<br/>"
-        if filtros.get('estado'):
-            info_text += f"<b>Estado:</b> {filtros['estado']}<br/>"
-        story.append(Paragraph(info_text, styles['Normal']))
-        story.append(Spacer(1, 20))
-    
-    # Tabla de productos
-    data = [['Código', 'Nombre', 'Categoría', 'Cantidad', 'Precio Unit.', 'Valor Total', 'Estado']]
-    
-    valor_total_inventario = 0
-    for producto in productos:
-        valor_producto = (producto.precio_unitario or 0) * (producto.cantidad or 0)
-        valor_total_inventario += valor_producto
-        
-        data.append([
-            producto.codigo,
-            producto.nombre,
-            producto.categoria.nombre,
-            str(producto.cantidad),
-            f"${producto.precio_unitario or 0:,.2f}",
-            f"${valor_producto:,.2f}",
-            producto.get_estado_display()
-        ])
-    
-    # Agregar total
-    data.append(['', '', '<b>TOTAL</b>', '', '', f'<b>${valor_total_inventario:,.2f}</b>', ''])
-    
-    table = Table(data, colWidths=[1*inch, 2*inch, 1.5*inch, 0.8*inch, 1*inch, 1.2*inch, 1*inch])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
-        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('FONTSIZE', (0, 1), (-1, -1), 8),
-    ]))
-    
-    story.append(table)
-    story.append(Spacer(1, 20))
-    
-    # Resumen
-    resumen_text = f"""
-    <b>Resumen del Reporte:</b><br/>
-    • Total de productos: {productos.count()}<br/>
-    • Valor total del inventario: ${valor_total_inventario:,.2f}<br/>
-    • Productos con stock bajo: {productos.filter(cantidad__lt=5).count()}<br/>
-    """
-    story.append(Paragraph(resumen_text, styles['Normal']))
-    
-    doc.build(story)
-    buffer.seek(0)
-    return buffer
-
-
-def crear_pdf_movimientos(movimientos, filtros=None):
-    """Crear PDF del reporte de movimientos"""
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
-    story = []
-    
-    # Estilos
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=16,
-        spaceAfter=30,
-        alignment=TA_CENTER
-    )
-    
-    # Título
-    story.append(Paragraph("REPORTE DE MOVIMIENTOS", title_style))
-    story.append(Spacer(1, 20))
-    
-    # Información del reporte
-    if filtros:
-        info_text = f"<b>Fecha de generación:</b> {timezone.now().strftime('%d/%m/%Y %H:%M')}<br/>"
-        if filtros.get('fecha_desde'):
-            info_text += f"<b>Desde:</b> {filtros['fecha_desde']}<br/>"
-        if filtros.get('fecha_hasta'):
-            info_text += f"<b>Hasta:</b> {filtros['fecha_hasta']}<br/>"
-        if filtros.get('tipo_movimiento'):
-            tipo = TipoMovimiento.objects.get(id=filtros['tipo_movimiento'])
-            info_text += f"<b>Tipo de movimiento:</b> {tipo.nombre}<br/>"
-        story.append(Paragraph(info_text, styles['Normal']))
-        story.append(Spacer(1, 20))
-    
-    # Tabla de movimientos
-    data = [['Fecha', 'Producto', 'Tipo', 'Cantidad', 'Usuario', 'Motivo']]
-    
-    for movimiento in movimientos:
-        data.append([
-            movimiento.fecha_movimiento.strftime('%d/%m/%Y %H:%M'),
-            movimiento.producto.nombre,
-            movimiento.tipo_movimiento.nombre,
-            str(movimiento.cantidad),
-            movimiento.usuario.get_full_name(),
-            movimiento.motivo[:50] + '...' if len(movimiento.motivo) > 50 else movimiento.motivo
-        ])
-    
-    table = Table(data, colWidths=[1.2*inch, 2*inch, 1*inch, 0.8*inch, 1.5*inch, 2*inch])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('FONTSIZE', (0, 1), (-1, -1), 8),
-    ]))
-    
-    story.append(table)
-    story.append(Spacer(1, 20))
-    
-    # Resumen
-    resumen_text = f"""
-    <b>Resumen del Reporte:</b><br/>
-    • Total de movimientos: {movimientos.count()}<br/>
-    • Entradas: {movimientos.filter(tipo_movimiento__es_entrada=True).count()}<br/>
-    • Salidas: {movimientos.filter(tipo_movimiento__es_entrada=False).count()}<br/>
-    """
-    story.append(Paragraph(resumen_text, styles['Normal']))
-    
-    doc.build(story)
-    buffer.seek(0)
-    return buffer
-
-
-def crear_pdf_categoria(productos, filtros=None):
-    """Crear PDF del reporte por categoría"""
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
-    story = []
-    
-    # Estilos
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=16,
-        spaceAfter=30,
-        alignment=TA_CENTER
-    )
-    
-    # Título
-    story.append(Paragraph("REPORTE POR CATEGORÍA", title_style))
-    story.append(Spacer(1, 20))
-    
-    # Información del reporte
-    if filtros:
-        info_text = f"<b>Fecha de generación:</b> {timezone.now().strftime('%d/%m/%Y %H:%M')}<br/>"
-        if filtros.get('categoria'):
-            categoria = Categoria.objects.get(id=filtros['categoria'])
-            info_text += f"<b>Categoría:</b> {categoria.nombre}<br/>"
-        if filtros.get('orden'):
-            orden_text = {
-                'mayor_menor': 'Cantidad (Mayor a Menor)',
-                'menor_mayor': 'Cantidad (Menor a Mayor)',
-                'valor': 'Valor (Mayor a Menor)'
-            }.get(filtros['orden'], filtros['orden'])
-            info_text += f"<b>Orden:</b> {orden_text}<br/>"
-        story.append(Paragraph(info_text, styles['Normal']))
-        story.append(Spacer(1, 20))
-    
-    # Tabla de productos
-    data = [['Código', 'Nombre', 'Categoría', 'Cantidad', 'Precio Unit.', 'Valor Total']]
-    
-    valor_total = 0
-    for producto in productos:
-        valor_producto = (producto.precio_unitario or 0) * (producto.cantidad or 0)
-        valor_total += valor_producto
-        
-        data.append([
-            producto.codigo,
-            producto.nombre,
-            producto.categoria.nombre,
-            str(producto.cantidad),
-            f"${producto.precio_unitario or 0:,.2f}",
-            f"${valor_producto:,.2f}"
-        ])
-    
-    # Agregar total
-    data.append(['', '', '<b>TOTAL</b>', '', '', f'<b>${valor_total:,.2f}</b>'])
-    
-    table = Table(data, colWidths=[1*inch, 2*inch, 1.5*inch, 0.8*inch, 1*inch, 1.2*inch])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
-        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('FONTSIZE', (0, 1), (-1, -1), 8),
-    ]))
-    
-    story.append(table)
-    story.append(Spacer(1, 20))
-    
-    # Resumen
-    resumen_text = f"""
-    <b>Resumen del Reporte:</b><br/>
-    • Total de productos: {productos.count()}<br/>
-    • Valor total: ${valor_total:,.2f}<br/>
-    """
-    story.append(Paragraph(resumen_text, styles['Normal']))
-    
-    doc.build(story)
-    buffer.seek(0)
-    return buffer
-
-
 def generar_reporte_inventario(request):
-    """Generar reporte de inventario"""
-    try:
-        # Obtener filtros
-        categoria_id = request.POST.get('categoria')
-        estado = request.POST.get('estado')
-        
-        # Filtrar productos
-        productos = Producto.objects.select_related('categoria').all()
-        
-        if categoria_id:
-            productos = productos.filter(categoria_id=categoria_id)
-        
-        if estado and estado != 'todos':
-            productos = productos.filter(estado=estado)
-        
-        # Crear PDF
-        filtros = {
-            'categoria': categoria_id,
-            'estado': estado
-        }
-        pdf_buffer = crear_pdf_inventario(productos, filtros)
-        
-        # Crear reporte en la base de datos
-        nombre_reporte = f"Reporte_Inventario_{timezone.now().strftime('%Y-%m-%d_%H-%M')}"
-        
-        # Guardar archivo PDF
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-            tmp_file.write(pdf_buffer.getvalue())
-            tmp_file_path = tmp_file.name
-        
-        # Crear objeto Reporte
-        valor_total = float(sum((p.precio_unitario or 0) * (p.cantidad or 0) for p in productos))
-        reporte = Reporte.objects.create(
-            nombre=nombre_reporte,
-            tipo='inventario',
-            usuario=request.user,
-            parametros={
-                'categoria_id': categoria_id,
-                'estado': estado,
-                'total_productos': productos.count(),
-                'valor_total': valor_total
-            }
-        )
-        
-        # Guardar archivo en el modelo
-        with open(tmp_file_path, 'rb') as f:
-            reporte.archivo.save(f'{nombre_reporte}.pdf', f, save=True)
-        
-        # Limpiar archivo temporal
-        os.unlink(tmp_file_path)
-        
-        messages.success(request, f'Reporte "{nombre_reporte}" generado exitosamente')
-        
-    except Exception as e:
-        messages.error(request, f'Error al generar el reporte: {str(e)}')
-    
-    return redirect('inventario:reportes')
+    """Encolar reporte de inventario"""
+    return _encolar_desde_formulario(request, 'inventario', {
+        'categoria_id': request.POST.get('categoria'),
+        'estado': request.POST.get('estado'),
+    })
 
 
 def generar_reporte_movimientos(request):
-    """Generar reporte de movimientos"""
+    """Encolar reporte de movimientos"""
+    return _encolar_desde_formulario(request, 'movimientos', {
+        'fecha_desde': request.POST.get('fecha_desde'),
+        'fecha_hasta': request.POST.get('fecha_hasta'),
+        'tipo_movimiento_id': request.POST.get('tipo_movimiento'),
+    })
+
+
+def generar_reporte_categoria(request):
+    """Encolar reporte por categoría"""
+    return _encolar_desde_formulario(request, 'categoria', {
+        'categoria_id': request.POST.get('categoria'),
+        'orden': request.POST.get('orden', 'mayor_menor'),
+    })
+
+
+def generar_lote_reportes(request):
+    """Encolar un reporte de cada tipo por sede (los genera el worker en paralelo)"""
     try:
-        # Obtener filtros
-        fecha_desde = request.POST.get('fecha_desde')
-        fecha_hasta = request.POST.get('fecha_hasta')
-        tipo_movimiento_id = request.POST.get('tipo_movimiento')
-        
-        # Filtrar movimientos
-        movimientos = Movimiento.objects.select_related(
-            'producto', 'tipo_movimiento', 'usuario'
-        ).all()
-        
-        if fecha_desde:
-            movimientos = movimientos.filter(fecha_movimiento__date__gte=fecha_desde)
-        
-        if fecha_hasta:
-            movimientos = movimientos.filter(fecha_movimiento__date__lte=fecha_hasta)
-        
-        if tipo_movimiento_id and tipo_movimiento_id != 'todos':
-            movimientos = movimientos.filter(tipo_movimiento_id=tipo_movimiento_id)
-        
-        # Crear PDF
-        filtros = {
-            'fecha_desde': fecha_desde,
-            'fecha_hasta': fecha_hasta,
-            'tipo_movimiento': tipo_movimiento_id
-        }
-        pdf_buffer = crear_pdf_movimientos(movimientos, filtros)
-        
-        # Crear reporte en la base de datos
-        nombre_reporte = f"Reporte_Movimientos_{timezone.now().strftime('%Y-%m-%d_%H-%M')}"
-        
-        # Guardar archivo PDF
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-            tmp_file.write(pdf_buffer.getvalue())
-            tmp_file_path = tmp_file.name
-        
-        # Crear objeto Reporte
-        reporte = Reporte.objects.create(
-            nombre=nombre_reporte,
-            tipo='movimientos',
-            usuario=request.user,
-            parametros={
-                'fecha_desde': fecha_desde,
-                'fecha_hasta': fecha_hasta,
-                'tipo_movimiento_id': tipo_movimiento_id,
-                'total_movimientos': movimientos.count()
-            }
-        )
-        
-        # Guardar archivo en el modelo
-        with open(tmp_file_path, 'rb') as f:
-            reporte.archivo.save(f'{nombre_reporte}.pdf', f, save=True)
-        
-        # Limpiar archivo temporal
-        os.unlink(tmp_file_path)
-        
-        messages.success(request, f'Reporte "{nombre_reporte}" generado exitosamente')
-        
+        reportes = encolar_lote(request.user, parametros={
+            'fecha_desde': request.POST.get('fecha_desde'),
+            'fecha_hasta': request.POST.get('fecha_hasta'),
+        })
+        messages.success(request, f'{len(reportes)} reportes del lote en cola.')
     except Exception as e:
-        messages.error(request, f'Error al generar el reporte: {str(e)}')
+        messages.error(request, f'Error al generar el lote de reportes: {str(e)}')
     
     return redirect('inventario:reportes')
 
 
-def generar_reporte_categoria(request):
-    """Generar reporte por categoría"""
+def _encolar_desde_formulario(request, tipo, parametros):
+    """Deja el reporte en la cola y vuelve a la página de reportes"""
     try:
-        # Obtener filtros
-        categoria_id = request.POST.get('categoria')
-        orden = request.POST.get('orden', 'mayor_menor')
-        
-        # Filtrar productos
-        productos = Producto.objects.select_related('categoria').all()
-        
-        if categoria_id and categoria_id != 'todos':
-            productos = productos.filter(categoria_id=categoria_id)
-        
-        # Ordenar productos
-        if orden == 'mayor_menor':
-            productos = productos.order_by('-cantidad')
-        elif orden == 'menor_mayor':
-            productos = productos.order_by('cantidad')
-        elif orden == 'valor':
-            productos = productos.order_by('-precio_unitario')
-        
-        # Crear PDF
-        filtros = {
-            'categoria': categoria_id,
-            'orden': orden
-        }
-        pdf_buffer = crear_pdf_categoria(productos, filtros)
-        
-        # Crear reporte en la base de datos
-        nombre_reporte = f"Reporte_Categoria_{timezone.now().strftime('%Y-%m-%d_%H-%M')}"
-        
-        # Guardar archivo PDF
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-            tmp_file.write(pdf_buffer.getvalue())
-            tmp_file_path = tmp_file.name
-        
-        # Crear objeto Reporte
-        valor_total = float(sum((p.precio_unitario or 0) * (p.cantidad or 0) for p in productos))
-        reporte = Reporte.objects.create(
-            nombre=nombre_reporte,
-            tipo='categoria',
-            usuario=request.user,
-            parametros={
-                'categoria_id': categoria_id,
-                'orden': orden,
-                'total_productos': productos.count(),
-                'valor_total': valor_total
-            }
-        )
-        
-        # Guardar archivo en el modelo
-        with open(tmp_file_path, 'rb') as f:
-            reporte.archivo.save(f'{nombre_reporte}.pdf', f, save=True)
-        
-        # Limpiar archivo temporal
-        os.unlink(tmp_file_path)
-        
-        messages.success(request, f'Reporte "{nombre_reporte}" generado exitosamente')
-        
+        reporte = encolar_reporte(tipo, request.user, parametros)
+        if reporte.estado == 'completado':
+            messages.success(request, f'Reporte "{reporte.nombre}" listo: los datos no cambiaron desde el último generado.')
+        else:
+            messages.success(request, f'Reporte "{reporte.nombre}" en cola. Estará disponible en unos instantes.')
     except Exception as e:
         messages.error(request, f'Error al generar el reporte: {str(e)}')
     
     return redirect('inventario:reportes')
 
 
+@login_required
+def api_estado_reportes(request):
+    """Estado y progreso de los reportes indicados en ``ids``"""
+    ids = [valor for valor in request.GET.get('ids', '').split(',') if valor.isdigit()]
+    reportes = Reporte.objects.filter(id__in=ids[:50])
+    data = [{
+        'id': reporte.id,
+        'estado': reporte.estado,
+        'estado_display': reporte.get_estado_display(),
+        'progreso': reporte.progreso,
+        'error': reporte.error,
+    } for reporte in reportes]
+    return JsonResponse({'reportes': data})
+
+
 @login_required
 def descargar_reporte(request, reporte_id):
     """Descargar reporte generado"""
     try:
         reporte = Reporte.objects.get(id=reporte_id)
         
-        if reporte.archivo:
-            # Si existe el archivo PDF, devolverlo
-            response = HttpResponse(reporte.archivo.read(), content_type='application/pdf')
-            response['Content-Disposition'] = f'attachment; filename="{reporte.nombre}.pdf"'
-            return response
-        else:
-            # Si no existe el archivo, generar uno básico
-            messages.warning(request, 'Archivo PDF no encontrado, generando reporte básico...')
-            
-            # Generar PDF básico según el tipo
-            if reporte.tipo == 'inventario':
-                productos = Producto.objects.select_related('categoria').all()
-                pdf_buffer = crear_pdf_inventario(productos, reporte.parametros)
-            elif reporte.tipo == 'movimientos':
-                movimientos = Movimiento.objects.select_related('producto', 'tipo_movimiento', 'usuario').all()
-                pdf_buffer = crear_pdf_movimientos(movimientos, reporte.parametros)
-            elif reporte.tipo == 'categoria':
-                productos = Producto.objects.select_related('categoria').all()
-                pdf_buffer = crear_pdf_categoria(productos, reporte.parametros)
-            else:
-                messages.error(request, 'Tipo de reporte no válido')
-                return redirect('inventario:reportes')
-            
-            response = HttpResponse(pdf_buffer.getvalue(), content_type='application/pdf')
-            response['Content-Disposition'] = f'attachment; filename="{reporte.nombre}.pdf"'
-            return response
+        if reporte.en_proceso:
+            messages.info(request, f'El reporte "{reporte.nombre}" todavía se está generando.')
+            return redirect('inventario:reportes')
+        
+        if reporte.archivo and reporte.archivo.storage.exists(reporte.archivo.name):
+            return respuesta_archivo(
+                request, reporte.archivo, f'{reporte.nombre}.pdf', 'application/pdf',
+                reporte.fecha_finalizacion or reporte.fecha_generacion,
+            )
+        
+        # Si no existe el archivo se vuelve a generar en segundo plano
+        reencolar_reporte(reporte)
+        messages.warning(request, f'Archivo del reporte "{reporte.nombre}" no encontrado, se volvió a poner en cola.')
+        return redirect('inventario:reportes')
         
     except Reporte.DoesNotExist:
         messages.error(request, 'Reporte no encontrado')
@@ -1176,7 +897,7 @@ def eliminar_reporte(request, reporte_id):
     try:
         reporte = Reporte.objects.get(id=reporte_id)
         nombre = reporte.nombre
-        reporte.delete()
+        eliminar_reporte_archivo(reporte)
         messages.success(request, f'Reporte "{nombre}" eliminado exitosamente')
         
     except Reporte.DoesNotExist:
@@ -1408,27 +1129,89 @@ def configuracion_sistema(request):
 @login_required
 @csrf_exempt
 def api_productos(request):
-    """API para obtener productos"""
+    """
+    API de productos paginada por cursor. Acepta los filtros del listado,
+    ``fields`` (campos separados por comas), ``limite`` y ``cursor``.
+    """
     if request.method == 'GET':
-        productos = Producto.objects.select_related('categoria').all()
-        data = []
-        
-        for producto in productos:
-            data.append({
-                'id': producto.id,
-                'codigo': producto.codigo,
-                'nombre': producto.nombre,
-                'categoria': producto.categoria.nombre,
-                'cantidad': producto.cantidad,
-                'estado': producto.estado,
-                'valor_total': float(producto.valor_total),
-            })
+        try:
+            campos = campos_pedidos(request.GET.get('fields'), CAMPOS_PRODUCTOS, CAMPOS_PRODUCTOS_POR_DEFECTO)
+        except CamposInvalidos as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        
+        productos, _ = _filtrar_productos(request, Producto.objects.all())
+        # Los campos del orden se leen siempre porque forman el cursor
+        adicionales = [campo.lstrip('-') for campo in ORDEN_PRODUCTOS]
+        proyeccion = Proyeccion(CAMPOS_PRODUCTOS, campos, adicionales)
+        try:
+            pagina = paginar_por_cursor(
+                proyeccion.aplicar(productos), ORDEN_PRODUCTOS, request.GET.get('cursor'), _limite_api(request)
+            )
+        except CursorInvalido as e:
+            return JsonResponse({'error': str(e)}, status=400)
         
-        return JsonResponse({'productos': data})
+        return JsonResponse({
+            'productos': [proyeccion.fila(valores) for valores in pagina],
+            'siguiente': pagina.cursor_siguiente,
+            'anterior': pagina.cursor_anterior,
+        })
     
     return JsonResponse({'error': 'Método no permitido'}, status=405)
 
 
+def _respuesta_sincronizacion(request, queryset, disponibles, por_defecto):
+    """Cambios y eliminaciones desde la ``marca`` recibida, con ``fields`` y ``limite``"""
+    try:
+        campos = campos_pedidos(request.GET.get('fields'), disponibles, por_defecto)
+    except CamposInvalidos as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    # El orden de la sincronización se lee siempre porque forma la marca
+    proyeccion = Proyeccion(disponibles, campos, ['fecha_actualizacion', 'id'])
+    try:
+        cambios, eliminados, marca, hay_mas = cambios_desde(
+            queryset, proyeccion, request.GET.get('marca'), _limite_api(request, 200, 1000)
+        )
+    except MarcaVencida as e:
+        return JsonResponse({'error': str(e)}, status=410)
+    except MarcaInvalida as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    return JsonResponse({'cambios': cambios, 'eliminados': eliminados, 'marca': marca, 'hay_mas': hay_mas})
+
+
+@login_required
+def api_sincronizar_productos(request):
+    """Productos creados, modificados o eliminados desde la ``marca`` del cliente"""
+    return _respuesta_sincronizacion(
+        request, Producto.objects.all(), CAMPOS_PRODUCTOS, CAMPOS_PRODUCTOS_POR_DEFECTO
+    )
+
+
+@login_required
+def api_sincronizar_movimientos(request):
+    """Movimientos creados, modificados o eliminados desde la ``marca`` del cliente"""
+    return _respuesta_sincronizacion(
+        request, Movimiento.objects.all(), CAMPOS_MOVIMIENTOS, CAMPOS_MOVIMIENTOS_POR_DEFECTO
+    )
+
+
+@login_required
+def api_escanear(request):
+    """Producto cuyo código o serie coincide exactamente con el valor leído por el escáner"""
+    valor = request.GET.get('codigo', '')
+    if not valor.strip():
+        return JsonResponse({'error': 'Debe indicar el código leído'}, status=400)
+    
+    campo, productos = buscar_por_lectura(valor)
+    if not productos:
+        return JsonResponse({'error': 'Producto no encontrado'}, status=404)
+    if len(productos) > 1:
+        # Serie compartida por varios productos: el cliente debe elegir
+        return JsonResponse({'coincidencia': campo, 'productos': productos}, status=409)
+    return JsonResponse({'coincidencia': campo, 'producto': productos[0]})
+
+
 @login_required
 @csrf_exempt
 def api_movimientos(request):
@@ -1436,7 +1219,20 @@ def api_movimientos(request):
     if request.method == 'GET':
         movimientos = Movimiento.objects.select_related(
             'producto', 'tipo_movimiento', 'usuario'
-        ).order_by('-fecha_movimiento')[:50]
+        )
+        
+        # Con ``cursor`` o ``limite`` se devuelve una página por cursor
+        pagina = None
+        if 'cursor' in request.GET or 'limite' in request.GET:
+            try:
+                pagina = paginar_por_cursor(
+                    movimientos, ORDEN_MOVIMIENTOS, request.GET.get('cursor'), _limite_api(request)
+                )
+            except CursorInvalido as e:
+                return JsonResponse({'error': str(e)}, status=400)
+            movimientos = pagina
+        else:
+            movimientos = movimientos.order_by('-fecha_movimiento')[:50]
         
         data = []
         for movimiento in movimientos:
@@ -1450,6 +1246,12 @@ def api_movimientos(request):
                 'motivo': movimiento.motivo,
             })
         
+        if pagina is not None:
+            return JsonResponse({
+                'movimientos': data,
+                'siguiente': pagina.cursor_siguiente,
+                'anterior': pagina.cursor_anterior,
+            })
         return JsonResponse({'movimientos': data})
     
     return JsonResponse({'error': 'Método no permitido'}, status=405)
@@ -1460,7 +1262,8 @@ def api_movimientos(request):
 def lista_categorias(request):
     categorias = Categoria.objects.all().order_by('nombre')
     return render(request, 'inventario/lista_categorias.html', {
-        'categorias': categorias
+        'categorias': categorias,
+        **contexto_cache(Categoria, Producto),
     })
 
 @login_required
@@ -1526,7 +1329,8 @@ def eliminar_categoria(request, categoria_id):
 def lista_sedes(request):
     sedes = Sede.objects.all().order_by('nombre')
     return render(request, 'inventario/lista_sedes.html', {
-        'sedes': sedes
+        'sedes': sedes,
+        **contexto_cache(Sede, Area),
     })
 
 @login_required
@@ -1592,7 +1396,8 @@ def eliminar_sede(request, sede_id):
 def lista_areas(request):
     areas = Area.objects.select_related('sede').all().order_by('sede', 'nombre')
     return render(request, 'inventario/lista_areas.html', {
-        'areas': areas
+        'areas': areas,
+        **contexto_cache(Area, Sede, Personal),
     })
 
 @login_required
@@ -1662,7 +1467,8 @@ def eliminar_area(request, area_id):
 def lista_personal(request):
     personal = Personal.objects.select_related('area', 'area__sede').all().order_by('apellido', 'nombre')
     return render(request, 'inventario/lista_personal.html', {
-        'personal': personal
+        'personal': personal,
+        **contexto_cache(Personal, Area, Sede),
     })
 
 @login_required
@@ -1734,9 +1540,19 @@ def lista_licencias(request):
     licencias = Licencia.objects.all().order_by('nombre')
     return render(request, 'inventario/lista_licencias.html', {
         'licencias': licencias,
-        'today': date.today()
+        'today': date.today(),
+        **contexto_cache(Licencia),
     })
 
+
+@login_required
+@user_passes_test(lambda u: u.is_staff)
+def exportar_licencias(request):
+    """Exportar a XLSX el listado de licencias"""
+    licencias = Licencia.objects.all().order_by('nombre')
+    return respuesta_xlsx(licencias, COLUMNAS_LICENCIAS, 'Licencias', 'Licencias')
+
+
 @login_required
 @user_passes_test(lambda u: u.is_staff)
 def crear_licencia(request):
@@ -1789,53 +1605,42 @@ def eliminar_licencia(request, licencia_id):
     return redirect('inventario:lista_licencias')
 
 
-def generar_codigo_producto(categoria):
-    """Genera un código único para un producto basado en su categoría"""
-    # Obtener el último producto de esta categoría
-    ultimo_producto = Producto.objects.filter(
-        categoria=categoria,
-        codigo__startswith=categoria.nombre[:3].upper()
-    ).order_by('-codigo').first()
-    
-    if ultimo_producto:
-        # Extraer el número del último código
+def url_codigo_barras(producto, formato=None):
+    """
+    URL de la imagen del código de barras. Lleva el código como parámetro
+    para que la URL cambie si se edita y la imagen pueda cachearse sin caducar.
+    """
+    formato = formato or FORMATO_CODIGO_BARRAS
+    return f"{reverse('inventario:codigo_barras_producto', args=[producto.id, formato])}?{urlencode({'c': producto.codigo})}"
+
+
+@login_required
+def codigo_barras_producto(request, producto_id, formato):
+    """Imagen del código de barras de un producto (PNG o SVG)"""
+    if formato not in TIPOS_CONTENIDO:
+        raise Http404('Formato no soportado')
+    codigo = Producto.objects.filter(id=producto_id).values_list('codigo', flat=True).first()
+    if codigo is None:
+        raise Http404('Producto no encontrado')
+    
+    # La clave depende solo del código y las opciones: si el navegador ya
+    # tiene la imagen se responde 304 sin dibujar nada
+    etag = quote_etag(clave_codigo_barras(codigo, formato))
+    no_modificado = get_conditional_response(request, etag=etag)
+    if no_modificado is None:
         try:
-            ultimo_numero = int(ultimo_producto.codigo.split('-')[-1])
-            nuevo_numero = ultimo_numero + 1
-        except (ValueError, IndexError):
-            nuevo_numero = 1
+            response = HttpResponse(imagen_codigo_barras(codigo, formato), content_type=TIPOS_CONTENIDO[formato])
+        except Exception:
+            raise Http404('No se pudo generar el código de barras')
     else:
-        nuevo_numero = 1
+        response = no_modificado
     
-    # Generar el nuevo código
-    codigo = f"{categoria.nombre[:3].upper()}-{nuevo_numero:05d}"
-    return codigo
-
-
-def generar_codigo_barras(codigo_producto):
-    """Genera un código de barras en formato base64"""
-    try:
-        # Crear el código de barras con opciones personalizadas
-        codigo_barras = barcode.Code128(codigo_producto, writer=ImageWriter())
-        
-        # Generar la imagen con opciones personalizadas
-        buffer = BytesIO()
-        codigo_barras.write(buffer, options={
-            'module_height': 15.0,  # Altura de las barras (más alto)
-            'module_width': 0.4,    # Ancho de las barras (más ancho)
-            'quiet_zone': 6.0,      # Espacio en blanco a los lados
-            'font_size': 0,         # Tamaño de fuente 0 = sin texto
-            'text_distance': 0,     # Sin distancia de texto
-            'write_text': False,    # No escribir texto debajo de las barras
-        })
-        buffer.seek(0)
-        
-        # Convertir a base64
-        imagen_base64 = base64.b64encode(buffer.getvalue()).decode()
-        return f"data:image/png;base64,{imagen_base64}"
-    except Exception as e:
-        print(f"Error generando código de barras: {e}")
-        return None
+    response['ETag'] = etag
+    if request.GET.get('c') == codigo:
+        response['Cache-Control'] = 'private, max-age=31536000, immutable'
+    else:
+        response['Cache-Control'] = 'private, no-cache'
+    return response
 
 
 @login_required
@@ -1843,12 +1648,9 @@ def imprimir_etiqueta(request, producto_id):
     """Vista para imprimir etiqueta de producto"""
     producto = get_object_or_404(Producto, id=producto_id)
     
-    # Generar código de barras
-    codigo_barras = generar_codigo_barras(producto.codigo)
-    
     context = {
         'producto': producto,
-        'codigo_barras': codigo_barras,
+        'codigo_barras': url_codigo_barras(producto),
         'fecha_actual': timezone.now().strftime("%d/%m/%Y"),
         'anio_actual': timezone.now().year,
     }
@@ -1856,6 +1658,51 @@ def imprimir_etiqueta(request, producto_id):
     return render(request, 'inventario/imprimir_etiqueta.html', context)
 
 
+def _ids_seleccionados(request):
+    """IDs de ``ids`` (repetido o separado por comas) en POST o GET"""
+    valores = request.POST.getlist('ids') or request.GET.getlist('ids')
+    ids = set()
+    for valor in valores:
+        for parte in valor.split(','):
+            if parte.strip().isdigit():
+                ids.add(int(parte))
+    return ids
+
+
+@login_required
+def imprimir_etiquetas(request):
+    """
+    Etiquetas de los productos seleccionados o filtrados: hoja PDF o, con
+    ``formato=zpl``, comandos para impresoras Zebra
+    """
+    productos = Producto.objects.all()
+    ids = _ids_seleccionados(request)
+    if ids:
+        productos = productos.filter(id__in=ids).order_by('codigo')
+    else:
+        productos, _ = _filtrar_productos(request, productos)
+    
+    plantilla = request.GET.get('plantilla')
+    if plantilla not in PLANTILLAS_ETIQUETAS:
+        plantilla = PLANTILLA_POR_DEFECTO
+    
+    if productos.count() > MAX_ETIQUETAS:
+        messages.error(request, f'Se pueden imprimir como máximo {MAX_ETIQUETAS} etiquetas a la vez. Aplique más filtros.')
+        return redirect('inventario:lista_productos')
+    
+    if request.GET.get('formato') == 'zpl':
+        return respuesta_zpl(productos)
+    return respuesta_etiquetas(productos, plantilla)
+
+
+@login_required
+def etiqueta_zpl_producto(request, producto_id):
+    """Etiqueta ZPL de un producto para impresoras térmicas Zebra"""
+    productos = Producto.objects.filter(id=producto_id)
+    producto = get_object_or_404(productos.only('codigo'))
+    return respuesta_zpl(productos, f'Etiqueta_{producto.codigo}')
+
+
 @login_required
 @csrf_exempt
 def api_generar_codigo(request):
@@ -1867,9 +1714,9 @@ def api_generar_codigo(request):
             
             if categoria_id:
                 categoria = Categoria.objects.get(id=categoria_id)
-                codigo = generar_codigo_producto(categoria)
-                print(f"Generando código para categoría {categoria.nombre}: {codigo}")  # Debug
-                return JsonResponse({'codigo': codigo})
+                # Solo una vista previa: el número se reserva al guardar el producto
+                codigo = siguiente_codigo(categoria)
+                return JsonResponse({'success': True, 'codigo': codigo})
             else:
                 return JsonResponse({'error': 'Categoría no especificada'}, status=400)
                 
@@ -2198,13 +2045,8 @@ def detalle_licencia(request, licencia_id):
 # VISTAS PARA GESTIÓN DE CUENTAS
 # ============================================================================
 
-@login_required
-@user_passes_test(lambda u: u.is_staff)
-def lista_cuentas(request):
-    """Vista para listar todas las cuentas"""
-    cuentas = Cuenta.objects.filter(activo=True).order_by('tipo_cuenta', 'nombre')
-    
-    # Filtros
+def _filtrar_cuentas(request, cuentas):
+    """Aplica los filtros del listado de cuentas; devuelve ``(cuentas, filtros)``"""
     tipo_cuenta = request.GET.get('tipo_cuenta')
     estado = request.GET.get('estado')
     sede_id = request.GET.get('sede')
@@ -2216,6 +2058,19 @@ def lista_cuentas(request):
     if sede_id:
         cuentas = cuentas.filter(sede_id=sede_id)
     
+    return cuentas, {
+        'tipo_cuenta': tipo_cuenta,
+        'estado': estado,
+        'sede_id': sede_id,
+    }
+
+
+@login_required
+@user_passes_test(lambda u: u.is_staff)
+def lista_cuentas(request):
+    """Vista para listar todas las cuentas"""
+    cuentas, filtros = _filtrar_cuentas(request, Cuenta.objects.filter(activo=True).order_by('tipo_cuenta', 'nombre'))
+    
     # Paginación
     paginator = Paginator(cuentas, 20)
     page_number = request.GET.get('page')
@@ -2239,16 +2094,22 @@ def lista_cuentas(request):
         'tipos_cuenta': Cuenta.TIPOS_CUENTA,
         'estados_cuenta': Cuenta.ESTADOS_CUENTA,
         'sedes': Sede.objects.filter(activo=True),
-        'filtros': {
-            'tipo_cuenta': tipo_cuenta,
-            'estado': estado,
-            'sede_id': sede_id,
-        }
+        'filtros': filtros,
     }
     
     return render(request, 'inventario/lista_cuentas.html', context)
 
 
+@login_required
+@user_passes_test(lambda u: u.is_staff)
+def exportar_cuentas(request):
+    """Exportar a XLSX las cuentas del listado con sus filtros"""
+    cuentas, _ = _filtrar_cuentas(request, Cuenta.objects.filter(activo=True).select_related(
+        'sede', 'area__sede', 'personal_asignado'
+    ).order_by('tipo_cuenta', 'nombre'))
+    return respuesta_xlsx(cuentas, COLUMNAS_CUENTAS, 'Cuentas', 'Cuentas')
+
+
 @login_required
 @user_passes_test(lambda u: u.is_staff)
 def crear_cuenta(request):
@@ -152,6 +152,24 @@ if not DEBUG:
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Caché compartida entre los procesos de la aplicación (consultas y fragmentos).
+# La invalidación por versiones no depende de ``incr`` atómico, así que sirve
+# cualquier backend compartido; con varios servidores usar Redis o Memcached
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_LOCATION', os.path.join(BASE_DIR, '.cache')),
+        'TIMEOUT': 60 * 60,
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+        },
+    }
+}
+
+# Tiempo de vida de las consultas y fragmentos cacheados del inventario (segundos)
+INVENTARIO_TIEMPO_CACHE = int(os.environ.get('INVENTARIO_TIEMPO_CACHE', 60 * 60))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -169,7 +187,9 @@ LOGOUT_REDIRECT_URL = '/login/'
 # CONFIGURACIÓN DE ENCRIPTACIÓN
 # ============================================================================
 
-# Clave de encriptación para licencias (generada con Fernet.generate_key())
+# Clave de encriptación para licencias (generada con Fernet.generate_key()).
+# Admite varias claves separadas por comas, la nueva primero, para rotarlas con
+# ``python manage.py rotar_claves``
 LICENSE_ENCRYPTION_KEY = os.environ.get('LICENSE_ENCRYPTION_KEY', b'2vDGw7FRIz6ENdyS0cdydLEyo3NqOCJ2816NeClTcgY=')
 
 # Clave de encriptación para cuentas (puede ser la misma o diferente)